@@ -1,19 +1,43 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from main import process_query, set_speech_enabled  # Import the process_query function and speech control from main.py
+from flask_sock import Sock
+from werkzeug.middleware.proxy_fix import ProxyFix
+from logging_setup import logging_stats, setup_logging
+from main import process_query, is_local_query, is_llm_query, set_speech_enabled  # Import the process_query function and speech control from main.py
+from request_context import request_scope
+from side_effects import SideEffects
+from sessions import session_store
+from traffic import recorder_from_env
+from resilience import breaker_states
+from warmup import start_warmup, warmup_state
+from prompting import prompt_metrics
+from jobs import JobQueueFull, job_manager_from_env
+from scheduler import AdmissionController, LaneFull, admission_from_env, scheduler_from_env
+from enhanced_commands import buddy_processor
+from ws_chat import ChatConnection
+from profiling import collapsed, profiler_from_env
+from diagnostics import executor_depth, memory_report, register_default_reporters, register_reporter, tracemalloc_snapshots
+from contextlib import nullcontext
+from functools import wraps
+import hmac
+import uuid
 import os  # Import os to handle environment variables
+import time
 import logging  # For logging
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize the Flask application
 app = Flask(__name__)
 
 # Disable speech in production environment (audio doesn't work well in serverless)
 if os.environ.get('FLASK_ENV') == 'production':
     set_speech_enabled(False)
-    print("Speech disabled for production environment")
+    logger.info("Speech disabled for production environment")
 else:
     set_speech_enabled(True)
-    print("Speech enabled for development environment")
+    logger.info("Speech enabled for development environment")
 
 # Configure CORS for production and development
 if os.environ.get('FLASK_ENV') == 'production':
@@ -30,6 +54,95 @@ else:
 
 CORS(app, resources={r"/*": {"origins": allowed_origins}})
 
+# Reverse proxies in front of the app (Render's load balancer in production).
+# Each appends the address it saw to X-Forwarded-For, so only that many entries
+# from the right are trusted; anything further left is client-supplied
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1 if os.environ.get('FLASK_ENV') == 'production' else 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+# Requests never open browser tabs, launch applications or quit the process on
+# the server; speech follows the development/production setting above
+server_effects = SideEffects('server', speech=os.environ.get('FLASK_ENV') != 'production',
+                             desktop_actions=False, allow_quit=False)
+
+# WebSocket chat channel (see ws_chat.py)
+sock = Sock(app)
+WS_MAX_IN_FLIGHT = int(os.environ.get('WS_MAX_IN_FLIGHT', 4))
+
+# Optional capture of sanitized chat traffic for load-test replays
+traffic_recorder = recorder_from_env()
+
+# Warm the model client, connections and caches in the background; the
+# readiness probe reports 503 until this finishes
+start_warmup()
+
+# Opt-in sampling profiler: queries run with an authorized X-Profile header, or
+# the next N queries after POST /api/diagnostics/profiler, are profiled
+profiler = profiler_from_env(buddy_processor.classify)
+profiled_process_query = profiler.instrument(process_query)
+
+# Slow queries can be submitted as background jobs and polled for
+job_manager = job_manager_from_env(profiled_process_query, effects=server_effects)
+
+# Locally answerable queries run inline; LLM/external-API work gets its own bounded pool
+scheduler = scheduler_from_env(is_local_query)
+
+# Under overload, degrade Gemini-bound queries to offline answers, then shed load
+admission = admission_from_env(scheduler, is_llm_query)
+
+# End-to-end budget for a chat request; clients may ask for less (never more)
+# with the X-Request-Timeout-Ms header
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 25))
+
+def get_request_deadline():
+    """Return the monotonic deadline for the current request"""
+    budget = REQUEST_DEADLINE
+    header = request.headers.get('X-Request-Timeout-Ms')
+    if header:
+        try:
+            budget = min(budget, max(0.5, int(header) / 1000))
+        except ValueError:
+            pass
+    return time.monotonic() + budget
+
+def get_client_ip():
+    """Return the end user's IP (ProxyFix has already applied the trusted proxy hops)"""
+    return request.remote_addr
+
+def get_session_id(data):
+    """
+    Return the chat session for this request: body field or X-Session-Id header,
+    else a new random id that the response hands back to the client. Sessions
+    are never derived from the client IP, which users behind one NAT share.
+    """
+    session_id = data.get('session_id') or request.headers.get('X-Session-Id')
+    return str(session_id) if session_id else uuid.uuid4().hex
+
+# Diagnostics and profiling endpoints are disabled unless DIAGNOSTICS_TOKEN is set
+DIAGNOSTICS_TOKEN = os.environ.get('DIAGNOSTICS_TOKEN')
+
+def diagnostics_authorized():
+    """Whether the request carries the diagnostics token (Authorization: Bearer or X-Diagnostics-Token)"""
+    if not DIAGNOSTICS_TOKEN:
+        return False
+    supplied = request.headers.get('X-Diagnostics-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        supplied = authorization[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), DIAGNOSTICS_TOKEN.encode())
+
+def require_diagnostics_token(view):
+    """Serve the view only to diagnostics_authorized() requests (404 when diagnostics are disabled)"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        if not DIAGNOSTICS_TOKEN:
+            return jsonify({'error': 'Not found'}), 404
+        if not diagnostics_authorized():
+            return jsonify({'error': 'Unauthorized'}), 401
+        return view(*args, **kwargs)
+    return guarded
+
 @app.route('/', methods=['GET'])
 def health_check():
     """Health check endpoint for deployment platforms"""
@@ -44,17 +157,41 @@ def api_health():
     """API health check"""
     return jsonify({
         'api': 'healthy',
+        'live': True,
+        'ready': warmup_state.ready,
+        'warmup': warmup_state.snapshot(),
         'gemini_configured': bool(os.environ.get('GEMINI_API_KEY')),
-        'features': ['chat', 'enhanced_commands', 'external_apis']
+        'features': ['chat', 'websocket_chat', 'enhanced_commands', 'external_apis'],
+        'circuit_breakers': breaker_states(),
+        'scheduler': scheduler.stats(),
+        'admission': admission.stats(),
+        'logging': logging_stats(),
+        'sessions': len(session_store)
     }), 200
 
+@app.route('/api/metrics/prompts', methods=['GET'])
+def api_prompt_metrics():
+    """Per-intent Gemini prompt and completion sizes, most expensive first"""
+    return jsonify(prompt_metrics.snapshot()), 200
+
+@app.route('/api/health/live', methods=['GET'])
+def api_liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'live': True}), 200
+
+@app.route('/api/health/ready', methods=['GET'])
+def api_readiness():
+    """Readiness probe: warm-up has finished and the instance can take traffic"""
+    snapshot = warmup_state.snapshot()
+    return jsonify(snapshot), 200 if snapshot['ready'] else 503
+
 @app.route('/api/chat', methods=['POST', 'OPTIONS'])
 def handle_chat():
     if request.method == 'OPTIONS':
         response = jsonify({'message': 'Preflight check successful'})
         response.headers.add("Access-Control-Allow-Origin", request.headers.get('Origin', '*'))
         response.headers.add("Access-Control-Allow-Methods", "POST, OPTIONS")
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization")
+        response.headers.add("Access-Control-Allow-Headers", "Content-Type, Authorization, X-Request-Timeout-Ms, X-Session-Id")
         return response, 200
     
     try:
@@ -65,20 +202,222 @@ def handle_chat():
         if not query:
             return jsonify({'error': 'No query provided'}), 400
 
+        session_id = get_session_id(data)
+        if traffic_recorder:
+            traffic_recorder.record(query, session_id)
+
+        decision = admission.decide(query)
+        if decision == AdmissionController.REJECT:
+            response = jsonify({'error': 'Server is busy, please retry shortly'})
+            response.headers['Retry-After'] = str(admission.retry_after())
+            return response, 503
+        if decision == AdmissionController.DEGRADE:
+            return jsonify({'response': buddy_processor.offline_response(query), 'degraded': True,
+                            'session_id': session_id})
+
+        # Profile this query when an authorized client asks for it
+        profiling = profiler.requested() if request.headers.get('X-Profile') and diagnostics_authorized() else nullcontext([])
+
         # Process the query
-        response = process_query(query)
+        with request_scope(client_ip=get_client_ip(), deadline=get_request_deadline(),
+                           session_id=session_id, effects=server_effects), profiling as profile_ids:
+            response = scheduler.run(query, profiled_process_query, query)
 
         # Return the AI-generated response
-        return jsonify({'response': response})
+        result = jsonify({'response': response, 'session_id': session_id})
+        if profile_ids:
+            result.headers['X-Profile-Id'] = str(profile_ids[0])
+        return result
     
+    except LaneFull as e:
+        response = jsonify({'error': 'Server is busy, please retry shortly', 'details': str(e)})
+        response.headers['Retry-After'] = '2'
+        return response, 503
     except Exception as e:
-        logging.error(f"Error processing request: {str(e)}")
+        logger.exception("Error processing request")
         return jsonify({'error': 'An error occurred', 'details': str(e)}), 500
 
+@sock.route('/api/ws')
+def chat_socket(ws):
+    """Pipelined chat over one WebSocket connection with a session bound to it"""
+    # Browsers do not apply CORS to WebSockets, so check the origin here
+    origin = request.headers.get('Origin')
+    if origin and origin not in allowed_origins:
+        ws.close(reason=1008, message='Origin not allowed')
+        return
+    
+    connection = ChatConnection(
+        ws, profiled_process_query, scheduler, admission, buddy_processor.offline_response,
+        client_ip=get_client_ip(),
+        session_id=request.args.get('session_id'),
+        max_in_flight=WS_MAX_IN_FLIGHT,
+        deadline=REQUEST_DEADLINE,
+        recorder=traffic_recorder,
+        effects=server_effects
+    )
+    connection.serve()
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a query for background processing; poll /api/jobs/<id> or pass a local callback_url"""
+    data = request.get_json(silent=True) or {}
+    query = data.get('query')
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    session_id = get_session_id(data)
+    try:
+        job = job_manager.submit(query, client_ip=get_client_ip(), callback_url=data.get('callback_url'),
+                                 session_id=session_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'session_id': session_id,
+        'poll_url': f"/api/jobs/{job['id']}"
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status, and once finished the response, of a background job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    job.pop('callback_url', None)
+    return jsonify(job), 200
+
+register_default_reporters()
+register_reporter('jobs', lambda: dict(job_manager.jobs.memory(), pending=job_manager.pending(),
+                                       **executor_depth(job_manager.executor)))
+register_reporter('scheduler', scheduler.stats)
+register_reporter('admission', admission.stats)
+register_reporter('profiler', profiler.memory)
+if traffic_recorder:
+    register_reporter('traffic', traffic_recorder.stats)
+
+@app.route('/api/diagnostics/memory', methods=['GET'])
+@require_diagnostics_token
+def diagnostics_memory():
+    """Process memory and per-subsystem breakdown; ?types=1 adds a (slow) live object census"""
+    return jsonify(memory_report(include_types=request.args.get('types') == '1')), 200
+
+@app.route('/api/diagnostics/tracemalloc', methods=['GET'])
+@require_diagnostics_token
+def diagnostics_tracemalloc_status():
+    return jsonify(tracemalloc_snapshots.status()), 200
+
+@app.route('/api/diagnostics/tracemalloc/start', methods=['POST'])
+@require_diagnostics_token
+def diagnostics_tracemalloc_start():
+    """Start tracing allocations; {"frames": n} keeps n frames per allocation (more frames, more overhead)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        frames = int(data.get('frames', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'frames must be an integer'}), 400
+    return jsonify(tracemalloc_snapshots.start(frames)), 200
+
+@app.route('/api/diagnostics/tracemalloc/stop', methods=['POST'])
+@require_diagnostics_token
+def diagnostics_tracemalloc_stop():
+    return jsonify(tracemalloc_snapshots.stop()), 200
+
+@app.route('/api/diagnostics/tracemalloc/snapshots', methods=['POST'])
+@require_diagnostics_token
+def diagnostics_tracemalloc_snapshot():
+    """Take a snapshot now; diff two of them with /api/diagnostics/tracemalloc/diff"""
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(tracemalloc_snapshots.take(str(data.get('label', '')))), 201
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/api/diagnostics/tracemalloc/snapshots/<int:snapshot_id>', methods=['GET'])
+@require_diagnostics_token
+def diagnostics_tracemalloc_top(snapshot_id):
+    """Largest allocation sites in a snapshot (?group=lineno|filename|traceback&limit=20)"""
+    try:
+        top = tracemalloc_snapshots.top(snapshot_id, request.args.get('group', 'lineno'),
+                                        request.args.get('limit', 20, type=int))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'id': snapshot_id, 'top': top}), 200
+
+@app.route('/api/diagnostics/tracemalloc/diff', methods=['GET'])
+@require_diagnostics_token
+def diagnostics_tracemalloc_diff():
+    """Allocation growth between snapshots ?from=<id>&to=<id> (same group/limit options)"""
+    old_id = request.args.get('from', type=int)
+    new_id = request.args.get('to', type=int)
+    if old_id is None or new_id is None:
+        return jsonify({'error': 'from and to snapshot ids are required'}), 400
+    try:
+        diff = tracemalloc_snapshots.diff(old_id, new_id, request.args.get('group', 'lineno'),
+                                          request.args.get('limit', 20, type=int))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'from': old_id, 'to': new_id, 'diff': diff}), 200
+
+@app.route('/api/diagnostics/profiler', methods=['GET', 'POST'])
+@require_diagnostics_token
+def diagnostics_profiler():
+    """Profiler state; POST {"requests": n, "interval_ms": ms} profiles the next n queries (0 disarms)"""
+    if request.method == 'GET':
+        return jsonify(profiler.status()), 200
+    data = request.get_json(silent=True) or {}
+    try:
+        requests_to_profile = int(data.get('requests', 1))
+        interval_ms = float(data['interval_ms']) if data.get('interval_ms') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'requests must be an integer and interval_ms a number'}), 400
+    return jsonify(profiler.arm(requests_to_profile, interval_ms)), 200
+
+@app.route('/api/diagnostics/profiles', methods=['GET', 'DELETE'])
+@require_diagnostics_token
+def diagnostics_profiles():
+    """Stored profiles and per-category hotspots; DELETE discards them"""
+    if request.method == 'DELETE':
+        profiler.clear()
+        return jsonify(profiler.status()), 200
+    return jsonify({'profiles': profiler.list(), 'categories': profiler.summary()}), 200
+
+@app.route('/api/diagnostics/profiles/<int:profile_id>', methods=['GET'])
+@require_diagnostics_token
+def diagnostics_profile(profile_id):
+    """Collapsed stacks of one profiled query (flamegraph.pl/speedscope input); ?format=json for details"""
+    try:
+        profile = profiler.get(profile_id)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    if request.args.get('format') == 'json':
+        return jsonify(dict(profile.info(), stacks=dict(profile.snapshot()))), 200
+    return collapsed(profile.snapshot()), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@app.route('/api/diagnostics/profiles/collapsed', methods=['GET'])
+@require_diagnostics_token
+def diagnostics_profiles_collapsed():
+    """Merged collapsed stacks of every profiled query, or ?category=<name> for one routed category"""
+    try:
+        stacks = profiler.collapsed(request.args.get('category'))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    return stacks, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
 if __name__ == '__main__':
     # Use environment variables for host and port, with defaults for local testing
     host = os.environ.get('HOST', '0.0.0.0')  # Bind to all network interfaces
     port = int(os.environ.get('PORT', 5000))  # Use Render's provided port or default to 5000
     
     # Run the Flask app
-    app.run(host=host, port=port, debug=False)  # Set debug=False for production
+    # Requests are processed concurrently, one thread each (see request_context.py)
+    app.run(host=host, port=port, debug=False, threaded=True)  # Set debug=False for production
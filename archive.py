@@ -0,0 +1,295 @@
+"""
+Archive Module for Buddy AI
+Append-only archive of AI prompts and responses. Records are queued in memory
+and written by a background thread, so archiving adds no file I/O to the
+request path. Output goes to numbered segment files (archive-000001.jsonl, ...)
+that roll over at a size limit, each with a small index file of
+(id, timestamp, session, intent, offset, length) entries used for lookups.
+
+Usage:
+    python archive.py list --intent prompt --limit 20
+    python archive.py export prompts.jsonl --session abc --since 2024-01-01
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = re.compile(r'^archive-(\d{6})\.jsonl$')
+
+
+class ArchiveWriter:
+    """Queues archive records and appends them to segment files on a background thread"""
+
+    def __init__(self, directory: str = 'Gemini', segment_bytes: int = 4 * 1024 * 1024, queue_size: int = 10000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._segment = None
+        self._data = None
+        self._index = None
+        # Set when the archive directory cannot be opened; records are then dropped
+        self._failed = False
+        # Guards the counters, which request threads and the writer both update
+        self._counter_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def _count(self, counter: str, n: int = 1):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    # ----------------------------------------------------------------- writing
+
+    def record(self, prompt: str, response: str, session: Optional[str] = None, intent: str = 'prompt',
+               extra: Optional[Dict] = None) -> Optional[str]:
+        """Queue one prompt/response pair; returns its id, or None if it was dropped"""
+        self._ensure_started()
+        if self._failed:
+            self._count('dropped')
+            return None
+        entry = {
+            'id': uuid.uuid4().hex,
+            'ts': time.time(),
+            'session': session,
+            'intent': intent,
+            'prompt': prompt,
+            'response': response
+        }
+        if extra:
+            entry['extra'] = extra
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count('dropped')
+            return None
+        return entry['id']
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every queued record has been written. Gives up after `timeout`
+        seconds or if the writer thread has died; returns whether it caught up.
+        """
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._queue.all_tasks_done.wait(min(remaining, 0.1))
+        return True
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name='buddy-archive', daemon=True)
+                    self._thread.start()
+                    # Records still queued when the process exits are written first
+                    atexit.register(self.flush)
+
+    def _open_segment(self, number: int):
+        for handle in (self._data, self._index):
+            if handle:
+                handle.close()
+        self._segment = number
+        base = os.path.join(self.directory, f'archive-{number:06d}')
+        self._data = open(f'{base}.jsonl', 'ab')
+        self._index = open(f'{base}.idx', 'ab')
+
+    def _writer(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            segments = self.segments()
+            self._open_segment(segments[-1] if segments else 1)
+        except OSError as e:
+            logger.error("Archive disabled, cannot open %s: %s", self.directory, e)
+            self._failed = True
+
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is already waiting so one flush covers the batch
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self._failed:
+                    self._count('dropped', len(batch))
+                    continue
+                for entry in batch:
+                    self._write(entry)
+                self._data.flush()
+                self._index.flush()
+            except Exception as e:
+                # Never let the writer die, or queued records would never be marked done
+                logger.error("Archive write failed: %s", e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+        if self._data.tell() and self._data.tell() + len(line) > self.segment_bytes:
+            self._open_segment(self._segment + 1)
+        offset = self._data.tell()
+        self._data.write(line)
+        index_entry = {key: entry[key] for key in ('id', 'ts', 'session', 'intent')}
+        index_entry.update(offset=offset, length=len(line))
+        self._index.write(json.dumps(index_entry).encode('utf-8') + b'\n')
+        self._count('written')
+
+    # ----------------------------------------------------------------- reading
+
+    def segments(self) -> List[int]:
+        """Numbers of the segment files on disk, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        numbers = [int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if m]
+        return sorted(numbers)
+
+    def _index_entries(self) -> Iterator[Dict]:
+        for number in self.segments():
+            path = os.path.join(self.directory, f'archive-{number:06d}.idx')
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partially written last line (e.g. after a crash) is skipped
+                        continue
+                    entry['segment'] = number
+                    yield entry
+
+    def _read(self, entries: Iterable[Dict]) -> Iterator[Dict]:
+        """Records for index entries, keeping each segment file open while its entries are read"""
+        segment, data = None, None
+        try:
+            for entry in entries:
+                if entry['segment'] != segment:
+                    if data:
+                        data.close()
+                    segment = entry['segment']
+                    data = open(os.path.join(self.directory, f'archive-{segment:06d}.jsonl'), 'rb')
+                data.seek(entry['offset'])
+                yield json.loads(data.read(entry['length']))
+        finally:
+            if data:
+                data.close()
+
+    def lookup(self, session: Optional[str] = None, intent: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Archived records matching the filters, oldest first (most recent `limit`
+        if given). Records are read lazily; only the index entries of the last
+        `limit` matches are held in memory.
+        """
+        matches = (
+            entry for entry in self._index_entries()
+            if (session is None or entry['session'] == session)
+            and (intent is None or entry['intent'] == intent)
+            and (since is None or entry['ts'] >= since)
+            and (until is None or entry['ts'] < until)
+        )
+        if limit is not None:
+            matches = deque(matches, maxlen=limit)
+        yield from self._read(matches)
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        for entry in self._index_entries():
+            if entry['id'] == record_id:
+                return next(self._read([entry]))
+        return None
+
+    def export(self, out: IO[str], **filters) -> int:
+        """Stream matching records to a text stream as JSON lines; returns the count"""
+        count = 0
+        for record in self.lookup(**filters):
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+        return count
+
+    def stats(self) -> Dict:
+        with self._counter_lock:
+            written, dropped = self.written, self.dropped
+        return {
+            'directory': self.directory,
+            'segment': self._segment,
+            'queued': self._queue.qsize(),
+            'written': written,
+            'dropped': dropped
+        }
+
+
+def archive_from_env() -> ArchiveWriter:
+    """Build the archive using ARCHIVE_DIR / ARCHIVE_SEGMENT_BYTES / ARCHIVE_QUEUE_SIZE"""
+    return ArchiveWriter(
+        directory=os.getenv('ARCHIVE_DIR', 'Gemini'),
+        segment_bytes=int(os.getenv('ARCHIVE_SEGMENT_BYTES', str(4 * 1024 * 1024))),
+        queue_size=int(os.getenv('ARCHIVE_QUEUE_SIZE', '10000'))
+    )
+
+
+# Global archive instance
+archive = archive_from_env()
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the Buddy AI prompt/response archive")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name in ('list', 'export'):
+        sub = subparsers.add_parser(name)
+        if name == 'export':
+            sub.add_argument('output', help="JSONL file to write ('-' for stdout)")
+        sub.add_argument('--session')
+        sub.add_argument('--intent')
+        sub.add_argument('--since', help="Unix timestamp or ISO date")
+        sub.add_argument('--until', help="Unix timestamp or ISO date")
+        sub.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    filters = {'session': args.session, 'intent': args.intent, 'since': _parse_time(args.since),
+               'until': _parse_time(args.until), 'limit': args.limit}
+    if args.command == 'list':
+        for record in archive.lookup(**filters):
+            when = datetime.fromtimestamp(record['ts']).isoformat(timespec='seconds')
+            print(f"{when}  {record['intent']:<12} {record['session'] or '-':<16} {record['prompt'][:60]}")
+    elif args.output == '-':
+        import sys
+        archive.export(sys.stdout, **filters)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            count = archive.export(f, **filters)
+        print(f"Exported {count} records to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Bulk Query Processing for Buddy AI
+Streams a JSONL file of queries through the command processor (or the full
+process_query pipeline) on a thread or process pool and writes one JSON
+result per line, with per-item timings. Only a bounded window of items is in
+flight at a time, so memory stays flat for inputs of any size. Browser tabs,
+application launches and speech are suppressed (server side-effect mode).
+
+Input lines are {"query": "...", "id": ...} objects (the id is optional) or
+bare JSON strings.
+
+Usage:
+    python bulk.py queries.jsonl -o results.jsonl --workers 8
+    python bulk.py queries.jsonl --mode full --executor process --workers 4
+    cat queries.jsonl | python bulk.py - --ordered > results.jsonl
+
+Caches (answer and location) live per process, so use the thread executor
+when the run is meant to pre-warm them.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Tuple
+
+# Keep stdout for results: logs go to stderr, and pygame's import banner is silenced
+os.environ.setdefault('LOG_STREAM', 'stderr')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+_timeout = None
+
+
+def init_worker(timeout: Optional[float] = None):
+    """Prepare this process for bulk work: no side effects, no speech, no quitting"""
+    global _timeout
+    _timeout = timeout
+    from side_effects import SERVER, set_default_effects
+
+    set_default_effects(SERVER)
+
+
+def run_item(mode: str, line_no: int, item_id, query: str) -> Dict:
+    """Process one query and return its result record"""
+    from request_context import request_scope
+
+    result = {'line': line_no, 'id': item_id, 'query': query}
+    # Each item gets its own session so chat history does not leak between queries
+    deadline = time.monotonic() + _timeout if _timeout else None
+    started = time.perf_counter()
+    try:
+        with request_scope(deadline=deadline, session_id=f'bulk-{line_no}'):
+            if mode == 'command':
+                from enhanced_commands import buddy_processor
+                outcome = buddy_processor.process_command(query)
+                result.update(success=outcome['success'], action=outcome.get('action'),
+                              response=outcome['message'])
+            else:
+                from main import process_query
+                result.update(success=True, response=process_query(query))
+    except Exception as e:
+        result.update(success=False, error=f"{type(e).__name__}: {e}")
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def read_queries(stream, field: str = 'query') -> Iterator[Tuple[int, object, Optional[str], Optional[str]]]:
+    """Yield (line number, id, query, parse error) for each non-blank input line"""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, str):
+            yield line_no, None, record, None
+        elif isinstance(record, dict) and isinstance(record.get(field), str):
+            yield line_no, record.get('id'), record[field], None
+        else:
+            yield line_no, None, None, f"No '{field}' string in record"
+
+
+class RunSummary:
+    """Counts and a fixed-size latency reservoir, so summary memory does not grow with input size"""
+
+    def __init__(self, reservoir_size: int = 10000):
+        self.count = 0
+        self.failed = 0
+        self.reservoir = []
+        self.reservoir_size = reservoir_size
+        self.started = time.perf_counter()
+
+    def add(self, result: Dict):
+        self.count += 1
+        if not result.get('success'):
+            self.failed += 1
+        if 'elapsed_ms' not in result:
+            return
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(result['elapsed_ms'])
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.reservoir_size:
+                self.reservoir[slot] = result['elapsed_ms']
+
+    def report(self) -> Dict:
+        from traffic import percentile
+
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.reservoir)
+        return {
+            'items': self.count,
+            'failed': self.failed,
+            'elapsed_s': round(elapsed, 2),
+            'items_per_s': round(self.count / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99)
+        }
+
+
+def run_bulk(stream, out, mode: str = 'command', workers: int = 4, executor_kind: str = 'thread',
+             window: Optional[int] = None, ordered: bool = False, field: str = 'query',
+             timeout: Optional[float] = None) -> Dict:
+    """
+    Process every query from `stream`, writing result lines to `out`. At most
+    `window` items are submitted but not yet written; with `ordered` results
+    are written in input order (a slow item holds back the ones after it).
+    """
+    window = window or workers * 4
+    summary = RunSummary()
+    if executor_kind == 'process':
+        # Spawned (not forked) workers start clean, without the parent's logging thread or locks
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(timeout,),
+                                       mp_context=multiprocessing.get_context('spawn'))
+    else:
+        init_worker(timeout)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='buddy-bulk')
+
+    def emit(result: Dict):
+        summary.add(result)
+        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+    def collect(future):
+        try:
+            emit(future.result())
+        except Exception as e:
+            # The worker itself failed (e.g. a process pool crash)
+            emit({'line': future.line_no, 'success': False, 'error': f"{type(e).__name__}: {e}"})
+
+    in_flight = deque()
+    with executor:
+        for line_no, item_id, query, error in read_queries(stream, field):
+            if error:
+                emit({'line': line_no, 'id': item_id, 'success': False, 'error': error})
+                continue
+
+            while len(in_flight) >= window:
+                if ordered:
+                    collect(in_flight.popleft())
+                else:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        in_flight.remove(future)
+                        collect(future)
+
+            future = executor.submit(run_item, mode, line_no, item_id, query)
+            future.line_no = line_no
+            in_flight.append(future)
+
+        while in_flight:
+            collect(in_flight.popleft())
+
+    out.flush()
+    return summary.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries through Buddy AI offline")
+    parser.add_argument('input', help="JSONL file of queries ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL results file ('-' for stdout)")
+    parser.add_argument('--mode', choices=['command', 'full'], default='command',
+                        help="command: BuddyCommandProcessor.process_command; full: main.process_query")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--window', type=int, default=None, help="items in flight (default workers x 4)")
+    parser.add_argument('--ordered', action='store_true', help="write results in input order")
+    parser.add_argument('--field', default='query', help="name of the query field in input records")
+    parser.add_argument('--timeout', type=float, default=None, help="per-item deadline in seconds")
+    args = parser.parse_args()
+
+    from logging_setup import setup_logging
+    setup_logging()
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        report = run_bulk(source, out, mode=args.mode, workers=args.workers, executor_kind=args.executor,
+                          window=args.window, ordered=args.ordered, field=args.field, timeout=args.timeout)
+    finally:
+        for handle in (source, out):
+            if handle not in (sys.stdin, sys.stdout):
+                handle.close()
+    print(json.dumps(report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
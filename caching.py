@@ -0,0 +1,252 @@
+"""
+Caching Utilities for Buddy AI
+Thread-safe in-memory caches shared by the API and command modules
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from diagnostics import approx_size
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after a time-to-live.
+    Safe to share between request threads.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memory(self) -> Dict:
+        """Entry count and approximate deep size in bytes (for diagnostics)"""
+        with self._lock:
+            entries = list(self._entries.items())
+        return {'entries': len(entries), 'maxsize': self.maxsize, 'approx_bytes': approx_size(entries)}
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size"""
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+_CONTRACTIONS = {
+    "what's": "what is", "who's": "who is", "how's": "how is", "where's": "where is",
+    "it's": "it is", "that's": "that is", "what're": "what are", "i'm": "i am"
+}
+
+# Words that frame a knowledge question without changing what is being asked.
+# Verbs carrying tense, prepositions and nouns stay: "who was X" is not "who
+# is X", and "the meaning of life" or "on the moon" is not "life" or "the moon"
+_FILLER_WORDS = {
+    'a', 'an', 'the', 'what', 'who', 'explain', 'define', 'describe', 'tell', 'me', 'to',
+    'please', 'can', 'could', 'would', 'you', 'i', 'want', 'know', 'give', 'some',
+    'briefly', 'quick', 'quickly', 'kindly'
+}
+
+# Only dropped as part of the opening frame ("what is ...", "tell me about ...")
+_FRAME_WORDS = _FILLER_WORDS | {'is', 'are', 'about'}
+
+
+def normalize_text(text: str) -> List[str]:
+    """Lowercase, expand contractions, strip punctuation, the question frame and filler words"""
+    text = text.lower()
+    for contraction, expansion in _CONTRACTIONS.items():
+        text = text.replace(contraction, expansion)
+    tokens = re.findall(r"[a-z0-9]+", text)
+    start = 0
+    while start < len(tokens) and tokens[start] in _FRAME_WORDS:
+        start += 1
+    return [token for token in tokens[start:] if token not in _FILLER_WORDS]
+
+
+def simhash(tokens: List[str], bits: int = 64) -> int:
+    """SimHash fingerprint over word unigram and bigram shingles"""
+    shingles = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    weights = [0] * bits
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=bits // 8).digest(), 'big')
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+class SimilarityCache:
+    """
+    Cache keyed by text similarity rather than exact text, so paraphrases such
+    as "what's machine learning" and "explain machine learning to me" share an
+    answer. Texts are normalized, fingerprinted with SimHash, and indexed by
+    LSH bands: any two fingerprints within `bands - 1` differing bits share at
+    least one band, so candidates are found without scanning every entry (a
+    little further apart they still usually do). A candidate is a hit when
+    its bitwise similarity reaches `threshold` and so does the overlap of the
+    two word sets; on short texts the fingerprints of "history of rome" and
+    "history of greece" are close, but one word in three differs. Entries are
+    LRU-bounded and expire after `ttl` seconds.
+    """
+
+    BITS = 64
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0, threshold: float = 0.85, bands: int = 8):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self._band_bits = self.BITS // bands
+        self._entries = OrderedDict()  # (namespace, normalized) -> (fingerprint, expires_at, value)
+        self._buckets = {}  # (namespace, band, band_value) -> set of entry keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _band_keys(self, namespace: str, fingerprint: int):
+        mask = (1 << self._band_bits) - 1
+        for band in range(self.bands):
+            yield (namespace, band, fingerprint >> (band * self._band_bits) & mask)
+
+    def similarity(self, a: int, b: int) -> float:
+        return 1 - bin(a ^ b).count('1') / self.BITS
+
+    @staticmethod
+    def word_overlap(a: List[str], b: List[str]) -> float:
+        """Jaccard similarity of two token lists"""
+        a, b = set(a), set(b)
+        return len(a & b) / len(a | b)
+
+    def get(self, text: str, namespace: str = '') -> Any:
+        """Return the value cached for text or a near-duplicate of it, else None"""
+        tokens = normalize_text(text)
+        if not tokens:
+            return None
+        key = (namespace, ' '.join(tokens))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+            fingerprint = simhash(tokens)
+            best_key, best_score = None, self.threshold
+            for band_key in self._band_keys(namespace, fingerprint):
+                for candidate in self._buckets.get(band_key, ()):
+                    candidate_fingerprint, expires_at, _ = self._entries[candidate]
+                    if expires_at <= now:
+                        continue
+                    score = self.similarity(fingerprint, candidate_fingerprint)
+                    if score >= best_score and \
+                            self.word_overlap(tokens, candidate[1].split()) >= self.threshold:
+                        best_key, best_score = candidate, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.near_hits += 1
+            return self._entries[best_key][2]
+
+    def set(self, text: str, value: Any, namespace: str = ''):
+        """Cache value for text, evicting the least recently used entries when full"""
+        tokens = normalize_text(text)
+        if not tokens:
+            return
+        key = (namespace, ' '.join(tokens))
+        fingerprint = simhash(tokens)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (fingerprint, time.monotonic() + self.ttl, value)
+            for band_key in self._band_keys(namespace, fingerprint):
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        fingerprint, _, _ = self._entries.pop(key)
+        for band_key in self._band_keys(key[0], fingerprint):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memory(self) -> Dict:
+        """Entry count and approximate deep size in bytes, similarity index included (for diagnostics)"""
+        with self._lock:
+            entries = list(self._entries.items())
+            buckets = list(self._buckets.items())
+        return {'entries': len(entries), 'maxsize': self.maxsize, 'index_buckets': len(buckets),
+                'approx_bytes': approx_size(entries) + approx_size(buckets)}
+
+    def stats(self) -> Dict:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses
+        }
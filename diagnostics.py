@@ -0,0 +1,222 @@
+"""
+Diagnostics Module for Buddy AI
+Memory accounting for a long-running process. Subsystems register reporters
+that describe what they hold (session counts, cache entries with approximate
+deep sizes, queue depths); memory_report() collects them next to process-wide
+numbers. TracemallocSnapshots takes tracemalloc snapshots on demand and diffs
+them, so growth can be traced to source lines without a restart.
+
+Served by the token-protected /api/diagnostics endpoints in api.py.
+"""
+
+import gc
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter, OrderedDict, deque
+from typing import Any, Callable, Dict, List
+
+import psutil
+
+# Objects never walked into when sizing a structure: they are shared, not owned
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           types.CodeType, types.FrameType)
+
+_reporters = OrderedDict()
+_reporters_lock = threading.Lock()
+
+
+def approx_size(obj: Any, budget: int = 200000) -> int:
+    """
+    Approximate deep size in bytes: sys.getsizeof over the object and
+    everything reachable through containers and instance attributes, each
+    object counted once. Stops after `budget` objects, so the result is a
+    lower bound for very large structures.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < budget:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _OPAQUE):
+            continue
+        seen.add(id(current))
+        try:
+            total += sys.getsizeof(current, 0)
+        except TypeError:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.append(vars(current))
+    return total
+
+
+def executor_depth(executor) -> Dict:
+    """Queued work items and started threads of a ThreadPoolExecutor"""
+    return {'queued': executor._work_queue.qsize(), 'threads': len(executor._threads)}
+
+
+def register_reporter(name: str, reporter: Callable[[], Dict]):
+    """Add (or replace) a named subsystem reporter used by memory_report()"""
+    with _reporters_lock:
+        _reporters[name] = reporter
+
+
+def register_default_reporters():
+    """Reporters for the module-level subsystems; api.py adds its own for per-app objects"""
+    # Imported here so importing diagnostics stays cheap and cycle-free
+    from archive import archive
+    from enhanced_commands import buddy_processor
+    from external_apis import api_manager
+    from gazetteer import gazetteer
+    from logging_setup import logging_stats
+    from main import hedge_executor
+    from sessions import session_store
+    from ws_chat import ws_executor
+
+    register_reporter('sessions', session_store.memory)
+    register_reporter('answer_cache', buddy_processor.answer_cache.memory)
+    register_reporter('location_cache', api_manager.location_cache.memory)
+    register_reporter('gazetteer', gazetteer.memory)
+    register_reporter('archive_queue', lambda: {'queued': archive.stats()['queued']})
+    register_reporter('logging_queue', logging_stats)
+    register_reporter('hedge_executor', lambda: executor_depth(hedge_executor))
+    register_reporter('weather_fanout', lambda: executor_depth(api_manager.fanout_executor))
+    register_reporter('ws_executor', lambda: executor_depth(ws_executor))
+
+
+def type_census(limit: int = 25) -> List[Dict]:
+    """Most numerous live object types tracked by the garbage collector (slow on big heaps)"""
+    counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+    return [{'type': name, 'count': count} for name, count in counts.most_common(limit)]
+
+
+def memory_report(include_types: bool = False) -> Dict:
+    """Process memory plus every registered subsystem's report"""
+    memory = psutil.Process(os.getpid()).memory_info()
+    # Pool threads grouped by name prefix ("buddy-ws_3" -> "buddy-ws")
+    threads = Counter(re.sub(r'[-_]\d+.*$', '', thread.name) for thread in threading.enumerate())
+    report = {
+        'process': {
+            'rss_bytes': memory.rss,
+            'vms_bytes': memory.vms,
+            'gc_objects': len(gc.get_objects()),
+            'gc_counts': gc.get_count(),
+            'threads': dict(threads)
+        },
+        'subsystems': {}
+    }
+    with _reporters_lock:
+        reporters = list(_reporters.items())
+    for name, reporter in reporters:
+        try:
+            report['subsystems'][name] = reporter()
+        except Exception as e:
+            report['subsystems'][name] = {'error': str(e)}
+    if include_types:
+        report['types'] = type_census()
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report['tracemalloc'] = {'traced_bytes': current, 'peak_bytes': peak}
+    return report
+
+
+class TracemallocSnapshots:
+    """
+    On-demand tracemalloc snapshots. Only the newest `max_snapshots` are
+    kept, since each one holds a copy of every traced allocation.
+    """
+
+    GROUPS = ('lineno', 'filename', 'traceback')
+
+    def __init__(self, max_snapshots: int = 4):
+        self.max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 1) -> Dict:
+        """Begin tracing allocations, keeping `frames` frames of traceback each"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+        return self.status()
+
+    def stop(self) -> Dict:
+        """Stop tracing; existing snapshots stay available"""
+        tracemalloc.stop()
+        return self.status()
+
+    def status(self) -> Dict:
+        status = {'tracing': tracemalloc.is_tracing(), 'snapshots': self.list()}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            status.update(frames=tracemalloc.get_traceback_limit(), traced_bytes=current, peak_bytes=peak,
+                          overhead_bytes=tracemalloc.get_tracemalloc_memory())
+        return status
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [entry['info'] for entry in self._snapshots.values()]
+
+    def take(self, label: str = '') -> Dict:
+        """Snapshot the current allocations; raises RuntimeError if tracing is off"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>')
+        ])
+        traced_bytes = sum(stat.size for stat in snapshot.statistics('filename'))
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            info = {'id': snapshot_id, 'label': label, 'taken_at': time.time(), 'traced_bytes': traced_bytes}
+            self._snapshots[snapshot_id] = {'snapshot': snapshot, 'info': info}
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return info
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(f"No snapshot {snapshot_id} (kept: {[info['id'] for info in self.list()]})")
+        return entry['snapshot']
+
+    def _group(self, group: str) -> str:
+        if group not in self.GROUPS:
+            raise ValueError(f"group must be one of {', '.join(self.GROUPS)}")
+        return group
+
+    def top(self, snapshot_id: int, group: str = 'lineno', limit: int = 20) -> List[Dict]:
+        """Largest allocation sites in one snapshot"""
+        stats = self._get(snapshot_id).statistics(self._group(group))
+        return [{'location': _location(stat.traceback, group), 'size_bytes': stat.size, 'count': stat.count}
+                for stat in stats[:limit]]
+
+    def diff(self, old_id: int, new_id: int, group: str = 'lineno', limit: int = 20) -> List[Dict]:
+        """Allocation sites that grew (or shrank) the most between two snapshots"""
+        stats = self._get(new_id).compare_to(self._get(old_id), self._group(group))
+        return [{'location': _location(stat.traceback, group), 'size_diff_bytes': stat.size_diff,
+                 'count_diff': stat.count_diff, 'size_bytes': stat.size, 'count': stat.count}
+                for stat in stats[:limit]]
+
+
+def _location(traceback: tracemalloc.Traceback, group: str):
+    if group == 'filename':
+        return traceback[0].filename
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+    return frames if group == 'traceback' else frames[0]
+
+
+# Global snapshot store
+tracemalloc_snapshots = TracemallocSnapshots(max_snapshots=int(os.getenv('DIAGNOSTICS_MAX_SNAPSHOTS', '4')))
@@ -3,25 +3,51 @@ Enhanced Command Processing Module for Buddy AI
 This module provides intelligent command processing capabilities for Buddy AI
 """
 
+import logging
 import re
-import webbrowser
 import requests
 import json
 import os
-import subprocess
 import platform
 from datetime import datetime, timedelta
 from urllib.parse import quote_plus
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 import psutil
 from model import call_gemini_ai
-from external_apis import get_weather_info, get_news_info, get_location_info
+from external_apis import get_weather_info, get_weather_multi_info, get_news_info, get_location_info
+from caching import SimilarityCache
+from gazetteer import Place, gazetteer
+from units import UnitError, parse_conversion
+from side_effects import current_effects
+
+logger = logging.getLogger(__name__)
+
+# Stateless knowledge questions whose AI answers can be reused for paraphrases
+KNOWLEDGE_QUERY = re.compile(
+    r"^(?:what(?:'s| is| are| was)|who (?:is|was)|explain|define|describe|tell me about|"
+    r"how (?:does|do) (?!i\b|you\b)|why (?:is|are|do|does)|what(?:'s| is) the difference)\b"
+)
 
 class BuddyCommandProcessor:
     def __init__(self):
         self.system_os = platform.system()
         self.command_patterns = self._initialize_patterns()
+        self.compiled_patterns = self._compile_patterns()
+        psutil.cpu_percent(interval=None)  # Start the CPU usage sampling window
         self.web_services = self._initialize_web_services()
+        self.answer_cache = SimilarityCache(
+            maxsize=int(os.getenv('SIMILARITY_CACHE_SIZE', '512')),
+            ttl=float(os.getenv('SIMILARITY_CACHE_TTL', '3600')),
+            threshold=float(os.getenv('SIMILARITY_THRESHOLD', '0.85'))
+        )
+
+    def open_url(self, url: str) -> bool:
+        """Open a browser tab if the current mode allows desktop actions (see side_effects.py)"""
+        return current_effects().open_url(url)
+
+    def launch_process(self, *args, **kwargs):
+        """Launch an application if the current mode allows desktop actions"""
+        return current_effects().launch_process(*args, **kwargs)
         
     def _initialize_patterns(self) -> Dict:
         """Initialize command patterns for various actions"""
@@ -146,6 +172,13 @@ class BuddyCommandProcessor:
             ]
         }
     
+    def _compile_patterns(self) -> Dict:
+        """Compile every command pattern once, up front"""
+        return {
+            category: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for category, patterns in self.command_patterns.items()
+        }
+    
     def _initialize_web_services(self) -> Dict:
         """Initialize web service URLs and patterns"""
         return {
@@ -190,15 +223,64 @@ class BuddyCommandProcessor:
             }
         
         # Try to match against known patterns
-        for category, patterns in self.command_patterns.items():
-            for pattern in patterns:
-                match = re.search(pattern, query, re.IGNORECASE)
-                if match:
-                    return self._execute_command(category, match, query)
+        category, match = self._match_command(query)
+        if match:
+            return self._execute_command(category, match, query)
+        
+        # Free-form conversions such as "10 kg in pounds" are answered offline
+        conversion = self._handle_unit_conversion(query)
+        if conversion:
+            return conversion
         
         # If no specific pattern matches, use AI for intelligent interpretation
         return self._ai_interpretation(query)
     
+    def _match_command(self, query: str) -> Tuple[Optional[str], Optional[re.Match]]:
+        """Find the first command pattern matching the query"""
+        for category, patterns in self.compiled_patterns.items():
+            for pattern in patterns:
+                match = pattern.search(query)
+                if match:
+                    return category, match
+        return None, None
+    
+    def _calculation_expression(self, match: re.Match) -> str:
+        """The part of a calculation query that holds the expression"""
+        return match.group(0) if match.lastindex is None else match.group(1)
+    
+    def is_local_query(self, query: str) -> bool:
+        """
+        True if the query is answered entirely in-process (greetings, identity,
+        time/date, simple arithmetic, system info) with no AI or network call.
+        """
+        query = query.lower().strip()
+        if not query or len(query) < 3:
+            return True
+        if query.startswith('what is temperature of') and len(query.split()) <= 4:
+            return True
+        
+        category, match = self._match_command(query)
+        if category in ('greeting', 'identity', 'system_info'):
+            return True
+        if category == 'information':
+            return 'time' in query or 'date' in query
+        if category in ('calculations', None) and parse_conversion(query) is not None:
+            return True
+        if category == 'calculations':
+            try:
+                return self._solve_locally(self._calculation_expression(match)) is not None
+            except Exception:
+                return False
+        return False
+    
+    def classify(self, query: str) -> str:
+        """
+        Return the category a query would be routed to without executing it.
+        Unmatched queries are reported as 'ai_interpretation'.
+        """
+        category, _ = self._match_command(query.lower().strip())
+        return category or 'ai_interpretation'
+    
     def _execute_command(self, category: str, match: re.Match, original_query: str) -> Dict:
         """Execute commands based on category"""
         try:
@@ -210,11 +292,11 @@ class BuddyCommandProcessor:
                 return self._handle_direct_open(match.group(1), original_query)
             elif category == 'weather':
                 location = match.group(1) if match.lastindex and match.group(1) else self._extract_location(original_query)
-                return self._get_weather_info(location)
+                return self._get_weather_info(location, original_query)
             elif category == 'ai_conversation':
                 return self._handle_ai_conversation(original_query)
             elif category == 'calculations':
-                return self._handle_calculations(match.group(0) if match.lastindex is None else match.group(1))
+                return self._handle_calculations(self._calculation_expression(match), original_query)
             elif category == 'web_search':
                 return self._handle_web_search(match.group(1))
             elif category == 'system_control':
@@ -276,7 +358,7 @@ class BuddyCommandProcessor:
         # Check for exact matches first
         if target in direct_websites:
             url = direct_websites[target]
-            webbrowser.open(url)
+            self.open_url(url)
             return {
                 'success': True,
                 'message': f"Opening {target.title()}",
@@ -301,7 +383,7 @@ class BuddyCommandProcessor:
         if target in abbreviations:
             full_name = abbreviations[target]
             url = direct_websites[full_name]
-            webbrowser.open(url)
+            self.open_url(url)
             return {
                 'success': True,
                 'message': f"Opening {full_name.title()}",
@@ -344,7 +426,7 @@ class BuddyCommandProcessor:
         # If it looks like a URL or domain
         if '.' in target or target.endswith('.com') or target.endswith('.org'):
             url = target if target.startswith('http') else f"https://{target}"
-            webbrowser.open(url)
+            self.open_url(url)
             return {
                 'success': True,
                 'message': f"Opening {target}",
@@ -382,7 +464,7 @@ class BuddyCommandProcessor:
         """
         
         try:
-            response = call_gemini_ai(prompt)
+            response = call_gemini_ai(prompt, intent='direct_open')
             lines = response.strip().split('\n')
             
             action_line = next((line for line in lines if line.startswith('ACTION:')), '')
@@ -395,7 +477,7 @@ class BuddyCommandProcessor:
                 message = message_line.split(':', 1)[1].strip()
                 
                 if action == 'website':
-                    webbrowser.open(url_or_app)
+                    self.open_url(url_or_app)
                     return {
                         'success': True,
                         'message': message,
@@ -408,7 +490,7 @@ class BuddyCommandProcessor:
                     return self._handle_web_search(target)
             
         except Exception as e:
-            print(f"AI decision error: {e}")
+            logger.warning("AI decision error: %s", e)
         
         # Fallback: treat as web search
         return self._handle_web_search(target)
@@ -485,7 +567,7 @@ class BuddyCommandProcessor:
         search_platform = self._determine_search_platform(query)
         search_url = self.web_services[search_platform].format(quote_plus(query))
         
-        webbrowser.open(search_url)
+        self.open_url(search_url)
         return {
             'success': True,
             'message': f"Searching for '{query}' on {search_platform.title()}",
@@ -556,11 +638,11 @@ class BuddyCommandProcessor:
         
         try:
             if self.system_os == "Windows":
-                subprocess.Popen(executable, shell=True)
+                self.launch_process(executable, shell=True)
             elif self.system_os == "Darwin":  # macOS
-                subprocess.Popen(["open", "-a", application])
+                self.launch_process(["open", "-a", application])
             else:  # Linux
-                subprocess.Popen([application])
+                self.launch_process([application])
             
             return {
                 'success': True,
@@ -606,15 +688,9 @@ class BuddyCommandProcessor:
             
             # If no location found from regex, try to extract from query
             if not location or location == "current location":
-                # Look for city names in the query
-                import re
-                query_clean = query_lower.replace('weather', '').replace('temperature', '').replace('in', '').replace('of', '').replace('for', '').strip()
-                if query_clean:
-                    location = query_clean
-                else:
-                    location = "current location"
+                location = self._extract_location(query)
             
-            return self._get_weather_info(location)
+            return self._get_weather_info(location, query)
         
         elif 'news' in query_lower:
             topic = match.group(1) if match and match.groups() else "general"
@@ -662,7 +738,8 @@ class BuddyCommandProcessor:
                 }
             
             elif 'cpu' in query_lower:
-                cpu_percent = psutil.cpu_percent(interval=1)
+                # Non-blocking: usage since the previous call (primed in __init__)
+                cpu_percent = psutil.cpu_percent(interval=None)
                 return {
                     'success': True,
                     'message': f"CPU usage: {cpu_percent}%",
@@ -690,9 +767,13 @@ class BuddyCommandProcessor:
                 'action': 'system_info'
             }
     
-    def _get_weather_info(self, location: str) -> Dict:
+    def _get_weather_info(self, location: str, query: Optional[str] = None) -> Dict:
         """Get weather information using external API"""
-        result = get_weather_info(location)
+        locations = self._weather_locations(location, query)
+        if len(locations) > 1:
+            result = get_weather_multi_info(locations)
+        else:
+            result = get_weather_info(locations[0] if locations else location)
         return {
             'success': result['success'],
             'message': result['message'],
@@ -700,12 +781,45 @@ class BuddyCommandProcessor:
             'data': result.get('data', {})
         }
     
+    def _cached_knowledge_answer(self, query: str) -> Optional[str]:
+        """Look up a previous AI answer to this or a near-identical knowledge question"""
+        if not KNOWLEDGE_QUERY.match(query.lower().strip()):
+            return None
+        return self.answer_cache.get(query, namespace='knowledge')
+    
+    def _intelligent_answer(self, query: str, intent: str = 'ai_conversation') -> str:
+        """Ask the AI, caching answers to stateless knowledge questions"""
+        from model import get_intelligent_response
+        
+        response = get_intelligent_response(query, intent=intent)
+        if KNOWLEDGE_QUERY.match(query.lower().strip()):
+            self.answer_cache.set(query, response, namespace='knowledge')
+        return response
+    
+    def warm_answer(self, query: str) -> bool:
+        """Prime the answer cache with a hot knowledge question; returns True if cached"""
+        if not KNOWLEDGE_QUERY.match(query.lower().strip()):
+            return False
+        if self._cached_knowledge_answer(query) is None:
+            self._intelligent_answer(query)
+        return True
+    
     def _handle_ai_conversation(self, query: str) -> Dict:
         """Handle general AI conversations like ChatGPT/Gemini"""
-        from model import get_intelligent_response, QuotaExceededException
+        from model import QuotaExceededException
+        
+        cached = self._cached_knowledge_answer(query)
+        if cached:
+            return {
+                'success': True,
+                'message': cached,
+                'action': 'ai_conversation',
+                'original_query': query,
+                'note': 'Served from answer cache'
+            }
         
         try:
-            response = get_intelligent_response(query)
+            response = self._intelligent_answer(query)
             return {
                 'success': True,
                 'message': response,
@@ -783,12 +897,49 @@ class BuddyCommandProcessor:
     
     def _extract_location(self, query: str) -> str:
         """Extract location from weather query"""
-        # Remove common weather-related words to get location
+        places = gazetteer.spot(query)
+        if places:
+            return '; '.join(place.query for place in places)
+        # Unknown city: remove common weather-related words to get location
         weather_words = ['weather', 'temperature', 'what', 'is', 'the', 'in', 'for', 'of', 'how', 'tell', 'me', 'about']
         words = query.lower().split()
         location_words = [word for word in words if word not in weather_words]
         return ' '.join(location_words).strip() or 'current location'
     
+    def _weather_locations(self, location: str, query: Optional[str] = None) -> List[Union[Place, str]]:
+        """
+        Places for a weather request. Each part of the location string is
+        resolved through the gazetteer and kept as free text only if it names
+        no known city; if no part does, the whole query is scanned instead
+        (for "berlin weather today" the pattern captures "today").
+        """
+        locations = []
+        for part in self._split_locations(location):
+            for found in gazetteer.spot(part) or [part]:
+                if found not in locations:
+                    locations.append(found)
+        if query and not any(isinstance(found, Place) for found in locations):
+            locations = gazetteer.spot(query) or locations
+        return locations
+    
+    def _split_locations(self, location: str) -> List[str]:
+        """Split strings like 'mumbai, delhi and pune' into individual locations"""
+        location = re.sub(r'^(?:compare|between)\s+', '', location.strip().rstrip('?.!'))
+        parts = re.split(r'\s*(?:,|;|&|\band\b|\bvs\.?|\bversus\b)\s*', location)
+        
+        locations = []
+        for part in parts:
+            part = re.sub(r'^(?:in|of|for)\s+', '', part.strip())
+            if not part:
+                continue
+            # Keep country codes such as 'London,UK' attached to their city; other
+            # short parts ('ny and la') are locations of their own
+            if locations and len(part) == 2 and gazetteer.country(part):
+                locations[-1] = f"{locations[-1]},{part}"
+            elif part not in locations:
+                locations.append(part)
+        return locations
+    
     def _get_news_info(self, topic: str) -> Dict:
         """Get news information using external API"""
         result = get_news_info(topic)
@@ -799,51 +950,84 @@ class BuddyCommandProcessor:
             'data': result.get('data', {})
         }
     
-    def _handle_calculations(self, expression: str) -> Dict:
+    def _solve_locally(self, expression: str) -> Optional[Dict]:
+        """Solve percentages and simple arithmetic without AI; None if the expression needs AI"""
+        percentage_match = re.search(r'(\d+)%?\s*(?:of|from)\s*(\d+)', expression)
+        if percentage_match:
+            percent = float(percentage_match.group(1))
+            number = float(percentage_match.group(2))
+            result = (percent / 100) * number
+            return {
+                'success': True,
+                'message': f"{percent}% of {number} is {result}",
+                'action': 'calculation',
+                'data': {'expression': expression, 'result': result}
+            }
+                    
+        arithmetic_match = re.search(r'(\d+(?:\.\d+)?)\s*([\+\-\*\/\^]|plus|minus|times|divided by)\s*(\d+(?:\.\d+)?)', expression)
+        if arithmetic_match:
+            num1 = float(arithmetic_match.group(1))
+            operator = arithmetic_match.group(2).lower()
+            num2 = float(arithmetic_match.group(3))
+            
+            if operator in ['+', 'plus']:
+                result = num1 + num2
+            elif operator in ['-', 'minus']:
+                result = num1 - num2
+            elif operator in ['*', 'times']:
+                result = num1 * num2
+            elif operator in ['/', 'divided by']:
+                result = num1 / num2 if num2 != 0 else "Error: Division by zero"
+            elif operator in ['^']:
+                result = num1 ** num2
+            else:
+                raise ValueError("Unknown operator")
+            
+            return {
+                'success': True,
+                'message': f"{num1} {operator} {num2} = {result}",
+                'action': 'calculation',
+                'data': {'expression': expression, 'result': result}
+            }
+        
+        return None
+    
+    def _handle_unit_conversion(self, query: str) -> Optional[Dict]:
+        """Answer a unit conversion offline; None if the query is not one"""
+        conversion = parse_conversion(query)
+        if conversion is None:
+            return None
+        try:
+            return {
+                'success': True,
+                'message': conversion.message,
+                'action': 'unit_conversion',
+                'data': conversion.to_dict()
+            }
+        except UnitError as e:
+            # Both units are known but measure different things ("kg to meters")
+            return {
+                'success': True,
+                'message': str(e),
+                'action': 'unit_conversion',
+                'data': {'from': conversion.source.name, 'to': conversion.target.name}
+            }
+    
+    def _handle_calculations(self, expression: str, query: Optional[str] = None) -> Dict:
         """Handle mathematical calculations"""
         try:            
-            percentage_match = re.search(r'(\d+)%?\s*(?:of|from)\s*(\d+)', expression)
-            if percentage_match:
-                percent = float(percentage_match.group(1))
-                number = float(percentage_match.group(2))
-                result = (percent / 100) * number
-                return {
-                    'success': True,
-                    'message': f"{percent}% of {number} is {result}",
-                    'action': 'calculation',
-                    'data': {'expression': expression, 'result': result}
-                }
-                        
-            arithmetic_match = re.search(r'(\d+(?:\.\d+)?)\s*([\+\-\*\/\^]|plus|minus|times|divided by)\s*(\d+(?:\.\d+)?)', expression)
-            if arithmetic_match:
-                num1 = float(arithmetic_match.group(1))
-                operator = arithmetic_match.group(2).lower()
-                num2 = float(arithmetic_match.group(3))
-                
-                if operator in ['+', 'plus']:
-                    result = num1 + num2
-                elif operator in ['-', 'minus']:
-                    result = num1 - num2
-                elif operator in ['*', 'times']:
-                    result = num1 * num2
-                elif operator in ['/', 'divided by']:
-                    result = num1 / num2 if num2 != 0 else "Error: Division by zero"
-                elif operator in ['^']:
-                    result = num1 ** num2
-                else:
-                    raise ValueError("Unknown operator")
-                
-                return {
-                    'success': True,
-                    'message': f"{num1} {operator} {num2} = {result}",
-                    'action': 'calculation',
-                    'data': {'expression': expression, 'result': result}
-                }
+            conversion = self._handle_unit_conversion(query or expression)
+            if conversion:
+                return conversion
+            
+            local_result = self._solve_locally(expression)
+            if local_result:
+                return local_result
             
             # For complex calculations, use AI
             from model import get_intelligent_response
             prompt = f"Calculate or solve this math problem and provide just the answer with a brief explanation: {expression}"
-            result = get_intelligent_response(prompt)
+            result = get_intelligent_response(prompt, intent='calculation')
             return {
                 'success': True,
                 'message': result,
@@ -870,6 +1054,16 @@ class BuddyCommandProcessor:
                 'note': 'Using offline knowledge base'
             }
         
+        cached = self._cached_knowledge_answer(query)
+        if cached:
+            return {
+                'success': True,
+                'message': cached,
+                'action': 'ai_interpretation',
+                'original_query': query,
+                'note': 'Served from answer cache'
+            }
+        
         # If no fallback matches, try AI
         prompt = f"""
         You are Buddy AI, a helpful personal assistant. The user just said: "{query}"
@@ -888,8 +1082,8 @@ class BuddyCommandProcessor:
         """
         
         try:
-            from model import get_intelligent_response, QuotaExceededException
-            response = get_intelligent_response(query)
+            from model import QuotaExceededException
+            response = self._intelligent_answer(query, intent='ai_interpretation')
             return {
                 'success': True,
                 'message': response,
@@ -922,6 +1116,10 @@ class BuddyCommandProcessor:
         
         return None
     
+    def offline_response(self, query: str) -> str:
+        """Best offline answer for a query, used when the AI upstream is unavailable"""
+        return self._check_common_fallbacks(query) or self._get_enhanced_fallback(query)
+    
     def _get_enhanced_fallback(self, query: str) -> str:
         """Enhanced fallback responses for when AI API is unavailable"""
         query_lower = query.lower()
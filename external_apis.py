@@ -5,9 +5,17 @@ Handles weather, news, and other external service integrations
 
 import requests
 import os
-from typing import Dict, Optional
+import time
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 from dotenv import load_dotenv
+from caching import TTLCache
+from gazetteer import Place, gazetteer
+from http_transport import session_from_env
+from request_context import DeadlineExceeded, current_context, stage_timeout, submit_in_context
+from resilience import CircuitOpenError, get_breaker
 
 # Load environment variables
 load_dotenv()
@@ -16,10 +24,52 @@ class ExternalAPIManager:
     def __init__(self):
         self.weather_api_key = os.getenv('OPENWEATHER_API_KEY')
         self.news_api_key = os.getenv('NEWS_API_KEY')
+        # Pooled keep-alive connections shared by all upstream calls; live,
+        # recorded or replayed depending on HTTP_TRANSPORT (see http_transport.py)
+        self.session = session_from_env(pool_connections=4,
+                                        pool_maxsize=int(os.getenv('HTTP_POOL_SIZE', '16')))
+        # Bounded pool used to fan out multi-location weather lookups
+        self.fanout_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('WEATHER_FANOUT_WORKERS', '4')),
+            thread_name_prefix='buddy-weather'
+        )
+        # Circuit breakers so a degraded upstream is skipped instead of waited on
+        self.weather_breaker = get_breaker('openweathermap', slow_call_seconds=5.0)
+        self.news_breaker = get_breaker('newsapi', slow_call_seconds=5.0)
+        # Per-client-IP geolocation results, so "auto" weather costs no extra hop
+        self.location_cache = TTLCache(
+            maxsize=int(os.getenv('GEOLOCATION_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('GEOLOCATION_CACHE_TTL', '3600'))
+        )
         
-    def get_weather(self, location: str = "auto") -> Dict:
+    def _guarded_get(self, breaker, url: str, params: Dict, timeout: float = 10):
         """
-        Get weather information for a location
+        Pooled HTTP GET through a circuit breaker. Network errors, 429s and 5xx
+        responses count as upstream failures; other statuses are healthy.
+        Any exception from the call is recorded before it propagates, so a
+        half-open breaker always gets its probe slot back. The timeout is capped by what is left of the request deadline.
+        """
+        timeout = stage_timeout(timeout)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+        
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, params=params, timeout=timeout)
+        except Exception:
+            breaker.record_failure(time.monotonic() - started)
+            raise
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure(time.monotonic() - started)
+        else:
+            breaker.record_success(time.monotonic() - started)
+        return response
+    
+    def get_weather(self, location: Union[str, Place] = "auto") -> Dict:
+        """
+        Get weather information for a location. Places known to the gazetteer
+        are looked up by id; anything else is sent as a free-text name.
         """
         if not self.weather_api_key:
             return {
@@ -29,39 +79,27 @@ class ExternalAPIManager:
             }
         
         try:
-            # If location is auto, try to get user's location (simplified)
-            if location.lower() in ['auto', 'current location', 'here']:
-                location = "London"  # Default fallback
-            
-            # Handle common city name variations
-            city_mapping = {
-                'bangalore': 'Bengaluru,IN',
-                'bengaluru': 'Bengaluru,IN',
-                'mumbai': 'Mumbai,IN',
-                'bombay': 'Mumbai,IN',
-                'delhi': 'New Delhi,IN',
-                'new delhi': 'New Delhi,IN',
-                'calcutta': 'Kolkata,IN',
-                'kolkata': 'Kolkata,IN',
-                'chennai': 'Chennai,IN',
-                'madras': 'Chennai,IN',
-                'hyderabad': 'Hyderabad,IN',
-                'pune': 'Pune,IN',
-                'ahmedabad': 'Ahmedabad,IN'
-            }
+            # If location is auto, resolve it from the client's IP address
+            if isinstance(location, str) and location.lower() in ['auto', 'current location', 'here']:
+                location = self.resolve_auto_location()
             
-            # Check if we have a mapping for this city
-            location_query = city_mapping.get(location.lower(), location)
+            # Canonical place from the offline gazetteer (aliases like "bombay" included)
+            place = location if isinstance(location, Place) else gazetteer.resolve(location)
+            if place:
+                location = place.name
             
             # OpenWeatherMap API call
             url = f"http://api.openweathermap.org/data/2.5/weather"
             params = {
-                'q': location_query,
                 'appid': self.weather_api_key,
                 'units': 'metric'
             }
+            if place:
+                params['id'] = place.id
+            else:
+                params['q'] = location
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._guarded_get(self.weather_breaker, url, params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -99,6 +137,18 @@ class ExternalAPIManager:
                     'data': None
                 }
                 
+        except CircuitOpenError:
+            return {
+                'success': False,
+                'message': "The weather service is temporarily unavailable. Please try again in a moment.",
+                'data': None
+            }
+        except DeadlineExceeded:
+            return {
+                'success': False,
+                'message': "The weather service is taking too long to respond. Please try again in a moment.",
+                'data': None
+            }
         except requests.RequestException as e:
             return {
                 'success': False,
@@ -112,6 +162,36 @@ class ExternalAPIManager:
                 'data': None
             }
     
+    def get_weather_multi(self, locations: List[Union[str, Place]]) -> Dict:
+        """
+        Get weather for several locations concurrently and combine the results
+        into a single reply. Total latency is roughly one upstream round trip.
+        """
+        futures = [submit_in_context(self.fanout_executor, self.get_weather, location)
+                   for location in locations]
+        results = [future.result() for future in futures]
+        succeeded = [result['data'] for result in results if result['success']]
+        
+        if not succeeded:
+            return {
+                'success': False,
+                'message': "\n".join(result['message'] for result in results),
+                'data': None
+            }
+        
+        message = "\n".join(result['message'] for result in results)
+        if len(succeeded) > 1:
+            warmest = max(succeeded, key=lambda info: info['temperature'])
+            coolest = min(succeeded, key=lambda info: info['temperature'])
+            message += (f"\n{warmest['location']} is the warmest at {warmest['temperature']}°C"
+                        f" and {coolest['location']} is the coolest at {coolest['temperature']}°C.")
+        
+        return {
+            'success': True,
+            'message': message,
+            'data': succeeded
+        }
+    
     def get_news(self, topic: str = "general", count: int = 5) -> Dict:
         """
         Get news articles about a specific topic
@@ -134,7 +214,7 @@ class ExternalAPIManager:
                 'pageSize': count
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._guarded_get(self.news_breaker, url, params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -165,6 +245,18 @@ class ExternalAPIManager:
                     'data': None
                 }
                 
+        except CircuitOpenError:
+            return {
+                'success': False,
+                'message': "The news service is temporarily unavailable. Please try again in a moment.",
+                'data': None
+            }
+        except DeadlineExceeded:
+            return {
+                'success': False,
+                'message': "The news service is taking too long to respond. Please try again in a moment.",
+                'data': None
+            }
         except requests.RequestException as e:
             return {
                 'success': False,
@@ -178,42 +270,118 @@ class ExternalAPIManager:
                 'data': None
             }
     
-    def get_ip_location(self) -> Dict:
+    def get_ip_location(self, ip: Optional[str] = None) -> Dict:
         """
-        Get user's approximate location based on IP
+        Get user's approximate location based on IP.
+        With no IP the lookup is for this machine's own public address.
+        Results are cached per IP; failures are cached briefly to avoid hammering ipapi.co.
         """
+        cache_key = ip or 'self'
+        cached = self.location_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        url = f'http://ipapi.co/{ip}/json/' if ip else 'http://ipapi.co/json/'
         try:
-            response = requests.get('http://ipapi.co/json/', timeout=5)
+            timeout = stage_timeout(5)
+        except DeadlineExceeded:
+            # Out of time for this request only; don't cache it as a failure
+            return {
+                'success': False,
+                'city': 'Unknown',
+                'country': 'Unknown',
+                'country_code': '',
+                'timezone': 'Unknown'
+            }
+        
+        try:
+            response = self.session.get(url, timeout=timeout)
             if response.status_code == 200:
                 data = response.json()
-                return {
-                    'success': True,
-                    'city': data.get('city', 'Unknown'),
-                    'country': data.get('country_name', 'Unknown'),
-                    'timezone': data.get('timezone', 'Unknown')
-                }
+                if not data.get('error'):
+                    location = {
+                        'success': True,
+                        'city': data.get('city', 'Unknown'),
+                        'country': data.get('country_name', 'Unknown'),
+                        'country_code': data.get('country', ''),
+                        'timezone': data.get('timezone', 'Unknown')
+                    }
+                    self.location_cache.set(cache_key, location)
+                    return location
         except:
             pass
         
-        return {
+        location = {
             'success': False,
             'city': 'Unknown',
             'country': 'Unknown',
+            'country_code': '',
             'timezone': 'Unknown'
         }
+        self.location_cache.set(cache_key, location, ttl=60)
+        return location
+    
+    def warm_connections(self) -> Dict:
+        """
+        Open pooled connections (DNS, TCP and TLS) to the configured upstreams
+        so the first real request does not pay for them. Returns per-host status.
+        """
+        hosts = ['http://ipapi.co/']
+        if self.weather_api_key:
+            hosts.append('http://api.openweathermap.org/')
+        if self.news_api_key:
+            hosts.append('https://newsapi.org/')
+        
+        status = {}
+        for host in hosts:
+            try:
+                self.session.head(host, timeout=5)
+                status[host] = 'ok'
+            except requests.RequestException as e:
+                status[host] = f"error: {e}"
+        return status
+    
+    def resolve_auto_location(self) -> str:
+        """
+        Resolve "auto"/"here" to the requesting client's city.
+        Loopback clients share this machine's location; other private addresses
+        cannot be geolocated, so they get the default city.
+        """
+        client_ip = current_context().client_ip
+        lookup_ip = None
+        if client_ip:
+            try:
+                address = ipaddress.ip_address(client_ip)
+            except ValueError:
+                return "London"
+            if not address.is_loopback:
+                if not address.is_global:
+                    return "London"
+                lookup_ip = client_ip
+        
+        location = self.get_ip_location(lookup_ip)
+        if location['success'] and location['city'] != 'Unknown':
+            if location['country_code']:
+                return f"{location['city']},{location['country_code']}"
+            return location['city']
+        return "London"  # Default fallback
 
 # Global instance
 api_manager = ExternalAPIManager()
 
 # Convenience functions
-def get_weather_info(location: str = "auto") -> Dict:
+def get_weather_info(location: Union[str, Place] = "auto") -> Dict:
     """Convenience function to get weather"""
     return api_manager.get_weather(location)
 
+def get_weather_multi_info(locations: List[Union[str, Place]]) -> Dict:
+    """Convenience function to get weather for several locations at once"""
+    return api_manager.get_weather_multi(locations)
+
 def get_news_info(topic: str = "general") -> Dict:
     """Convenience function to get news"""
     return api_manager.get_news(topic)
 
-def get_location_info() -> Dict:
+def get_location_info(ip: Optional[str] = None) -> Dict:
     """Convenience function to get location"""
-    return api_manager.get_ip_location()
+    return api_manager.get_ip_location(ip)
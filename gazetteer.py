@@ -0,0 +1,187 @@
+"""
+Gazetteer Module for Buddy AI
+Offline city lookup for weather queries. A small bundled dataset of cities
+(data/cities.tsv: GeoNames ids, names, aliases, countries) is loaded into a
+token trie, and queries are scanned for the longest city names they contain.
+Locations are resolved to canonical places, with ids OpenWeatherMap accepts,
+before any network call instead of being guessed from the leftover words.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from diagnostics import approx_size
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Trie key marking the end of a name; tokens are never empty so it cannot clash
+_END = ''
+
+
+class Place:
+    """One city from the gazetteer"""
+
+    def __init__(self, place_id: int, name: str, country: str, population: int = 0):
+        self.id = place_id
+        self.name = name
+        self.country = country
+        self.population = population
+
+    @property
+    def query(self) -> str:
+        """Name in the 'City,CC' form used by OpenWeatherMap and elsewhere in Buddy"""
+        return f"{self.name},{self.country}"
+
+    def __repr__(self):
+        return f"Place({self.id}, {self.query!r})"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words with accents and punctuation removed ("São Paulo," -> ['sao', 'paulo'])"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def _insert(trie: Dict, tokens: List[str], value):
+    node = trie
+    for token in tokens:
+        node = node.setdefault(token, {})
+    values = node.setdefault(_END, [])
+    if value not in values:
+        values.append(value)
+
+
+def _longest(trie: Dict, tokens: List[str], start: int) -> Tuple[int, List]:
+    """Longest name starting at tokens[start]: (end index, values), or (start, []) if none"""
+    node = trie
+    end, values = start, []
+    for i in range(start, len(tokens)):
+        node = node.get(tokens[i])
+        if node is None:
+            break
+        if _END in node:
+            end, values = i + 1, node[_END]
+    return end, values
+
+
+def _read_tsv(path: str) -> List[List[str]]:
+    """Rows of a tab-separated file, skipping comments and the header row"""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            rows.append(line.split('\t'))
+    return rows[1:]
+
+
+class Gazetteer:
+    """
+    City and country names in token tries. Loaded on first use (or by the
+    warm-up); lookups are read-only afterwards and safe from any thread.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self._places = {}
+        self._cities = {}
+        self._countries = {}
+        self._aliases = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict:
+        """Read the bundled dataset; safe to call more than once"""
+        with self._lock:
+            if not self._loaded:
+                for row in _read_tsv(os.path.join(self.data_dir, 'cities.tsv')):
+                    place_id, name, country, population = row[:4]
+                    place = Place(int(place_id), name, country, int(population or 0))
+                    self._places[place.id] = place
+                    aliases = [name] + (row[4].split('|') if len(row) > 4 and row[4] else [])
+                    for alias in aliases:
+                        _insert(self._cities, tokenize(alias), place.id)
+                    self._aliases += len(aliases)
+
+                for code, *names in _read_tsv(os.path.join(self.data_dir, 'countries.tsv')):
+                    for name in [code] + (names[0].split('|') if names and names[0] else []):
+                        _insert(self._countries, tokenize(name), code)
+                self._loaded = True
+        return self.stats()
+
+    def stats(self) -> Dict:
+        return {'places': len(self._places), 'aliases': self._aliases, 'loaded': self._loaded}
+
+    def memory(self) -> Dict:
+        """Stats plus the approximate size of the tries (for diagnostics)"""
+        return dict(self.stats(), approx_bytes=approx_size([self._places, self._cities, self._countries]))
+
+    def get(self, place_id: int) -> Optional[Place]:
+        """Place by its id"""
+        if not self._loaded:
+            self.load()
+        return self._places.get(place_id)
+
+    def country(self, name: str) -> Optional[str]:
+        """ISO code of the country the whole string names ("uk", "GB", "France"), else None"""
+        if not self._loaded:
+            self.load()
+        tokens = tokenize(name)
+        end, codes = _longest(self._countries, tokens, 0)
+        return codes[0] if tokens and end == len(tokens) else None
+
+    def _match_at(self, tokens: List[str], start: int) -> Tuple[int, Optional[Place]]:
+        """
+        City named at tokens[start], taking a country right after it into account
+        ("london uk", "paris, france"). Same-name cities without a country go to
+        the most populous one. Returns (end index, place) or (start, None).
+        """
+        end, ids = _longest(self._cities, tokens, start)
+        if not ids:
+            return start, None
+        candidates = [self._places[place_id] for place_id in ids]
+
+        country_end, codes = _longest(self._countries, tokens, end)
+        qualified = [place for place in candidates if place.country in codes]
+        if qualified:
+            candidates, end = qualified, country_end
+        return end, max(candidates, key=lambda place: place.population)
+
+    def spot(self, text: str) -> List[Place]:
+        """Every city mentioned in the text, left to right, longest names first"""
+        if not self._loaded:
+            self.load()
+        tokens = tokenize(text)
+        places = []
+        i = 0
+        while i < len(tokens):
+            end, place = self._match_at(tokens, i)
+            if place is None:
+                i += 1
+                continue
+            if place not in places:
+                places.append(place)
+            i = end
+        return places
+
+    def resolve(self, location: str) -> Optional[Place]:
+        """The place if the whole string names one city (optionally with its country), else None"""
+        if not self._loaded:
+            self.load()
+        tokens = tokenize(location)
+        end, place = self._match_at(tokens, 0)
+        return place if tokens and end == len(tokens) else None
+
+
+def gazetteer_from_env() -> Gazetteer:
+    """Build the gazetteer from GAZETTEER_DIR (default: the bundled data directory)"""
+    return Gazetteer(os.getenv('GAZETTEER_DIR', DATA_DIR))
+
+
+# Global gazetteer (loaded lazily or by the warm-up)
+gazetteer = gazetteer_from_env()
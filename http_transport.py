@@ -0,0 +1,358 @@
+"""
+HTTP Transport Module for Buddy AI
+The transport under ExternalAPIManager's requests session, selected with
+HTTP_TRANSPORT:
+
+    live    real calls to OpenWeatherMap, NewsAPI and ipapi.co (default)
+    record  real calls, with every response appended to a cassette file
+    replay  responses served from the cassette by a local stand-in HTTP server
+    fault   replay plus injected latency, connection resets and error statuses
+
+Replayed requests really go over a local socket, so pooling, timeouts and the
+circuit breakers are exercised as in production, but the weather and news
+paths can be benchmarked offline and reproducibly. API keys are stripped from
+recorded URLs, so replay works with any (non-empty) key configured.
+
+Configuration:
+    HTTP_CASSETTE        cassette file (default cassettes/external_apis.jsonl)
+    HTTP_REPLAY_LATENCY  "recorded" (default) or a latency spec as in llm_standin.py
+    HTTP_FAULTS          fault mode rates, e.g. "429:0.05,503:0.02,404:0.01,reset:0.01"
+    HTTP_FAULT_SEED      seed for latency and fault sampling (default 0)
+    HTTP_STANDIN_URL     use an already running replay server instead of starting one
+
+Usage:
+    HTTP_TRANSPORT=record python main.py
+    python http_transport.py serve --faults 429:0.1 --latency uniform:0.05,0.3
+    python http_transport.py show cassettes/external_apis.jsonl
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_standin import parse_latency
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CASSETTE = os.path.join('cassettes', 'external_apis.jsonl')
+
+# Query parameters that carry credentials; never written to a cassette or used for matching
+SECRET_PARAMS = {'appid', 'apikey', 'api_key', 'key', 'token', 'access_key'}
+
+# Response headers worth replaying
+KEPT_HEADERS = ('Content-Type', 'Retry-After')
+
+
+def redact_url(url: str) -> str:
+    """The URL with credential parameters removed and the rest sorted, used to match requests"""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in SECRET_PARAMS)
+    return f"{parts.scheme}://{parts.netloc}{parts.path or '/'}" + (f"?{urlencode(query)}" if query else '')
+
+
+def interaction_key(method: str, url: str) -> str:
+    return f"{method.upper()} {redact_url(url)}"
+
+
+class Cassette:
+    """
+    Recorded interactions in a JSON-lines file. A request recorded several
+    times is replayed in recording order, wrapping around at the end.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._interactions = defaultdict(list)
+        self._cursors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'Cassette':
+        cassette = cls(path)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        interaction = json.loads(line)
+                        cassette._interactions[interaction['key']].append(interaction)
+        return cassette
+
+    def __len__(self):
+        return sum(len(recorded) for recorded in self._interactions.values())
+
+    def keys(self) -> List[str]:
+        return list(self._interactions)
+
+    def record(self, method: str, url: str, response: requests.Response, elapsed: float) -> Dict:
+        interaction = {
+            'key': interaction_key(method, url),
+            'url': redact_url(url),
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            'body': response.content.decode('utf-8', 'replace'),
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        }
+        with self._lock:
+            self._interactions[interaction['key']].append(interaction)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(interaction, ensure_ascii=False) + '\n')
+        return interaction
+
+    def play(self, key: str) -> Tuple[Optional[Dict], int]:
+        """The next recorded interaction for a request key and how many times the key was asked for before"""
+        with self._lock:
+            occurrence = self._cursors[key]
+            self._cursors[key] += 1
+            recorded = self._interactions.get(key)
+            return (recorded[occurrence % len(recorded)] if recorded else None), occurrence
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Pooled adapter that appends every response it receives to a cassette"""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        if not kwargs.get('stream'):
+            self.cassette.record(request.method, request.url, response, time.monotonic() - started)
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Pooled adapter that sends every request to the replay server instead of the real host"""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, request, **kwargs):
+        original = request.url
+        parts = urlsplit(original)
+        request.url = (f"{self.base_url}/{parts.scheme}/{parts.netloc}{parts.path or '/'}"
+                       + (f"?{parts.query}" if parts.query else ''))
+        response = super().send(request, **kwargs)
+        response.url = original
+        return response
+
+
+def parse_faults(spec: str) -> List[Tuple[str, float]]:
+    """'429:0.05,503:0.02,reset:0.01' -> [('429', 0.05), ('503', 0.02), ('reset', 0.01)]"""
+    faults = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, rate = item.partition(':')
+        if kind != 'reset' and not kind.isdigit():
+            raise ValueError(f"Unknown fault '{kind}' (use an HTTP status code or 'reset')")
+        faults.append((kind, float(rate)))
+    if sum(rate for _, rate in faults) > 1:
+        raise ValueError("Fault rates add up to more than 1")
+    return faults
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Serves cassette interactions. Latency and faults are drawn from a random
+    generator seeded per (seed, request key, occurrence), so a benchmark sees
+    the same delays and failures on every run, even with concurrent requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, cassette: Cassette, latency: str = 'recorded',
+                 faults: Optional[List[Tuple[str, float]]] = None, seed: int = 0):
+        super().__init__(address, ReplayHandler)
+        self.cassette = cassette
+        self.latency = latency
+        self.faults = faults or []
+        self.seed = seed
+        self.counts = defaultdict(int)
+        self._counts_lock = threading.Lock()
+
+    def sample(self, key: str, occurrence: int, interaction: Optional[Dict]) -> Tuple[float, Optional[str]]:
+        """Draw (latency in seconds, injected fault or None) for one request"""
+        rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+        if self.latency == 'recorded':
+            latency = interaction['elapsed_ms'] / 1000 if interaction else 0.0
+        else:
+            latency = parse_latency(self.latency, rng)()
+
+        roll = rng.random()
+        for kind, rate in self.faults:
+            if roll < rate:
+                return latency, kind
+            roll -= rate
+        return latency, None
+
+    def count(self, key: str):
+        with self._counts_lock:
+            self.counts[key] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response and send it in one write; separate header and body
+    # segments on a keep-alive connection can stall on delayed ACKs
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: Optional[Dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        self._send(status, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json', **(headers or {})})
+
+    def _original_url(self) -> Optional[str]:
+        """/https/newsapi.org/v2/everything?q=x -> https://newsapi.org/v2/everything?q=x"""
+        scheme, _, rest = self.path.lstrip('/').partition('/')
+        if scheme not in ('http', 'https') or not rest:
+            return None
+        return f"{scheme}://{rest}"
+
+    def _replay(self):
+        if self.path == '/__stats':
+            with self.server._counts_lock:
+                self._send_json(200, dict(self.server.counts, interactions=len(self.server.cassette)))
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        url = self._original_url()
+        if url is None:
+            self._send_json(400, {'error': 'Expected /<scheme>/<host>/<path>'})
+            return
+
+        key = interaction_key(self.command, url)
+        interaction, occurrence = self.server.cassette.play(key)
+        latency, fault = self.server.sample(key, occurrence, interaction)
+        self.server.count('requests')
+        time.sleep(latency)
+
+        if fault == 'reset':
+            self.server.count('reset')
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if fault:
+            self.server.count(fault)
+            headers = {'Retry-After': '1'} if fault == '429' else None
+            self._send_json(int(fault), {'error': 'Injected fault', 'status': int(fault)}, headers)
+            return
+
+        if interaction is None:
+            self.server.count('misses')
+            if self.command == 'HEAD':
+                # Connection warm-up probes are not worth recording
+                self._send(200, b'')
+            else:
+                logger.warning("No recorded interaction for %s", key)
+                self._send_json(502, {'error': 'No recorded interaction', 'key': key}, {'X-Cassette-Miss': '1'})
+            return
+
+        self.server.count('replayed')
+        self._send(interaction['status'], interaction['body'].encode('utf-8'), interaction['headers'])
+
+    do_GET = do_HEAD = do_POST = _replay
+
+
+def start_replay_server(cassette: Cassette, port: int = 0, **options):
+    """Serve a cassette on a background thread; returns (server, base_url)"""
+    server = ReplayServer(('127.0.0.1', port), cassette, **options)
+    threading.Thread(target=server.serve_forever, name='buddy-http-replay', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def session_from_env(pool_connections: int = 4, pool_maxsize: int = 16) -> requests.Session:
+    """A pooled requests session using the HTTP_TRANSPORT mode"""
+    mode = os.getenv('HTTP_TRANSPORT', 'live').lower()
+    cassette_path = os.getenv('HTTP_CASSETTE', DEFAULT_CASSETTE)
+    pool = {'pool_connections': pool_connections, 'pool_maxsize': pool_maxsize}
+
+    if mode == 'live':
+        adapter = HTTPAdapter(**pool)
+    elif mode == 'record':
+        adapter = RecordingAdapter(Cassette.load(cassette_path), **pool)
+        logger.info("Recording external API responses to %s", cassette_path)
+    elif mode in ('replay', 'fault'):
+        base_url = os.getenv('HTTP_STANDIN_URL')
+        if not base_url:
+            cassette = Cassette.load(cassette_path)
+            faults = parse_faults(os.getenv('HTTP_FAULTS', '')) if mode == 'fault' else None
+            _, base_url = start_replay_server(cassette, latency=os.getenv('HTTP_REPLAY_LATENCY', 'recorded'),
+                                              faults=faults, seed=int(os.getenv('HTTP_FAULT_SEED', '0')))
+            logger.info("Replaying %d recorded responses from %s", len(cassette), cassette_path)
+        adapter = ReplayAdapter(base_url, **pool)
+    else:
+        raise ValueError(f"Unknown HTTP_TRANSPORT '{mode}' (use live, record, replay or fault)")
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay server and cassette tools for Buddy AI's external APIs")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help="serve a cassette (point the app at it with HTTP_STANDIN_URL)")
+    serve.add_argument('--cassette', default=DEFAULT_CASSETTE)
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8766)
+    serve.add_argument('--latency', default='recorded', help="'recorded' or a latency spec")
+    serve.add_argument('--faults', default='', help="e.g. 429:0.05,503:0.02,reset:0.01")
+    serve.add_argument('--seed', type=int, default=0)
+
+    show = sub.add_parser('show', help="list the interactions in a cassette")
+    show.add_argument('cassette', nargs='?', default=DEFAULT_CASSETTE)
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        cassette = Cassette.load(args.cassette)
+        for key in cassette.keys():
+            recorded = cassette._interactions[key]
+            statuses = ','.join(str(interaction['status']) for interaction in recorded)
+            print(f"{len(recorded):>3}x [{statuses}] {key}")
+        return
+
+    cassette = Cassette.load(args.cassette)
+    server = ReplayServer((args.host, args.port), cassette, latency=args.latency,
+                          faults=parse_faults(args.faults), seed=args.seed)
+    print(f"Replaying {len(cassette)} interactions from {args.cassette} on http://{args.host}:{server.server_port}")
+    print(f"Use it with: HTTP_TRANSPORT=replay HTTP_STANDIN_URL=http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Background Job Module for Buddy AI
+Runs slow queries (long generations, AI-solved maths) on a bounded worker pool
+so the request that submitted them returns immediately with a job id
+"""
+
+import ipaddress
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from caching import TTLCache
+from request_context import request_scope
+
+
+class JobQueueFull(Exception):
+    """Raised when the job pool already has its maximum of pending jobs"""
+    pass
+
+
+def is_local_callback(url: str) -> bool:
+    """
+    Webhooks may only target loopback addresses or hosts listed in
+    JOB_CALLBACK_HOSTS (comma separated), so jobs cannot be used to make the
+    server call arbitrary URLs.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+
+    allowed = {h.strip().lower() for h in os.getenv('JOB_CALLBACK_HOSTS', '').split(',') if h.strip()}
+    host = parsed.hostname.lower()
+    if host == 'localhost' or host in allowed:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class JobManager:
+    """Queues queries for background processing and keeps their results for a while"""
+
+    def __init__(self, process: Callable[[str], str], max_workers: int = 4, max_pending: int = 100,
+                 result_ttl: float = 600.0, deadline: float = 120.0, effects=None):
+        self.process = process
+        self.deadline = deadline
+        # Side-effect policy jobs run under (see side_effects.py)
+        self.effects = effects
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='buddy-job')
+        # Finished jobs, kept for result_ttl; queued and running ones stay in
+        # _active so a long queue cannot expire them before they run
+        self.jobs = TTLCache(maxsize=max(1000, max_pending * 10), ttl=result_ttl)
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, query: str, client_ip: Optional[str] = None, callback_url: Optional[str] = None,
+               session_id: Optional[str] = None) -> Dict:
+        """Queue a query and return its job record; raises JobQueueFull when saturated"""
+        if callback_url and not is_local_callback(callback_url):
+            raise ValueError("callback_url must point to a local address")
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'query': query,
+            'submitted_at': time.time(),
+            'callback_url': callback_url
+        }
+        with self._lock:
+            if len(self._active) >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs (limit {self.max_pending})")
+            self._active[job['id']] = job
+        try:
+            self.executor.submit(self._run, job, client_ip, session_id)
+        except Exception:
+            with self._lock:
+                self._active.pop(job['id'], None)
+            raise
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._active.get(job_id)
+        if job is None:
+            job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def pending(self) -> int:
+        """Number of queued or running jobs"""
+        with self._lock:
+            return len(self._active)
+
+    def _run(self, job: Dict, client_ip: Optional[str], session_id: Optional[str]):
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+        try:
+            with request_scope(client_ip=client_ip, deadline=time.monotonic() + self.deadline,
+                               session_id=session_id, effects=self.effects):
+                job['response'] = self.process(job['query'])
+            job['status'] = 'done'
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        except SystemExit:
+            # "shutdown"/"buddy quit" ends the worker's call, never the server
+            job['status'] = 'failed'
+            job['error'] = 'The query asked Buddy to quit'
+        finally:
+            job['finished_at'] = time.time()
+            # The result is kept for a full TTL after completion
+            self.jobs.set(job['id'], job)
+            with self._lock:
+                del self._active[job['id']]
+
+        if job.get('callback_url'):
+            self._deliver(job)
+
+    def _deliver(self, job: Dict):
+        """POST the finished job to its webhook"""
+        payload = {key: value for key, value in job.items() if key != 'callback_url'}
+        try:
+            response = requests.post(job['callback_url'], json=payload, timeout=5)
+            job['callback_status'] = response.status_code
+        except requests.RequestException as e:
+            job['callback_error'] = str(e)
+
+
+def job_manager_from_env(process: Callable[[str], str], effects=None) -> JobManager:
+    """Build the JobManager using JOB_* environment settings"""
+    return JobManager(
+        process,
+        effects=effects,
+        max_workers=int(os.getenv('JOB_WORKERS', '4')),
+        max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+        result_ttl=float(os.getenv('JOB_RESULT_TTL', '600')),
+        deadline=float(os.getenv('JOB_DEADLINE_SECONDS', '120'))
+    )
@@ -0,0 +1,156 @@
+"""
+LLM Backend Module for Buddy AI
+Interface behind the functions in model.py, with Google Gemini as the default
+implementation and a client for the local stand-in server (llm_standin.py)
+used for offline load and resilience testing
+"""
+
+import json
+import os
+import threading
+from typing import Iterator, Optional
+
+import requests
+
+
+class LLMError(Exception):
+    """Error returned by an LLM backend; 429s keep "429" in the message for quota handling"""
+    pass
+
+
+class LLMResult:
+    """Text of one completion plus token counts when the backend reports them"""
+
+    def __init__(self, text: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class LLMBackend:
+    """Base class for text generation backends"""
+
+    name = 'base'
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResult:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield the reply in pieces; backends without streaming yield it whole"""
+        yield self.generate(prompt, timeout).text
+
+    def warm(self):
+        """Do any one-off setup (clients, connections) ahead of the first call"""
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.generativeai"""
+
+    name = 'gemini'
+
+    def __init__(self, model_name: str = "gemini-1.5-flash"):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        """Return the shared Gemini model client, configuring it on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    from model import get_api_key
+
+                    genai.configure(api_key=get_api_key())
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResult:
+        request_options = {'timeout': timeout} if timeout else None
+        response = self.get_model().generate_content(prompt, request_options=request_options)
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResult(response.text,
+                         getattr(usage, 'prompt_token_count', None),
+                         getattr(usage, 'candidates_token_count', None))
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        request_options = {'timeout': timeout} if timeout else None
+        for chunk in self.get_model().generate_content(prompt, stream=True, request_options=request_options):
+            if chunk.text:
+                yield chunk.text
+
+    def warm(self):
+        self.get_model()
+
+
+class StandInBackend(LLMBackend):
+    """Client for the local stand-in server started with `python llm_standin.py`"""
+
+    name = 'standin'
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def _post(self, prompt: str, timeout: Optional[float], stream: bool):
+        try:
+            response = self.session.post(f"{self.url}/v1/generate", json={'prompt': prompt, 'stream': stream},
+                                         timeout=timeout, stream=stream)
+        except requests.RequestException as e:
+            raise LLMError(f"Stand-in LLM unreachable: {e}")
+        if response.status_code != 200:
+            try:
+                message = response.json().get('error', {}).get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise LLMError(f"{response.status_code} {message}")
+        return response
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResult:
+        data = self._post(prompt, timeout, stream=False).json()
+        usage = data.get('usage', {})
+        return LLMResult(data['text'], usage.get('prompt_tokens'), usage.get('completion_tokens'))
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        response = self._post(prompt, timeout, stream=True)
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)['delta']
+
+    def warm(self):
+        try:
+            self.session.get(f"{self.url}/health", timeout=2)
+        except requests.RequestException:
+            pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend_from_env() -> LLMBackend:
+    """LLM_BACKEND=gemini (default) or standin (with LLM_STANDIN_URL)"""
+    kind = os.getenv('LLM_BACKEND', 'gemini').lower()
+    if kind == 'standin':
+        return StandInBackend(os.getenv('LLM_STANDIN_URL', 'http://127.0.0.1:8765'))
+    if kind != 'gemini':
+        raise ValueError(f"Unknown LLM_BACKEND '{kind}'")
+    return GeminiBackend()
+
+
+def get_backend() -> LLMBackend:
+    """Return the process-wide backend, choosing it from the environment on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_env()
+    return _backend
+
+
+def set_backend(backend: LLMBackend):
+    """Swap the process-wide backend (load tests, benchmarks)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,221 @@
+"""
+LLM Stand-in Server for Buddy AI
+Local HTTP server that answers like the LLM backend without a network or
+quota: scripted or templated replies, a configurable latency distribution,
+streamed output and injected 429/500 errors. Point the app at it with
+LLM_BACKEND=standin and LLM_STANDIN_URL.
+
+Usage:
+    python llm_standin.py --port 8765
+    python llm_standin.py --latency lognormal:-0.5,0.4 --rate-429 0.05 --script replies.json
+
+Latency specs: "0.8", "fixed:0.8", "uniform:0.2,1.5", "normal:0.8,0.2",
+"lognormal:mu,sigma" (seconds; negative samples are clamped to zero).
+
+A script file is JSON: {"default": "...", "rules": [{"match": "regex", "reply": "..." | ["...", "..."]}]}.
+Replies are templates with {user} (the user's message), {prompt_tokens} and
+{words}; when a rule lists several replies one is picked from a hash of the
+prompt, so the same prompt always gets the same reply.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from prompting import estimate_tokens
+
+DEFAULT_TEMPLATE = "(stand-in reply) You said: {user}"
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Turn a latency spec into a function returning a delay in seconds"""
+    kind, _, args = spec.partition(':')
+    if not args:
+        kind, args = 'fixed', kind
+    values = [float(v) for v in args.split(',')]
+    samplers = {
+        'fixed': lambda: values[0],
+        'uniform': lambda: rng.uniform(values[0], values[1]),
+        'normal': lambda: rng.gauss(values[0], values[1]),
+        'lognormal': lambda: rng.lognormvariate(values[0], values[1])
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+
+def user_message(prompt: str) -> str:
+    """The user's part of a PromptBuilder prompt (everything after the last 'User: ')"""
+    index = prompt.rfind('User: ')
+    return prompt[index + len('User: '):].strip() if index >= 0 else prompt.strip()
+
+
+class ReplyScript:
+    """Maps prompts to deterministic replies using regex rules and templates"""
+
+    def __init__(self, rules: Optional[List[Dict]] = None, default: str = DEFAULT_TEMPLATE):
+        self.rules = [(re.compile(rule['match'], re.IGNORECASE), rule['reply']) for rule in rules or []]
+        self.default = default
+
+    @classmethod
+    def load(cls, path: str) -> 'ReplyScript':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('rules', []), data.get('default', DEFAULT_TEMPLATE))
+
+    def reply(self, prompt: str) -> str:
+        user = user_message(prompt)
+        template = self.default
+        for pattern, reply in self.rules:
+            if pattern.search(user):
+                template = reply
+                break
+        if isinstance(template, list):
+            digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+            template = template[digest % len(template)]
+        return template.format(user=user[:500], prompt_tokens=estimate_tokens(prompt),
+                               words=len(user.split()))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server holding the stand-in's behaviour settings and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, address, script: ReplyScript, latency: str = 'fixed:0.5', rate_429: float = 0.0,
+                 error_rate: float = 0.0, chunk_delay: float = 0.05, seed: Optional[int] = None):
+        super().__init__(address, StandInHandler)
+        self.script = script
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._latency = parse_latency(latency, self.rng)
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.counts = {'requests': 0, 'streamed': 0, '429': 0, '500': 0}
+        self._counts_lock = threading.Lock()
+
+    def sample(self):
+        """Draw (latency, injected status) for one request"""
+        with self._rng_lock:
+            latency = self._latency()
+            roll = self.rng.random()
+        if roll < self.rate_429:
+            return latency, 429
+        if roll < self.rate_429 + self.error_rate:
+            return latency, 500
+        return latency, 200
+
+    def count(self, key: str):
+        with self._counts_lock:
+            self.counts[key] += 1
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            with self.server._counts_lock:
+                self._send_json(200, dict(self.server.counts))
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def do_POST(self):
+        if self.path != '/v1/generate':
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            prompt = data['prompt']
+        except (ValueError, KeyError):
+            self._send_json(400, {'error': {'code': 400, 'message': 'Expected JSON with a prompt'}})
+            return
+
+        self.server.count('requests')
+        latency, status = self.server.sample()
+        time.sleep(latency)
+        if status == 429:
+            self.server.count('429')
+            self._send_json(429, {'error': {'code': 429, 'message': 'Resource has been exhausted (stand-in)'}},
+                            headers={'Retry-After': '1'})
+            return
+        if status == 500:
+            self.server.count('500')
+            self._send_json(500, {'error': {'code': 500, 'message': 'Internal error (stand-in)'}})
+            return
+
+        text = self.server.script.reply(prompt)
+        if not data.get('stream'):
+            self._send_json(200, {'text': text, 'usage': {'prompt_tokens': estimate_tokens(prompt),
+                                                          'completion_tokens': estimate_tokens(text)}})
+            return
+
+        # Newline-delimited JSON, one word per line; the closed connection ends the body
+        self.server.count('streamed')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for piece in re.findall(r'\S+\s*', text):
+            self.wfile.write(json.dumps({'delta': piece}).encode('utf-8') + b'\n')
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+
+
+def start_standin(port: int = 0, script: Optional[ReplyScript] = None, **options):
+    """Serve the stand-in on a background thread; returns (server, base_url)"""
+    server = StandInServer(('127.0.0.1', port), script or ReplyScript(), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Buddy AI LLM backend")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0.5', help="latency distribution spec")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help="seconds between streamed chunks")
+    parser.add_argument('--script', help="JSON file with reply rules")
+    parser.add_argument('--seed', type=int, help="seed for latency and error sampling")
+    args = parser.parse_args()
+
+    script = ReplyScript.load(args.script) if args.script else ReplyScript()
+    server = StandInServer((args.host, args.port), script, latency=args.latency, rate_429=args.rate_429,
+                           error_rate=args.error_rate, chunk_delay=args.chunk_delay, seed=args.seed)
+    print(f"LLM stand-in listening on http://{args.host}:{server.server_port} "
+          f"(latency {args.latency}, 429 rate {args.rate_429})")
+    print(f"Use it with: LLM_BACKEND=standin LLM_STANDIN_URL=http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
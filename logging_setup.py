@@ -0,0 +1,153 @@
+"""
+Logging Setup Module for Buddy AI
+Structured logging for the request path. Records are trimmed on the calling
+thread (long fields truncated, DEBUG events sampled) and put on a bounded
+in-memory queue; a background listener formats them as JSON lines and writes
+them out, so a log call never waits on a slow stdout or disk.
+
+Configuration:
+    LOG_LEVEL         minimum level (default INFO)
+    LOG_FORMAT        json or text (default: json, text for the desktop assistant)
+    LOG_FILE          write to this file instead of the console
+    LOG_STREAM        console stream, stdout or stderr (default: stdout, stderr for the desktop assistant)
+    LOG_MAX_FIELD     longest string kept per field, in characters (default 500)
+    LOG_DEBUG_SAMPLE  fraction of DEBUG records kept (default 0.01)
+    LOG_QUEUE_SIZE    records buffered before new ones are dropped (default 10000)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from request_context import current_context
+
+# Attributes every LogRecord has; anything else came from `extra=` and is logged as a field
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def truncate(value: Any, limit: int) -> Any:
+    """Shorten long strings, keeping a note of how much was cut"""
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit} chars)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BufferedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does only constant-size work on the calling thread:
+    it renders the message, truncates it and every extra string field, adds
+    the request's client IP, and drops the record if the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_field: int = 500, debug_sample: float = 0.01):
+        super().__init__(log_queue)
+        self.max_field = max_field
+        self.debug_sample = debug_sample
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # High-volume DEBUG events are sampled; a record may set its own rate with extra={'sample_rate': x}
+        rate = getattr(record, 'sample_rate', self.debug_sample if record.levelno <= logging.DEBUG else 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.sampled_out += 1
+            return False
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = truncate(record.getMessage(), self.max_field)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = truncate(logging.Formatter().formatException(record.exc_info), self.max_field * 8)
+            record.exc_info = None
+        for key, value in list(vars(record).items()):
+            if key not in _STANDARD_ATTRS:
+                setattr(record, key, truncate(value, self.max_field))
+        client_ip = current_context().client_ip
+        if client_ip and not hasattr(record, 'client_ip'):
+            record.client_ip = client_ip
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: Optional[str] = None, fmt: str = 'json',
+                  stream: str = 'stdout') -> logging.handlers.QueueListener:
+    """
+    Route the root logger through the queue to a background listener. `fmt`
+    and `stream` are the caller's defaults; LOG_FORMAT and LOG_STREAM override
+    them. Safe to call more than once; only the first call configures anything.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        if os.getenv('LOG_FILE'):
+            output = logging.FileHandler(os.getenv('LOG_FILE'), encoding='utf-8')
+        else:
+            output = logging.StreamHandler(sys.stderr if os.getenv('LOG_STREAM', stream) == 'stderr' else sys.stdout)
+        if os.getenv('LOG_FORMAT', fmt).lower() == 'text':
+            output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        else:
+            output.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        handler = BufferedQueueHandler(log_queue,
+                                       max_field=int(os.getenv('LOG_MAX_FIELD', '500')),
+                                       debug_sample=float(os.getenv('LOG_DEBUG_SAMPLE', '0.01')))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level or os.getenv('LOG_LEVEL', 'INFO').upper())
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        # Write out whatever is still queued when the process exits
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def logging_stats() -> Dict:
+    """Dropped and sampled-out counts from the queue handler"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, BufferedQueueHandler):
+            return {'queued': handler.queue.qsize(), 'dropped': handler.dropped,
+                    'sampled_out': handler.sampled_out}
+    return {}
@@ -5,19 +5,48 @@ import datetime
 # import pyttsx3
 from gtts import gTTS
 from model import call_gemini_ai  # Ensure the function call_gemini_ai is correctly defined in model.py
+import sys
 import threading  # Import the threading module
 import pygame
 import tempfile
 import time
 import platform
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
 from enhanced_commands import buddy_processor 
+from archive import archive
+from logging_setup import setup_logging
+from request_context import DEADLINE_RESERVE, DeadlineExceeded, current_context, derived_scope, submit_in_context
+from sessions import LOCAL_SESSION, session_store
+from side_effects import current_effects
+from resilience import CircuitOpenError
 
-chatStr = ""  # Initialize the global chat string
+logger = logging.getLogger(__name__)
+
+def setup_desktop_logging():
+    """Readable log lines on stderr, so stdout stays the assistant's own console output"""
+    setup_logging(fmt='text', stream='stderr')
+
+# Hedged execution: command categories whose handlers depend on slow or flaky
+# upstreams get a speculative AI chat started after HEDGE_DELAY seconds.
+# A negative delay disables hedging entirely.
+HEDGE_DELAY = float(os.getenv('HEDGE_DELAY', '1.5'))
+HEDGED_CATEGORIES = {'weather', 'information'}
+# Command categories whose handlers are answered by Gemini
+LLM_CATEGORIES = {'ai_conversation', 'ai_interpretation', 'calculations'}
+# Each hedged request may hold two workers (handler and speculative chat) and the
+# slow lane runs up to SLOW_LANE_WORKERS of them at once, so the pool is sized
+# to at least twice that; when it is still full, work runs inline instead of queueing
+HEDGE_MAX_WORKERS = max(int(os.getenv('HEDGE_MAX_WORKERS', '0')), 2 * int(os.getenv('SLOW_LANE_WORKERS', '8')))
+# Longest a hedged request waits for either call when the request has no deadline
+HEDGE_TIMEOUT = float(os.getenv('HEDGE_TIMEOUT', '30'))
+hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='buddy-hedge')
+hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_WORKERS)
 
 # Initialize the pyttsx3 engine globally
 # engine = pyttsx3.init()
 
-# Define a lock to prevent multiple threads from executing runAndWait at the same time
+# Serializes audio playback: the pygame mixer is shared by every thread
 speech_lock = threading.Lock()
 
 # Global flag to control speech functionality
@@ -35,9 +64,9 @@ def speak(text):
     Uses gTTS (Google Text-to-Speech) for text-to-speech functionality.
     This method speaks the entire response asynchronously with improved error handling.
     """
-    # If speech is disabled (e.g., in deployment), just print the text
-    if not ENABLE_SPEECH:
-        print(f"Buddy AI: {text}")
+    # If speech is disabled (e.g., in deployment or for server requests), just log the text
+    if not ENABLE_SPEECH or not current_effects().speech:
+        logger.info("Buddy reply", extra={'reply': text})
         return
     
     def _speak():
@@ -51,40 +80,50 @@ def speak(text):
                 temp_file_path = temp_file.name
                 tts.save(temp_file_path)  # Save the speech to a temporary file
 
-            # Initialize pygame mixer with better error handling
-            try:
-                # Quit any existing mixer instance first
-                pygame.mixer.quit()
-                time.sleep(0.1)  # Brief pause
+            # One reply plays at a time: the pygame mixer is shared by every thread
+            with speech_lock:
+                # Initialize pygame mixer with better error handling
+                try:
+                    # Quit any existing mixer instance first
+                    pygame.mixer.quit()
+                    time.sleep(0.1)  # Brief pause
                 
-                # Initialize with specific parameters for better compatibility
-                pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
-                pygame.mixer.init()
+                    # Initialize with specific parameters for better compatibility
+                    pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
+                    pygame.mixer.init()
                 
-                # Load and play the audio file
-                pygame.mixer.music.load(temp_file_path)
-                pygame.mixer.music.play()
+                    # Load and play the audio file
+                    pygame.mixer.music.load(temp_file_path)
+                    pygame.mixer.music.play()
 
-                # Wait until the music finishes playing
-                while pygame.mixer.music.get_busy():
-                    pygame.time.Clock().tick(10)
+                    # Wait until the music finishes playing
+                    while pygame.mixer.music.get_busy():
+                        pygame.time.Clock().tick(10)
                     
-            except pygame.error as pe:
-                print(f"Pygame error: {pe}")
-                # Fallback: just print the text if audio fails
-                print(f"Audio failed, text output: {text}")
+                except pygame.error as pe:
+                    # Fallback: just log the text if audio fails
+                    logger.warning("Audio playback failed: %s", pe, extra={'reply': text})
+                finally:
+                    # Clean up the temporary audio file after playback
+                    cleanup_temp_file(temp_file_path)
+                    temp_file_path = None
                 
         except Exception as e:
-            print(f"Error in speech synthesis: {e}")
-            # Fallback: just print the text
-            print(f"Speech synthesis failed, text output: {text}")
+            # Fallback: just log the text
+            logger.warning("Speech synthesis failed: %s", e, extra={'reply': text})
         finally:
-            # Clean up the temporary audio file after playback
+            # Synthesis failed before playback: remove the partial file
             cleanup_temp_file(temp_file_path)
 
     # Run the speak function in a separate thread to avoid blocking the main thread
     threading.Thread(target=_speak, daemon=True).start()
 
+def is_speaking():
+    """
+    True while a spoken reply is playing (used to keep the continuous voice loop from hearing itself).
+    """
+    return bool(pygame.mixer.get_init() and pygame.mixer.music.get_busy())
+
 def cleanup_temp_file(file_path):
     """
     Improved temporary file cleanup with multiple retry attempts and better error handling
@@ -100,7 +139,7 @@ def cleanup_temp_file(file_path):
             pygame.mixer.quit()
         time.sleep(0.5)  # Give time for file handles to be released
     except Exception as cleanup_error:
-        print(f"Error during pygame cleanup: {cleanup_error}")
+        logger.warning("Error during pygame cleanup: %s", cleanup_error)
     
     # Multiple attempts to delete the file
     max_attempts = 5
@@ -120,9 +159,9 @@ def cleanup_temp_file(file_path):
                         os.system(f'echo del "{file_path}" >> %TEMP%\\cleanup_temp_files.bat')
                 except:
                     pass
-                print(f"Could not delete temp file {file_path} after {max_attempts} attempts")
+                logger.warning("Could not delete temp file %s after %d attempts", file_path, max_attempts)
         except Exception as e:
-            print(f"Error deleting file {file_path}: {e}")
+            logger.warning("Error deleting file %s: %s", file_path, e)
             break
 
 # def speak(text):
@@ -138,30 +177,62 @@ def cleanup_temp_file(file_path):
 #     # Run the speak function in a separate thread to avoid blocking
 #     threading.Thread(target=_speak).start()
 
+def echo(text):
+    """
+    Show a reply on the console in desktop mode, whether or not it is also spoken.
+    """
+    if current_effects().console:
+        print(f"Buddy AI: {text}")
+
+def current_session():
+    """
+    Session id of the request being processed (the local desktop session outside requests).
+    """
+    return current_context().session_id or LOCAL_SESSION
+
+def _chat_reply(query):
+    """
+    Gets a Gemini reply for the query without touching the conversation history,
+    so speculative calls can be discarded safely.
+    """
+    return call_gemini_ai(query, intent='chat', history=session_store.history(current_session()))
+
+def _speculative_chat_reply(query):
+    """
+    _chat_reply for a hedge: it may lose the race, so its reply is not streamed to the client.
+    """
+    with derived_scope(on_partial=None):
+        return _chat_reply(query)
+
+def _record_chat(query, reply):
+    """
+    Appends a completed exchange to the session's conversation history.
+    """
+    session_store.append(current_session(), query, reply)
+
 def chat(query):
     """
     Handles chat interactions with Gemini AI.
     """
-    global chatStr
-    print(f"Chat History:\n{chatStr}")  # Debug: print the current conversation history
-    
-    # Update conversation with the user's query
-    chatStr += f"User: {query}\nbuddy: "
-    
     try:
         # Get the response from Gemini AI
-        reply = call_gemini_ai(chatStr)
+        reply = _chat_reply(query)
         
         # Update the conversation string with the reply after speaking
-        chatStr += f"{reply}\n"
+        _record_chat(query, reply)
         
-        # Print and speak the response only once
-        print(f"Buddy AI: {reply}")  # Display the answer as text in the console
+        logger.debug("Chat reply", extra={'session': current_session(), 'reply_chars': len(reply)})
+        echo(reply)  # Display the answer as text in the console
         speak(reply)  # Call speak here only once
         
         return reply  # Return the AI reply for use in Flask response
-    except Exception as e:
-        print(f"Error: {e}")
+    except (CircuitOpenError, DeadlineExceeded):
+        # Gemini is known to be down or the request is out of time, answer offline
+        reply = buddy_processor.offline_response(query)
+        speak(reply)
+        return reply
+    except Exception:
+        logger.exception("Chat request failed")
         speak("Sorry, an error occurred.")
         return "Sorry, an error occurred."  # Return error message to Flask
 
@@ -170,43 +241,63 @@ def ai(prompt):
     Generates a response using Gemini AI for specific prompts.
     """
     try:
-        response = call_gemini_ai(prompt)
+        response = call_gemini_ai(prompt, intent='prompt')
         if response:
-            filename = f"Gemini/{''.join(prompt.split('intelligence')[1:]).strip()}.txt"
-            if not os.path.exists("Gemini"):
-                os.mkdir("Gemini")
-            with open(filename, "w") as f:
-                f.write(f"Buddy response for Prompt: {prompt}\n*************************\n\n{response}")
+            # Queued for the background archive writer (see archive.py)
+            archive.record(prompt, response, session=current_session(), intent='prompt')
             
-            # Print and speak the response only once
-            print(f"Buddy AI: {response}")  # Display the answer as text in the console
+            echo(response)  # Display the answer as text in the console
             speak(response)  # Call speak here only once
         else:
-            print("Failed to get a response from Gemini AI.")
+            logger.warning("Empty response from Gemini for prompt")
             speak("Sorry, I couldn't generate a response.")
-    except Exception as e:
-        print(f"Error: {e}")
+    except Exception:
+        logger.exception("Prompt generation failed")
         speak("Sorry, an error occurred while generating the response.")
 
+_speech_recognizer = None
+
+def get_speech_recognizer():
+    """
+    Return the shared speech-to-text function: Google recognition behind the
+    offline wake-word gate (see wake_word.py), unless WAKE_WORD_ENABLED=0.
+    """
+    global _speech_recognizer
+    if _speech_recognizer is None:
+        from voice_loop import google_recognizer
+        from wake_word import gate_from_env
+        _speech_recognizer = gate_from_env(google_recognizer(),
+                                           on_wake=lambda: print("Wake word heard, listening..."))
+    return _speech_recognizer
+
 def takeCommand():
     """
     Captures voice input and converts it into text.
     """
     r = sr.Recognizer()
+    recognize = get_speech_recognizer()
     with sr.Microphone() as source:
-        print("Listening...")
-        audio = r.listen(source)
-        try:
-            print("Recognizing...")
-            query = r.recognize_google(audio, language="en-in")
-            print(f"User said: {query}")
-            return query
-        except sr.UnknownValueError:
-            print("Sorry, I did not understand that.")
-            return "Sorry, I did not catch that."
-        except sr.RequestError as e:
-            print(f"Could not request results; {e}")
-            return "Sorry, I couldn't connect to the service."
+        # A bare wake word arms the gate, so listen once more for the command
+        for _ in range(2):
+            print("Listening...")
+            audio = r.listen(source)
+            try:
+                print("Recognizing...")
+                query = recognize(audio)
+                print(f"User said: {query}")
+                return query
+            except sr.UnknownValueError:
+                if getattr(recognize, 'armed', False):
+                    continue
+                if hasattr(recognize, 'spotter'):
+                    # Not addressed to Buddy (or not understood after the wake word)
+                    return ""
+                print("Sorry, I did not understand that.")
+                return "Sorry, I did not catch that."
+            except sr.RequestError as e:
+                print(f"Could not request results; {e}")
+                return "Sorry, I couldn't connect to the service."
+        return ""
 
 def process_query(query):
     """
@@ -214,42 +305,194 @@ def process_query(query):
     """
     # Special commands that should be handled directly
     if "buddy quit" in query.lower():
-        speak("Goodbye!")
-        exit()
+        return end_session("Goodbye!")
     
     elif "reset chat" in query.lower():
-        global chatStr
-        chatStr = ""
+        session_store.clear(current_session())
         speak("Chat has been reset.")
         return "Chat has been reset."
     
     elif any(word in query.lower() for word in ["shutdown", "exit"]):
-        speak("Shutting down now. Goodbye!")
-        print("Shutting down...")
-        exit()
+        return end_session("Shutting down now. Goodbye!")
+    
+    # Queries routed to upstream-dependent handlers race the AI fallback; local
+    # answers in those categories (the time and date under 'information') never do
+    if HEDGE_DELAY >= 0 and buddy_processor.classify(query) in HEDGED_CATEGORIES and not is_local_query(query):
+        return hedged_process(query)
     
-    # Use enhanced command processor for all other queries
+    return _process_command_or_chat(query)
+
+def _process_command_or_chat(query):
+    """
+    Unhedged path: the command processor, falling back to AI chat. Local
+    queries run on the fast lane, so when their handler fails they answer
+    with its failure message or the offline reply instead of calling Gemini.
+    """
+    local = is_local_query(query)
     try:
         result = buddy_processor.process_command(query)
         
         if result['success']:
             speak(result['message'])
             return result['message']
+        elif local:
+            reply = result.get('message') or buddy_processor.offline_response(query)
+            speak(reply)
+            return reply
         else:
             # If command processing fails, fall back to AI chat
-            print("Falling back to AI chat...")
+            logger.info("Falling back to AI chat")
             return chat(query)
             
-    except Exception as e:
-        print(f"Error in command processing: {e}")
+    except Exception:
+        logger.exception("Error in command processing")
+        if local:
+            reply = buddy_processor.offline_response(query)
+            speak(reply)
+            return reply
         # Fall back to AI chat if there's an error
         return chat(query)
 
+def end_session(farewell):
+    """
+    Handles the quit commands. The desktop assistant says goodbye and exits;
+    a server request only ends its own conversation, never the process.
+    """
+    speak(farewell)
+    if current_effects().allow_quit:
+        logger.info("Shutting down")
+        sys.exit()
+    session_store.clear(current_session())
+    return farewell
+
+def is_local_query(query):
+    """
+    True if process_query can answer without calling Gemini or an external API.
+    """
+    query_lower = query.lower()
+    if any(command in query_lower for command in ["buddy quit", "reset chat", "shutdown", "exit"]):
+        return True
+    return buddy_processor.is_local_query(query)
+
+def is_llm_query(query):
+    """
+    True if answering the query is expected to need a Gemini call.
+    """
+    if is_local_query(query):
+        return False
+    return buddy_processor.classify(query) in LLM_CATEGORIES
+
+def _submit_hedged(fn, query):
+    """
+    Start fn(query) on the hedge pool if a worker is free, else return None;
+    hedged calls never queue behind busy workers.
+    """
+    if not hedge_slots.acquire(blocking=False):
+        return None
+    try:
+        future = submit_in_context(hedge_executor, fn, query)
+    except Exception:
+        hedge_slots.release()
+        raise
+    future.add_done_callback(lambda _: hedge_slots.release())
+    return future
+
+def hedged_process(query):
+    """
+    Runs the command handler and, if it has not answered within HEDGE_DELAY
+    seconds, starts the AI chat fallback speculatively in parallel. The first
+    valid answer wins and the other future is cancelled (or its result dropped
+    if it is already running), so latency is capped at roughly
+    max(handler, HEDGE_DELAY + chat) instead of their sum.
+    
+    With a request deadline the hedge fires no later than halfway through the
+    remaining budget, and if neither side answers in time the offline fallback
+    is returned just before the budget runs out.
+    """
+    context = current_context()
+    hedge_delay = HEDGE_DELAY
+    if context.remaining() is not None:
+        hedge_delay = min(HEDGE_DELAY, max(0.0, context.remaining() / 2))
+    # Without a request deadline the race is still bounded
+    give_up_at = time.monotonic() + HEDGE_TIMEOUT
+    
+    handler = _submit_hedged(buddy_processor.process_command, query)
+    if handler is None:
+        logger.info("Hedge pool is full, answering without a hedge")
+        return _process_command_or_chat(query)
+    
+    try:
+        result = handler.result(timeout=hedge_delay)
+    except FutureTimeoutError:
+        result = None
+    except Exception:
+        logger.exception("Error in command processing")
+        return chat(query)
+    
+    if result is not None:
+        if result['success']:
+            speak(result['message'])
+            return result['message']
+        # The handler failed fast, so there is nothing to race against
+        logger.info("Falling back to AI chat")
+        return chat(query)
+    
+    speculative = _submit_hedged(_speculative_chat_reply, query)
+    if speculative is None:
+        logger.info("Hedge pool is full, waiting for the handler alone")
+        pending = {handler}
+    else:
+        logger.info("Handler is slow, starting speculative AI chat")
+        pending = {handler, speculative}
+    
+    while pending:
+        budget = give_up_at - time.monotonic()
+        if context.remaining() is not None:
+            budget = min(budget, context.remaining() - DEADLINE_RESERVE)
+        budget = max(0.0, budget)
+        done, pending = wait(pending, timeout=budget, return_when=FIRST_COMPLETED)
+        if not done:
+            # Out of time: drop both calls and answer offline
+            for future in pending:
+                future.cancel()
+            reply = buddy_processor.offline_response(query)
+            speak(reply)
+            return reply
+        
+        # Prefer the handler's answer when both finish together
+        for future in sorted(done, key=lambda f: f is not handler):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                logger.warning("Hedged call failed: %s", e)
+                continue
+            
+            if future is handler:
+                if not outcome['success']:
+                    continue
+                if speculative is not None:
+                    speculative.cancel()
+                speak(outcome['message'])
+                return outcome['message']
+            
+            handler.cancel()
+            _record_chat(query, outcome)
+            logger.debug("Speculative chat reply won", extra={'reply_chars': len(outcome)})
+            speak(outcome)
+            return outcome
+    
+    # Both calls failed (e.g. the handler could not answer and Gemini's breaker
+    # is open); answer offline as the unhedged chat() path does
+    reply = buddy_processor.offline_response(query)
+    speak(reply)
+    return reply
+
 def start_listening():
     """
     This function starts listening for voice input, sends the input to `process_query`, 
     and automatically stops the listening process after sending.
     """
+    setup_desktop_logging()
     print("Started listening for voice input...")
     query = takeCommand()  # Get the user's voice input
     if query:
@@ -258,3 +501,20 @@ def start_listening():
         print(f"Response from Buddy AI: {response}")
     else:
         print("No input received, stopping listening.")
+
+def start_continuous_listening(energy_threshold=None):
+    """
+    Keeps the microphone open and processes every utterance in turn; speech
+    while a previous query is being processed is queued rather than lost.
+    See voice_loop.py for the capture/recognition pipeline.
+    """
+    from voice_loop import MicrophoneSource, VoiceLoop
+
+    setup_desktop_logging()
+    if energy_threshold is None and os.getenv('VOICE_ENERGY_THRESHOLD'):
+        energy_threshold = float(os.getenv('VOICE_ENERGY_THRESHOLD'))
+    loop = VoiceLoop(MicrophoneSource(), process_query, recognize=get_speech_recognizer(),
+                     energy_threshold=energy_threshold, pause_when=is_speaking,
+                     on_response=lambda query, response: print(f"Response from Buddy AI: {response}"))
+    print("Started continuous listening for voice input (Ctrl+C to stop)...")
+    loop.run()
@@ -1,12 +1,20 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from resilience import get_breaker
+from request_context import current_context, stage_timeout
+from prompting import PromptBuilder, prompt_metrics
+from llm_backends import GeminiBackend, get_backend
 
 # Load environment variables from the .env file
 load_dotenv()
 
+# Trips when Gemini keeps failing or answering slowly, so callers fall back at once
+gemini_breaker = get_breaker('gemini', slow_call_seconds=float(os.getenv('GEMINI_SLOW_CALL_SECONDS', '15')))
+# Upper bound for a single generate_content call; shortened by the request deadline
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))
+
 def get_api_key():
     """
     Retrieve the API key from the environment variable.
@@ -16,22 +24,15 @@ def get_api_key():
         raise ValueError("API key not found. Please set the GEMINI_API_KEY environment variable.")
     return api_key
 
-def call_gemini_ai(prompt, system_context=None):
+def get_model():
     """
-    Enhanced Gemini AI call with system context for better responses.
+    Return the shared Gemini model client when Gemini is the configured backend.
     """
-    api_key = get_api_key()
-    genai.configure(api_key=api_key)
-    
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        # Add system context for better AI behavior
-        if system_context:
-            full_prompt = f"{system_context}\n\nUser: {prompt}"
-        else:
-            # Default Buddy system context
-            full_prompt = f"""You are Buddy, a helpful personal AI assistant. Be conversational, friendly, and direct.
+    backend = get_backend()
+    return backend.get_model() if isinstance(backend, GeminiBackend) else None
+
+# Default Buddy system context
+DEFAULT_SYSTEM_CONTEXT = """You are Buddy, a helpful personal AI assistant. Be conversational, friendly, and direct.
             
             Important guidelines:
             - Respond naturally and directly to the user
@@ -39,17 +40,55 @@ def call_gemini_ai(prompt, system_context=None):
             - Be warm and personal in your responses
             - When greeting someone, respond warmly
             - Answer questions about yourself directly as Buddy (not Buddy AI)
-            - Keep responses conversational but helpful
-            
-            User: {prompt}"""
+            - Keep responses conversational but helpful"""
+
+def _stream_reply(backend, prompt, timeout, on_partial):
+    """
+    Stream a reply from the backend, passing each piece to on_partial, and return the whole text.
+    """
+    pieces = []
+    for piece in backend.stream(prompt, timeout=timeout):
+        pieces.append(piece)
+        on_partial(piece)
+    return "".join(pieces)
+
+def call_gemini_ai(prompt, system_context=None, intent: str = 'prompt', context: Dict = None,
+                   history: List[Tuple[str, str]] = None):
+    """
+    Enhanced Gemini AI call with system context for better responses.
+    The prompt is assembled by PromptBuilder, which keeps it within the
+    intent's token budget (trimming the oldest history first) and records
+    prompt/completion sizes per intent. The call itself goes to the backend
+    selected by LLM_BACKEND (Gemini unless the local stand-in is configured).
+    When the request context has an on_partial callback the reply is streamed
+    to it as it is generated; the full text is still returned.
+    """
+    backend = get_backend()
+    # Raises DeadlineExceeded when the request budget cannot fit a Gemini call
+    timeout = stage_timeout(GEMINI_TIMEOUT, minimum=1.0)
+    
+    try:
+        # Add system context for better AI behavior
+        builder = PromptBuilder(intent, system_context or DEFAULT_SYSTEM_CONTEXT, prompt,
+                                context=context, history=history)
+        full_prompt, breakdown = builder.build()
         
-        response = model.generate_content(full_prompt)
-        return response.text
+        on_partial = current_context().on_partial
+        if on_partial is not None:
+            text = gemini_breaker.call(_stream_reply, backend, full_prompt, timeout, on_partial)
+            prompt_metrics.record(breakdown, text)
+            return text
+        
+        result = gemini_breaker.call(backend.generate, full_prompt, timeout=timeout)
+        prompt_metrics.record(breakdown, result.text,
+                              prompt_tokens=result.prompt_tokens,
+                              completion_tokens=result.completion_tokens)
+        return result.text
     except Exception as e:
         # Re-raise the exception instead of returning it as a string
         raise e
 
-def get_intelligent_response(query: str, context: Dict = None) -> str:
+def get_intelligent_response(query: str, context: Dict = None, intent: str = 'ai_conversation') -> str:
     """
     Get an intelligent response for complex queries that require reasoning.
     """
@@ -75,11 +114,8 @@ def get_intelligent_response(query: str, context: Dict = None) -> str:
     
     Always respond as Buddy speaking directly to the user in a natural, conversational way."""
     
-    if context:
-        system_context += f"\n\nAdditional context: {json.dumps(context)}"
-    
     try:
-        return call_gemini_ai(query, system_context)
+        return call_gemini_ai(query, system_context, intent=intent, context=context)
     except Exception as e:
         error_msg = str(e)
         if "429" in error_msg or "quota" in error_msg or "rate" in error_msg.lower():
@@ -115,7 +151,7 @@ def analyze_command_intent(query: str) -> Dict:
     """
     
     try:
-        response = call_gemini_ai(analysis_prompt)
+        response = call_gemini_ai(analysis_prompt, intent='intent_analysis')
         # Try to parse as JSON, fallback to text if it fails
         try:
             return json.loads(response)
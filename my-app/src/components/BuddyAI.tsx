@@ -3,6 +3,7 @@ import { Button } from "./ui/button";
 import { Input } from "./ui/input";
 import { ScrollArea } from "./ui/scroll-area";
 import WelcomeMessage from "./WelcomeMessage";
+import { ChatServerError, ChatSocket, socketUrlFor } from "./chatSocket";
 
 declare global {
   interface Window {
@@ -13,6 +14,36 @@ declare global {
 
 const API_URL =
   import.meta.env.VITE_BACKEND_URL || "http://localhost:5000/api/chat";
+const WS_URL = import.meta.env.VITE_BACKEND_WS_URL || socketUrlFor(API_URL);
+
+// Plain HTTP request, used when the WebSocket channel cannot connect.
+// Resolves with the reply and the session the server filed it under.
+const postQuery = async (
+  query: string,
+  sessionId: string | null
+): Promise<{ response: string; session_id: string }> => {
+  const headers: Record<string, string> = {
+    "Content-Type": "application/json",
+  };
+  if (sessionId) {
+    headers["X-Session-Id"] = sessionId;
+  }
+  const response = await fetch(API_URL, {
+    method: "POST",
+    headers,
+    body: JSON.stringify({ query }),
+  });
+
+  if (!response.ok) {
+    const data = await response.json().catch(() => null);
+    if (data?.error) {
+      throw new ChatServerError(data.error);
+    }
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  return response.json();
+};
 
 const BuddyAI: React.FC = () => {
   const [isListening, setIsListening] = useState(false);
@@ -106,6 +137,11 @@ const BuddyAI: React.FC = () => {
 
   const scrollAreaRef = useRef<HTMLDivElement>(null);
 
+  // One WebSocket connection (and backend session) for the whole conversation
+  const chatSocket = useRef<ChatSocket | null>(null);
+  // Session issued by the HTTP endpoint when the socket never connected
+  const httpSession = useRef<string | null>(null);
+
   // Speech recognition setup
   const recognition = useRef<null | (typeof window)["SpeechRecognition"]>(null);
 
@@ -202,20 +238,26 @@ const BuddyAI: React.FC = () => {
     setIsConnected(true);
 
     try {
-      const response = await fetch(API_URL, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({ query: messageToSend }),
-      });
-
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+      if (!chatSocket.current) {
+        chatSocket.current = new ChatSocket(WS_URL);
+      }
+      let aiResponse: string;
+      try {
+        aiResponse = await chatSocket.current.ask(messageToSend);
+      } catch (socketError) {
+        // The server answered with an error (e.g. busy): sending the query
+        // again over HTTP would only process it twice
+        if (socketError instanceof ChatServerError) {
+          throw socketError;
+        }
+        console.warn("WebSocket unavailable, using HTTP:", socketError);
+        const reply = await postQuery(
+          messageToSend,
+          chatSocket.current.session ?? httpSession.current
+        );
+        httpSession.current = reply.session_id;
+        aiResponse = reply.response;
       }
-
-      const data = await response.json();
-      const aiResponse = data.response;
 
       const aiMessage = {
         role: "ai" as const,
@@ -227,6 +269,16 @@ const BuddyAI: React.FC = () => {
       speak(aiResponse);
     } catch (error) {
       console.error("Error:", error);
+      if (error instanceof ChatServerError) {
+        const serverMessage = {
+          role: "ai" as const,
+          content: `Sorry, I couldn't answer that: ${error.message}`,
+          timestamp: new Date(),
+        };
+        setConversation((prev) => [...prev, serverMessage]);
+        speak("Sorry, I couldn't answer that. Please try again.");
+        return;
+      }
       setIsConnected(false);
       const errorMessage = {
         role: "ai" as const,
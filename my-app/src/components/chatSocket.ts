@@ -0,0 +1,116 @@
+// WebSocket client for the backend's /api/ws chat channel.
+// One connection is reused for every message; replies are matched to
+// requests by id, so several messages can be in flight at once.
+
+type PendingReply = {
+  resolve: (text: string) => void;
+  reject: (error: Error) => void;
+  onPartial?: (delta: string) => void;
+};
+
+type ServerMessage = {
+  id?: string;
+  type: "session" | "partial" | "response" | "error" | "pong";
+  session_id?: string;
+  delta?: string;
+  response?: string;
+  error?: string;
+};
+
+// An error reported by the server for one request (busy, handler failure).
+// Unlike connection errors, retrying the request elsewhere would not help.
+export class ChatServerError extends Error {
+  constructor(message: string) {
+    super(message);
+    this.name = "ChatServerError";
+  }
+}
+
+// http://host/api/chat -> ws://host/api/ws
+export const socketUrlFor = (chatUrl: string): string =>
+  chatUrl.replace(/^http/, "ws").replace(/\/api\/chat\/?$/, "/api/ws");
+
+export class ChatSocket {
+  private url: string;
+  private ws: WebSocket | null = null;
+  private opening: Promise<WebSocket> | null = null;
+  private pending = new Map<string, PendingReply>();
+  private nextId = 1;
+  private sessionId: string | null = null;
+
+  constructor(url: string) {
+    this.url = url;
+  }
+
+  // Session assigned by the server, shared with HTTP requests so the conversation stays whole
+  get session(): string | null {
+    return this.sessionId;
+  }
+
+  private connect(): Promise<WebSocket> {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      return Promise.resolve(this.ws);
+    }
+    if (this.opening) {
+      return this.opening;
+    }
+
+    // Reconnects rejoin the same session
+    const url = this.sessionId
+      ? `${this.url}?session_id=${encodeURIComponent(this.sessionId)}`
+      : this.url;
+
+    this.opening = new Promise<WebSocket>((resolve, reject) => {
+      const ws = new WebSocket(url);
+      ws.onopen = () => {
+        this.ws = ws;
+        this.opening = null;
+        resolve(ws);
+      };
+      ws.onerror = () => {
+        this.opening = null;
+        reject(new Error("WebSocket connection failed"));
+      };
+      ws.onclose = () => {
+        this.ws = null;
+        this.failAll(new Error("WebSocket connection closed"));
+      };
+      ws.onmessage = (event) => this.handle(JSON.parse(event.data));
+    });
+    return this.opening;
+  }
+
+  private handle(message: ServerMessage) {
+    if (message.type === "session") {
+      this.sessionId = message.session_id ?? null;
+      return;
+    }
+    const pending = message.id ? this.pending.get(message.id) : undefined;
+    if (!pending) return;
+
+    if (message.type === "partial") {
+      pending.onPartial?.(message.delta ?? "");
+    } else if (message.type === "response") {
+      this.pending.delete(message.id!);
+      pending.resolve(message.response ?? "");
+    } else if (message.type === "error") {
+      this.pending.delete(message.id!);
+      pending.reject(new ChatServerError(message.error ?? "Request failed"));
+    }
+  }
+
+  private failAll(error: Error) {
+    this.pending.forEach((pending) => pending.reject(error));
+    this.pending.clear();
+  }
+
+  // Sends a query and resolves with the final reply; onPartial receives streamed pieces
+  async ask(query: string, onPartial?: (delta: string) => void): Promise<string> {
+    const ws = await this.connect();
+    const id = String(this.nextId++);
+    return new Promise<string>((resolve, reject) => {
+      this.pending.set(id, { resolve, reject, onPartial });
+      ws.send(JSON.stringify({ id, query, stream: Boolean(onPartial) }));
+    });
+  }
+}
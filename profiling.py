@@ -0,0 +1,310 @@
+"""
+Profiling Module for Buddy AI
+On-demand sampling profiler for individual queries. While any query is being
+profiled, a sampler thread reads the stacks of the threads working on it (the
+one running process_query plus hedge and fan-out workers) every few
+milliseconds. Queries shorter than the interval are caught by whichever tick
+they overlap, so merged per-category numbers stay proportional to time spent.
+The samples are kept as collapsed stacks ("a;b;c 12" lines, the input format
+of flamegraph.pl and speedscope) per query and merged per routed category.
+
+Profiling is opt-in: a request asks for it explicitly (see Profiler.requested)
+or the next N queries are armed with Profiler.arm(). Samples are wall-clock,
+so time spent waiting on sockets and locks shows up as well as CPU time; in
+CPU-bound code the sampler only runs when it gets the GIL, so intervals below
+sys.getswitchinterval() (5 ms) are not honoured exactly.
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+from request_context import current_context, derived_scope
+
+# Holder for the ids of profiles taken for an explicitly profiled request
+_requested = contextvars.ContextVar('buddy_profile_request', default=None)
+
+# Stack recorded in place of new ones once a category has this many distinct stacks
+_OVERFLOW = '[other stacks]'
+
+
+class Profile:
+    """Stack samples of one query, filled in by its Profiler's sampler thread"""
+
+    def __init__(self, profile_id: int, category: str, interval: float, max_samples: int = 20000):
+        self.id = profile_id
+        self.category = category
+        self.interval = interval
+        self.max_samples = max_samples
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.duration_ms = None
+        self._started = time.monotonic()
+        self._threads = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def finish(self):
+        """Stop accepting samples; a tick already in flight on the sampler thread is dropped"""
+        with self._lock:
+            self.duration_ms = round((time.monotonic() - self._started) * 1000, 1)
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Call fn with the current thread sampled; stacks start at fn"""
+        thread_id = threading.get_ident()
+        with self._lock:
+            if thread_id in self._threads:
+                return fn(*args, **kwargs)
+            self._threads[thread_id] = sys._getframe()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                del self._threads[thread_id]
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = self._labels[code] = f"{name} ({os.path.basename(code.co_filename)})"
+        return label
+
+    def sample(self, frames: Dict):
+        """Record the stacks of this profile's threads from sys._current_frames()"""
+        if self.samples >= self.max_samples:
+            return
+        with self._lock:
+            threads = list(self._threads.items())
+        stacks = []
+        for thread_id, entry in threads:
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None and frame is not entry:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                stacks.append(';'.join(reversed(stack)))
+        # Readers copy the counter under the same lock (see snapshot)
+        with self._lock:
+            if self.duration_ms is not None:
+                return
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def snapshot(self) -> Counter:
+        """Copy of the stacks recorded so far, safe to iterate while sampling continues"""
+        with self._lock:
+            return Counter(self.stacks)
+
+    def info(self) -> Dict:
+        return {'id': self.id, 'category': self.category, 'started_at': self.started_at,
+                'duration_ms': self.duration_ms, 'samples': self.samples,
+                'interval_ms': round(self.interval * 1000, 3)}
+
+
+def collapsed(stacks: Counter, prefix: str = '') -> str:
+    """Collapsed-stack text, one "frame;frame;frame count" line per stack"""
+    return ''.join(f"{prefix}{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def hotspots(stacks: Counter, limit: int = 10) -> List[Dict]:
+    """Functions with the most samples at the top of the stack (self time)"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    total = sum(leaves.values()) or 1
+    return [{'frame': frame, 'samples': count, 'share': round(count / total, 3)}
+            for frame, count in leaves.most_common(limit)]
+
+
+class Profiler:
+    """
+    Decides which queries are profiled and keeps the results: the newest
+    `max_profiles` individual profiles, and merged stacks per category.
+    """
+
+    def __init__(self, classify: Optional[Callable[[str], str]] = None, interval: float = 0.005,
+                 max_profiles: int = 50, max_stacks: int = 5000):
+        self.classify = classify
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self.max_stacks = max_stacks
+        self.armed = 0
+        self._active = {}
+        self._sampler = None
+        self._wake = threading.Condition()
+        self._profiles = OrderedDict()
+        self._categories = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def arm(self, requests: int, interval_ms: Optional[float] = None) -> Dict:
+        """Profile the next `requests` queries (0 disarms), optionally at a new sampling interval"""
+        with self._lock:
+            self.armed = max(0, requests)
+            if interval_ms is not None:
+                self.interval = max(0.001, interval_ms / 1000)
+        return self.status()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {'armed': self.armed, 'interval_ms': round(self.interval * 1000, 3),
+                    'profiles': len(self._profiles), 'categories': sorted(self._categories)}
+
+    @contextmanager
+    def requested(self):
+        """
+        Profile the queries run inside the with-block regardless of arming.
+        Yields a list that receives the ids of the profiles taken.
+        """
+        profile_ids = []
+        token = _requested.set(profile_ids)
+        try:
+            yield profile_ids
+        finally:
+            _requested.reset(token)
+
+    def _claim(self, requested: bool) -> bool:
+        with self._lock:
+            if requested:
+                return True
+            if self.armed > 0:
+                self.armed -= 1
+                return True
+            return False
+
+    def instrument(self, fn: Callable[[str], str]) -> Callable[[str], str]:
+        """Wrap a query function (process_query) so requested or armed calls are profiled"""
+        @wraps(fn)
+        def profiled(query, *args, **kwargs):
+            profile_ids = _requested.get()
+            if current_context().profile is not None or not self._claim(profile_ids is not None):
+                return fn(query, *args, **kwargs)
+
+            category = self.classify(query) if self.classify else fn.__name__
+            with self._lock:
+                profile = Profile(self._next_id, category, self.interval)
+                self._next_id += 1
+            if profile_ids is not None:
+                profile_ids.append(profile.id)
+            self._activate(profile)
+            try:
+                with derived_scope(profile=profile):
+                    return profile.run(fn, query, *args, **kwargs)
+            finally:
+                self._deactivate(profile)
+                profile.finish()
+                self._store(profile)
+        return profiled
+
+    def _activate(self, profile: Profile):
+        with self._wake:
+            self._active[profile.id] = profile
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='buddy-profiler', daemon=True)
+                self._sampler.start()
+            self._wake.notify()
+
+    def _deactivate(self, profile: Profile):
+        with self._wake:
+            self._active.pop(profile.id, None)
+
+    def _sample_loop(self):
+        # Runs for the life of the process, idle while nothing is being profiled
+        while True:
+            with self._wake:
+                while not self._active:
+                    self._wake.wait()
+                interval = self.interval
+            time.sleep(interval)
+            with self._wake:
+                active = list(self._active.values())
+            if active:
+                frames = sys._current_frames()
+                for profile in active:
+                    profile.sample(frames)
+                del frames
+
+    def _store(self, profile: Profile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+            category = self._categories.setdefault(
+                profile.category, {'requests': 0, 'samples': 0, 'duration_ms': 0.0, 'stacks': Counter()})
+            category['requests'] += 1
+            category['samples'] += profile.samples
+            category['duration_ms'] += profile.duration_ms
+            stacks = category['stacks']
+            for stack, count in profile.snapshot().items():
+                if stack in stacks or len(stacks) < self.max_stacks:
+                    stacks[stack] += count
+                else:
+                    stacks[_OVERFLOW] += count
+
+    def get(self, profile_id: int) -> Profile:
+        """Stored profile by id; raises KeyError once it has been evicted"""
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+        if profile is None:
+            raise KeyError(f"No profile {profile_id}")
+        return profile
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [profile.info() for profile in self._profiles.values()]
+
+    def summary(self) -> Dict:
+        """Per-category totals and self-time hotspots"""
+        with self._lock:
+            categories = {name: dict(data, stacks=Counter(data['stacks'])) for name, data in self._categories.items()}
+        return {
+            name: {
+                'requests': data['requests'],
+                'samples': data['samples'],
+                'mean_duration_ms': round(data['duration_ms'] / data['requests'], 1),
+                'hotspots': hotspots(data['stacks'])
+            }
+            for name, data in sorted(categories.items())
+        }
+
+    def collapsed(self, category: Optional[str] = None) -> str:
+        """
+        Merged collapsed stacks of one category, or of all of them with the
+        category as the root frame. Raises KeyError for an unseen category.
+        """
+        with self._lock:
+            if category is not None:
+                if category not in self._categories:
+                    raise KeyError(f"No profiles for category {category!r}")
+                return collapsed(self._categories[category]['stacks'])
+            return ''.join(collapsed(data['stacks'], prefix=f"{name};")
+                           for name, data in sorted(self._categories.items()))
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+            self._categories.clear()
+
+    def memory(self) -> Dict:
+        with self._lock:
+            return {'profiles': len(self._profiles), 'armed': self.armed,
+                    'category_stacks': {name: len(data['stacks']) for name, data in self._categories.items()}}
+
+
+def profiler_from_env(classify: Optional[Callable[[str], str]] = None) -> Profiler:
+    """Build a profiler from PROFILER_INTERVAL_MS, PROFILER_MAX_PROFILES and PROFILER_MAX_STACKS"""
+    return Profiler(
+        classify,
+        interval=float(os.getenv('PROFILER_INTERVAL_MS', '5')) / 1000,
+        max_profiles=int(os.getenv('PROFILER_MAX_PROFILES', '50')),
+        max_stacks=int(os.getenv('PROFILER_MAX_STACKS', '5000'))
+    )
@@ -0,0 +1,138 @@
+"""
+Prompt Building Module for Buddy AI
+Assembles Gemini prompts from their parts (system, context, history, user),
+keeps each intent within a token budget and records per-intent size metrics
+"""
+
+import json
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Default prompt budgets in (estimated) tokens; override with PROMPT_BUDGET_<INTENT>
+DEFAULT_BUDGETS = {
+    'chat': 4000,
+    'ai_conversation': 2000,
+    'ai_interpretation': 2000,
+    'calculation': 1000,
+    'direct_open': 1000,
+    'intent_analysis': 1000,
+    'prompt': 3000
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def budget_for(intent: str) -> int:
+    default = DEFAULT_BUDGETS.get(intent, DEFAULT_BUDGETS['prompt'])
+    return int(os.getenv(f'PROMPT_BUDGET_{intent.upper()}', default))
+
+
+class PromptBuilder:
+    """
+    Builds a prompt for one Gemini call. When the estimate exceeds the intent's
+    budget, the oldest history turns are dropped first, then the extra context.
+    The system instructions and the user's message are never cut.
+    """
+
+    def __init__(self, intent: str, system: str, user: str, context: Optional[Dict] = None,
+                 history: Optional[List[Tuple[str, str]]] = None):
+        self.intent = intent
+        self.system = system
+        self.user = user
+        self.context = context
+        self.history = list(history or [])
+        self.budget = budget_for(intent)
+        self.trimmed_turns = 0
+        self.context_dropped = False
+
+    def _render_context(self) -> str:
+        return f"\n\nAdditional context: {json.dumps(self.context)}" if self.context else ""
+
+    def _render_history(self) -> str:
+        return "".join(f"User: {user}\nbuddy: {reply}\n" for user, reply in self.history)
+
+    def components(self) -> Dict[str, int]:
+        """Estimated tokens per component of the prompt as it stands"""
+        return {
+            'system': estimate_tokens(self.system),
+            'context': estimate_tokens(self._render_context()),
+            'history': estimate_tokens(self._render_history()),
+            'user': estimate_tokens(self.user)
+        }
+
+    def build(self) -> Tuple[str, Dict]:
+        """Return the trimmed prompt text and its token breakdown"""
+        sizes = self.components()
+        while sum(sizes.values()) > self.budget and self.history:
+            self.history.pop(0)
+            self.trimmed_turns += 1
+            sizes['history'] = estimate_tokens(self._render_history())
+
+        if sum(sizes.values()) > self.budget and self.context:
+            self.context = None
+            self.context_dropped = True
+            sizes['context'] = 0
+
+        prompt = f"{self.system}{self._render_context()}\n\n{self._render_history()}User: {self.user}"
+        breakdown = {
+            'intent': self.intent,
+            'budget': self.budget,
+            'components': sizes,
+            'prompt_tokens': sum(sizes.values()),
+            'trimmed_turns': self.trimmed_turns,
+            'context_dropped': self.context_dropped
+        }
+        return prompt, breakdown
+
+
+class PromptMetrics:
+    """Running per-intent totals of prompt and completion sizes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._intents = {}
+
+    def record(self, breakdown: Dict, completion_text: str = "",
+               prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        """
+        Record one call. Token counts reported by the API are preferred; the
+        builder's estimates are used when they are missing.
+        """
+        prompt_tokens = prompt_tokens if prompt_tokens is not None else breakdown['prompt_tokens']
+        completion_tokens = completion_tokens if completion_tokens is not None else estimate_tokens(completion_text)
+        with self._lock:
+            stats = self._intents.setdefault(breakdown['intent'], {
+                'calls': 0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'max_prompt_tokens': 0,
+                'trimmed_turns': 0,
+                'over_budget': 0,
+                'components': {'system': 0, 'context': 0, 'history': 0, 'user': 0}
+            })
+            stats['calls'] += 1
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            stats['max_prompt_tokens'] = max(stats['max_prompt_tokens'], prompt_tokens)
+            stats['trimmed_turns'] += breakdown['trimmed_turns']
+            if breakdown['prompt_tokens'] > breakdown['budget']:
+                stats['over_budget'] += 1
+            for name, size in breakdown['components'].items():
+                stats['components'][name] += size
+
+    def snapshot(self) -> Dict:
+        """Per-intent totals and averages, most expensive intents first"""
+        with self._lock:
+            intents = {name: json.loads(json.dumps(stats)) for name, stats in self._intents.items()}
+        for stats in intents.values():
+            stats['avg_prompt_tokens'] = round(stats['prompt_tokens'] / stats['calls'], 1)
+            stats['avg_completion_tokens'] = round(stats['completion_tokens'] / stats['calls'], 1)
+        return dict(sorted(intents.items(), key=lambda item: -item[1]['prompt_tokens']))
+
+
+prompt_metrics = PromptMetrics()
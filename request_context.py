@@ -0,0 +1,107 @@
+"""
+Request Context Module for Buddy AI
+Carries per-request state through the processing chain without threading it
+through every function signature
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Time kept back from every stage so a fallback answer can still be built
+DEADLINE_RESERVE = float(os.getenv('DEADLINE_RESERVE_SECONDS', '0.25'))
+# Stages with less than this left are skipped rather than started
+MIN_STAGE_SECONDS = float(os.getenv('MIN_STAGE_SECONDS', '0.5'))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when too little of the request budget is left to start a stage"""
+    pass
+
+
+class RequestContext:
+    """State belonging to a single request"""
+
+    def __init__(self, client_ip: Optional[str] = None, deadline: Optional[float] = None,
+                 on_partial: Optional[Callable[[str], None]] = None, session_id: Optional[str] = None,
+                 effects=None, profile=None):
+        # Address of the end user, None when running locally (voice/CLI mode)
+        self.client_ip = client_ip
+        # time.monotonic() value by which the response must be ready, None for no limit
+        self.deadline = deadline
+        # Receives pieces of the LLM reply as they stream in (WebSocket clients), None to not stream
+        self.on_partial = on_partial
+        # Conversation the request belongs to, None for the local desktop session
+        self.session_id = session_id
+        # side_effects.SideEffects policy, None for the process default
+        self.effects = effects
+        # profiling.Profile sampling this request, None when it is not being profiled
+        self.profile = profile
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget, or None when the request has no deadline"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def stage_timeout(self, default: float, minimum: float = MIN_STAGE_SECONDS) -> float:
+        """
+        Timeout for the next stage: its own default, capped by what is left of
+        the budget after the reserve. Raises DeadlineExceeded if that is below minimum.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        available = remaining - DEADLINE_RESERVE
+        if available < minimum:
+            raise DeadlineExceeded(f"Request deadline leaves {max(available, 0):.2f}s, need {minimum:.2f}s")
+        return min(default, available)
+
+
+_current_context = contextvars.ContextVar('buddy_request_context', default=None)
+_default_context = RequestContext()
+
+
+def current_context() -> RequestContext:
+    """Return the context of the request being processed on this thread"""
+    context = _current_context.get()
+    return context if context is not None else _default_context
+
+
+@contextmanager
+def request_scope(**kwargs):
+    """Bind a fresh RequestContext for the duration of a with-block"""
+    context = RequestContext(**kwargs)
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+@contextmanager
+def derived_scope(**changes):
+    """Bind a copy of the current context with some fields changed"""
+    with request_scope(**{**vars(current_context()), **changes}) as context:
+        yield context
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """Submit work to an executor so it sees the caller's request context"""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, _run_in_context, fn, *args, **kwargs)
+
+
+def _run_in_context(fn, *args, **kwargs):
+    # Worker threads of a profiled request are sampled along with it
+    profile = current_context().profile
+    if profile is None:
+        return fn(*args, **kwargs)
+    return profile.run(fn, *args, **kwargs)
+
+
+def stage_timeout(default: float, minimum: float = MIN_STAGE_SECONDS) -> float:
+    """stage_timeout() of the current request context"""
+    return current_context().stage_timeout(default, minimum)
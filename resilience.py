@@ -0,0 +1,166 @@
+"""
+Resilience Module for Buddy AI
+Circuit breakers that stop calling an upstream (Gemini, OpenWeatherMap, NewsAPI)
+while it is failing or slow, so handlers can fall back immediately
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker over a sliding window of recent calls.
+
+    The breaker opens when, over at least `minimum_calls` calls, the share of
+    failures reaches `failure_rate_threshold` or the share of calls slower than
+    `slow_call_seconds` reaches `slow_call_rate_threshold`. After
+    `open_seconds` it lets `half_open_probes` probe calls through; a clean
+    probe closes it again, a failed or slow one re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5,
+                 slow_call_seconds: Optional[float] = None, slow_call_rate_threshold: float = 0.8,
+                 window_size: int = 20, minimum_calls: int = 5,
+                 open_seconds: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = self.CLOSED
+        self._window = deque(maxlen=window_size)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go to the upstream right now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probes_in_flight = 0
+
+            if self.state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    return False
+                self._probes_in_flight += 1
+
+            return True
+
+    def record_success(self, duration: float = 0.0):
+        self._record(False, duration)
+
+    def record_failure(self, duration: float = 0.0):
+        self._record(True, duration)
+
+    def _record(self, failed: bool, duration: float):
+        slow = self.slow_call_seconds is not None and duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._window.clear()
+                return
+
+            if self.state == self.OPEN:
+                # A call admitted before the breaker opened; it has no say now
+                return
+
+            self._window.append((failed, slow))
+            if len(self._window) >= self.minimum_calls:
+                calls = len(self._window)
+                failure_rate = sum(1 for f, _ in self._window if f) / calls
+                slow_rate = sum(1 for _, s in self._window if s) / calls
+                if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                    self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn through the breaker, raising CircuitOpenError if it is open"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def snapshot(self) -> Dict:
+        """Return the breaker state for health reporting"""
+        with self._lock:
+            calls = len(self._window)
+            failures = sum(1 for f, _ in self._window if f)
+            slow = sum(1 for _, s in self._window if s)
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            return {
+                'state': self.state,
+                'calls': calls,
+                'failure_rate': failures / calls if calls else 0.0,
+                'slow_call_rate': slow / calls if calls else 0.0,
+                'rejected': self.rejected,
+                'retry_in_seconds': round(retry_in, 1)
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **config) -> CircuitBreaker:
+    """
+    Return the shared breaker for an upstream, creating it on first use.
+    Defaults can be tuned with CIRCUIT_FAILURE_RATE, CIRCUIT_MINIMUM_CALLS,
+    CIRCUIT_WINDOW_SIZE and CIRCUIT_OPEN_SECONDS.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            settings = {
+                'failure_rate_threshold': float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5')),
+                'minimum_calls': int(os.getenv('CIRCUIT_MINIMUM_CALLS', '5')),
+                'window_size': int(os.getenv('CIRCUIT_WINDOW_SIZE', '20')),
+                'open_seconds': float(os.getenv('CIRCUIT_OPEN_SECONDS', '30'))
+            }
+            settings.update(config)
+            _breakers[name] = CircuitBreaker(name, **settings)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict:
+    """Snapshot of every registered breaker, keyed by upstream name"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
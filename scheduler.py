@@ -0,0 +1,216 @@
+"""
+Request Scheduling Module for Buddy AI
+Two-lane scheduler: queries answered locally run inline on the request thread,
+while LLM and external-API work goes through a separate bounded worker pool so
+it cannot starve the cheap queries
+"""
+
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+
+class LaneFull(Exception):
+    """Raised when the slow lane's queue is at capacity"""
+    pass
+
+
+class LaneScheduler:
+    """
+    Fast lane: the caller runs the work itself, no queueing.
+    Slow lane: `slow_workers` threads drain a queue of at most `slow_queue_size`
+    waiting items; submissions beyond that raise LaneFull.
+    """
+
+    def __init__(self, classify_local: Callable[[str], bool], slow_workers: int = 8, slow_queue_size: int = 64):
+        self.classify_local = classify_local
+        self.slow_workers = slow_workers
+        self._queue = queue.Queue(maxsize=slow_queue_size)
+        self._lock = threading.Lock()
+        self.fast_in_flight = 0
+        self.slow_in_flight = 0
+        self.fast_completed = 0
+        self.slow_completed = 0
+        # Exponentially weighted moving averages of slow-lane queue wait and service
+        # time (the wait average is only reported; admission uses estimated_wait())
+        self.queue_wait_ewma = 0.0
+        self.service_time_ewma = 0.0
+
+        for i in range(slow_workers):
+            threading.Thread(target=self._worker, name=f'buddy-slow-lane-{i}', daemon=True).start()
+
+    def is_fast(self, query: str) -> bool:
+        try:
+            return self.classify_local(query)
+        except Exception:
+            return False
+
+    def run(self, query: str, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the lane the query belongs to and return its result"""
+        if self.is_fast(query):
+            return self.run_fast(fn, *args, **kwargs)
+        return self.submit_slow(fn, *args, **kwargs).result()
+
+    def run_fast(self, fn: Callable, *args, **kwargs):
+        with self._lock:
+            self.fast_in_flight += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.fast_in_flight -= 1
+                self.fast_completed += 1
+
+    def submit_slow(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue work on the slow lane, carrying over the caller's request context"""
+        future = Future()
+        item = (future, contextvars.copy_context(), fn, args, kwargs, time.monotonic())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            raise LaneFull(f"Slow lane queue is full ({self._queue.maxsize} waiting)")
+        return future
+
+    def _worker(self):
+        while True:
+            future, context, fn, args, kwargs, enqueued_at = self._queue.get()
+            waited = time.monotonic() - enqueued_at
+            with self._lock:
+                self.slow_in_flight += 1
+                self.queue_wait_ewma = 0.8 * self.queue_wait_ewma + 0.2 * waited
+
+            started = time.monotonic()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(context.run(fn, *args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._lock:
+                self.slow_in_flight -= 1
+                self.slow_completed += 1
+                self.service_time_ewma = 0.8 * self.service_time_ewma + 0.2 * (time.monotonic() - started)
+
+    def pending(self) -> int:
+        """Slow-lane items running or waiting"""
+        return self.slow_in_flight + self._queue.qsize()
+
+    def oldest_wait(self) -> float:
+        """Seconds the oldest queued slow-lane item has been waiting, 0 when the queue is empty"""
+        with self._queue.mutex:
+            if not self._queue.queue:
+                return 0.0
+            enqueued_at = self._queue.queue[0][5]
+        return time.monotonic() - enqueued_at
+
+    def estimated_wait(self) -> float:
+        """
+        Expected queue wait for a new slow-lane item: the larger of how long the
+        oldest queued item has waited and the backlog drained at the recent
+        service rate. Both are measured from the queue as it is now, so the
+        estimate falls back to 0 once a burst has drained, even if rejected
+        requests never reach the queue.
+        """
+        backlog_wait = self._queue.qsize() / self.slow_workers * self.service_time_ewma
+        return max(self.oldest_wait(), backlog_wait)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'fast_in_flight': self.fast_in_flight,
+                'fast_completed': self.fast_completed,
+                'slow_workers': self.slow_workers,
+                'slow_in_flight': self.slow_in_flight,
+                'slow_queued': self._queue.qsize(),
+                'slow_queue_limit': self._queue.maxsize,
+                'slow_completed': self.slow_completed,
+                'queue_wait_ms': round(self.queue_wait_ewma * 1000, 1),
+                'service_time_ms': round(self.service_time_ewma * 1000, 1)
+            }
+
+
+class AdmissionController:
+    """
+    Decides, per request, whether to run it normally, degrade it or shed it.
+
+    Local queries are always admitted. Past the soft limits (pending slow-lane
+    work or estimated queue wait), queries that would go to Gemini are
+    answered from the offline fallbacks instead. Past the hard limits every
+    slow-lane query is rejected with a retry hint, which keeps latency bounded
+    for the requests that are admitted.
+    """
+
+    ADMIT = 'admit'
+    DEGRADE = 'degrade'
+    REJECT = 'reject'
+
+    def __init__(self, scheduler: LaneScheduler, is_llm_query: Callable[[str], bool],
+                 soft_pending: int, hard_pending: int, soft_wait: float, hard_wait: float):
+        self.scheduler = scheduler
+        self.is_llm_query = is_llm_query
+        self.soft_pending = soft_pending
+        self.hard_pending = hard_pending
+        self.soft_wait = soft_wait
+        self.hard_wait = hard_wait
+        self.counts = {self.ADMIT: 0, self.DEGRADE: 0, self.REJECT: 0}
+        self._lock = threading.Lock()
+
+    def decide(self, query: str) -> str:
+        decision = self.ADMIT
+        if not self.scheduler.is_fast(query):
+            pending = self.scheduler.pending()
+            wait = self.scheduler.estimated_wait()
+            if pending >= self.hard_pending or wait >= self.hard_wait:
+                decision = self.REJECT
+            elif (pending >= self.soft_pending or wait >= self.soft_wait) and self.is_llm_query(query):
+                decision = self.DEGRADE
+
+        with self._lock:
+            self.counts[decision] += 1
+        return decision
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying"""
+        return max(1, int(self.scheduler.estimated_wait() + 0.999))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            'soft_pending': self.soft_pending,
+            'hard_pending': self.hard_pending,
+            'soft_wait_s': self.soft_wait,
+            'hard_wait_s': self.hard_wait,
+            'estimated_wait_s': round(self.scheduler.estimated_wait(), 3),
+            'decisions': counts
+        }
+
+
+def scheduler_from_env(classify_local: Callable[[str], bool]) -> LaneScheduler:
+    """Build the scheduler using SLOW_LANE_WORKERS / SLOW_LANE_QUEUE"""
+    return LaneScheduler(
+        classify_local,
+        slow_workers=int(os.getenv('SLOW_LANE_WORKERS', '8')),
+        slow_queue_size=int(os.getenv('SLOW_LANE_QUEUE', '64'))
+    )
+
+
+def admission_from_env(scheduler: LaneScheduler, is_llm_query: Callable[[str], bool]) -> AdmissionController:
+    """
+    Build the admission controller using ADMISSION_* settings. Pending limits
+    default to the slow lane's worker count (soft) and workers plus most of the
+    queue (hard).
+    """
+    queue_limit = scheduler.stats()['slow_queue_limit']
+    return AdmissionController(
+        scheduler,
+        is_llm_query,
+        soft_pending=int(os.getenv('ADMISSION_SOFT_PENDING', str(scheduler.slow_workers))),
+        hard_pending=int(os.getenv('ADMISSION_HARD_PENDING', str(scheduler.slow_workers + queue_limit * 3 // 4))),
+        soft_wait=float(os.getenv('ADMISSION_SOFT_WAIT', '2')),
+        hard_wait=float(os.getenv('ADMISSION_HARD_WAIT', '8'))
+    )
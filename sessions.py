@@ -0,0 +1,64 @@
+"""
+Session Module for Buddy AI
+Per-session chat history, so concurrent users (HTTP clients, WebSocket
+connections, the local voice user) each keep their own conversation instead
+of sharing one global transcript
+"""
+
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from caching import TTLCache
+
+# Session used when a request carries no session id (desktop voice/CLI mode)
+LOCAL_SESSION = 'local'
+
+
+class SessionStore:
+    """
+    Chat turns per session id. Idle sessions expire after `ttl` seconds and at
+    most `maxsize` sessions are kept (least recently used dropped first); each
+    keeps its last `max_turns` turns.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0, max_turns: int = 50):
+        self.max_turns = max_turns
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        """A copy of the session's (user, buddy) turns, oldest first"""
+        with self._lock:
+            return list(self._sessions.get(session_id) or [])
+
+    def append(self, session_id: str, user: str, reply: str):
+        with self._lock:
+            turns = self._sessions.get(session_id) or []
+            turns.append((user, reply))
+            # Re-set on every turn so an active session never expires mid-conversation
+            self._sessions.set(session_id, turns[-self.max_turns:])
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.set(session_id, [])
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def memory(self) -> Dict:
+        """Session count and approximate size of all stored turns (for diagnostics)"""
+        return dict(self._sessions.memory(), max_turns=self.max_turns)
+
+
+def session_store_from_env() -> SessionStore:
+    """Build the store using SESSION_MAX / SESSION_TTL / SESSION_MAX_TURNS"""
+    return SessionStore(
+        maxsize=int(os.getenv('SESSION_MAX', '10000')),
+        ttl=float(os.getenv('SESSION_TTL', '3600')),
+        max_turns=int(os.getenv('SESSION_MAX_TURNS', '50'))
+    )
+
+
+# Global session store
+session_store = session_store_from_env()
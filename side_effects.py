@@ -0,0 +1,56 @@
+"""
+Side Effects Module for Buddy AI
+What a query may do besides producing its reply (speak, open a browser tab,
+launch an application, quit the program) depends on where Buddy is running.
+The desktop assistant does all of it on the user's machine; the API server
+must do none of it, since the user is on another machine and the process is
+shared by many requests. The policy is carried by the request context.
+"""
+
+import subprocess
+import webbrowser
+
+from request_context import current_context
+
+
+class SideEffects:
+    """Side-effect policy for one execution mode"""
+
+    def __init__(self, name: str, speech: bool, desktop_actions: bool, allow_quit: bool, console: bool = False):
+        self.name = name
+        # Speak replies aloud through the local speakers
+        self.speech = speech
+        # Open browser tabs and launch applications on this machine
+        self.desktop_actions = desktop_actions
+        # "buddy quit" / "shutdown" end the process (desktop) or only the session (server)
+        self.allow_quit = allow_quit
+        # Print replies to the console for the person at the keyboard
+        self.console = console
+
+    def open_url(self, url: str) -> bool:
+        if self.desktop_actions:
+            return webbrowser.open(url)
+        return True
+
+    def launch_process(self, *args, **kwargs):
+        if self.desktop_actions:
+            return subprocess.Popen(*args, **kwargs)
+        return None
+
+
+DESKTOP = SideEffects('desktop', speech=True, desktop_actions=True, allow_quit=True, console=True)
+SERVER = SideEffects('server', speech=False, desktop_actions=False, allow_quit=False)
+
+_default_effects = DESKTOP
+
+
+def current_effects() -> SideEffects:
+    """Policy of the request being processed, or the process default outside a request"""
+    effects = current_context().effects
+    return effects if effects is not None else _default_effects
+
+
+def set_default_effects(effects: SideEffects):
+    """Change the policy used outside request scopes (e.g. SERVER for bulk runs and load tests)"""
+    global _default_effects
+    _default_effects = effects
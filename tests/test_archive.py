@@ -0,0 +1,57 @@
+"""
+Archive Tests for Buddy AI
+Lookups stream records from segment files and the counters stay consistent under concurrency
+"""
+
+import io
+import json
+import threading
+import types
+
+from archive import ArchiveWriter
+
+
+def _archive(tmp_path, **kwargs):
+    return ArchiveWriter(directory=str(tmp_path / 'archive'), **kwargs)
+
+
+def test_lookup_is_lazy_and_spans_segments(tmp_path):
+    archive = _archive(tmp_path, segment_bytes=512)
+    for i in range(20):
+        archive.record(f"prompt {i}", f"response {i}", session='a' if i % 2 else 'b')
+    assert archive.flush()
+    assert len(archive.segments()) > 1
+
+    records = archive.lookup(session='a')
+    assert isinstance(records, types.GeneratorType)
+    assert [r['prompt'] for r in records] == [f"prompt {i}" for i in range(1, 20, 2)]
+    assert [r['prompt'] for r in archive.lookup(limit=3)] == ["prompt 17", "prompt 18", "prompt 19"]
+
+
+def test_export_streams_matching_records(tmp_path):
+    archive = _archive(tmp_path)
+    for i in range(5):
+        archive.record(f"prompt {i}", f"response {i}", intent='chat' if i < 3 else 'prompt')
+    assert archive.flush()
+
+    out = io.StringIO()
+    assert archive.export(out, intent='chat') == 3
+    assert [json.loads(line)['prompt'] for line in out.getvalue().splitlines()] == \
+        ["prompt 0", "prompt 1", "prompt 2"]
+
+
+def test_counters_are_exact_under_concurrent_drops(tmp_path):
+    archive = _archive(tmp_path, queue_size=1)
+    # Never started, so the queue stays full and every record after the first is dropped
+    archive._ensure_started = lambda: None
+
+    def record_many():
+        for _ in range(1000):
+            archive.record("prompt", "response")
+
+    threads = [threading.Thread(target=record_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert archive.stats()['dropped'] == 8 * 1000 - 1
@@ -0,0 +1,45 @@
+"""
+Caching Tests for Buddy AI
+Paraphrases share a similarity-cache entry; questions that differ in meaning never do
+"""
+
+import pytest
+
+from caching import SimilarityCache, normalize_text
+
+# Same question, worded differently
+NEAR_DUPLICATES = [
+    ("what's machine learning", "explain machine learning to me"),
+    ("tell me about black holes", "what are black holes"),
+    ("can you please explain photosynthesis", "what is photosynthesis?"),
+    ("What is the capital of France?", "what's the capital of france"),
+    ("how does a nuclear reactor generate electricity for homes",
+     "how does a nuclear reactor generate electricity for our homes"),
+    ("what are the main causes of the first world war and the second",
+     "what were the main causes of the first world war and the second"),
+]
+
+# Different questions whose wording overlaps
+DISTINCT = [
+    ("what is the meaning of life", "what is life"),
+    ("what is on the moon", "what is the moon"),
+    ("who was albert einstein", "who is albert einstein"),
+    ("who is the president of france", "who was the president of france"),
+    ("history of rome", "history of greece"),
+    ("what is information theory", "what is theory"),
+]
+
+
+@pytest.mark.parametrize('cached, asked', NEAR_DUPLICATES)
+def test_near_duplicates_share_an_answer(cached, asked):
+    cache = SimilarityCache(threshold=0.85)
+    cache.set(cached, 'answer')
+    assert cache.get(asked) == 'answer'
+
+
+@pytest.mark.parametrize('cached, asked', DISTINCT)
+def test_distinct_questions_miss(cached, asked):
+    cache = SimilarityCache(threshold=0.85)
+    cache.set(cached, 'answer')
+    assert normalize_text(cached) != normalize_text(asked)
+    assert cache.get(asked) is None
@@ -0,0 +1,29 @@
+"""
+External API Tests for Buddy AI
+Circuit breaker bookkeeping around upstream HTTP calls
+"""
+
+import pytest
+
+from external_apis import ExternalAPIManager
+from resilience import CircuitBreaker
+
+
+class BrokenSession:
+    """Session whose get fails with a non-requests exception"""
+
+    def get(self, *args, **kwargs):
+        raise ValueError("malformed proxy URL")
+
+
+def test_unexpected_error_releases_half_open_probe():
+    apis = ExternalAPIManager()
+    apis.session = BrokenSession()
+    breaker = CircuitBreaker('test-upstream', open_seconds=0.0, half_open_probes=1)
+    breaker._open()
+
+    with pytest.raises(ValueError):
+        apis._guarded_get(breaker, 'http://upstream.invalid/', {})
+    # The failed probe re-opened the breaker and a new probe may go through
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request()
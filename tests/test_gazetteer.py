@@ -0,0 +1,79 @@
+"""
+Gazetteer Tests for Buddy AI
+Trie lookups of city and country names and the splitting of multi-city weather queries
+"""
+
+import pytest
+
+from enhanced_commands import buddy_processor
+from gazetteer import gazetteer
+
+RESOLVE = [
+    # text, (name, country) or None
+    ("london", ('London', 'GB')),
+    ("London, UK", ('London', 'GB')),
+    ("london canada", ('London', 'CA')),
+    ("london, ca", ('London', 'CA')),
+    ("paris france", ('Paris', 'FR')),
+    ("paris, us", ('Paris', 'US')),
+    ("new york", ('New York', 'US')),
+    ("new york city", ('New York', 'US')),
+    ("NYC", ('New York', 'US')),
+    ("bombay", ('Mumbai', 'IN')),
+    ("São  Paulo!", ('Sao Paulo', 'BR')),
+    ("york", None),
+    ("london bridge", None),
+    ("paris, tx", None),
+    ("xyzzy", None),
+    ("", None),
+]
+
+COUNTRIES = [
+    ("uk", 'GB'),
+    ("GB", 'GB'),
+    ("united kingdom", 'GB'),
+    ("usa", 'US'),
+    ("united states", 'US'),
+    ("france", 'FR'),
+    ("in", 'IN'),
+    ("de", 'DE'),
+    ("ny", None),
+    ("la", None),
+    ("zz", None),
+    ("united", None),
+]
+
+SPLIT = [
+    ("mumbai, delhi and pune", ['mumbai', 'delhi', 'pune']),
+    ("compare tokyo vs osaka", ['tokyo', 'osaka']),
+    ("in london and in paris?", ['london', 'paris']),
+    ("london, london", ['london']),
+    # Two-letter country codes stay attached to the city before them
+    ("London,UK and Paris,FR", ['London,UK', 'Paris,FR']),
+    ("between berlin, de and paris", ['berlin,de', 'paris']),
+    # Two-letter parts that are not country codes are cities of their own
+    ("ny and la", ['ny', 'la']),
+    ("la, ny", ['la', 'ny']),
+]
+
+
+@pytest.mark.parametrize('text, expected', RESOLVE)
+def test_resolve(text, expected):
+    place = gazetteer.resolve(text)
+    assert (place and (place.name, place.country)) == expected
+
+
+@pytest.mark.parametrize('text, code', COUNTRIES)
+def test_country(text, code):
+    assert gazetteer.country(text) == code
+
+
+def test_spot_finds_every_city_in_order():
+    places = gazetteer.spot("compare weather in new york and london uk vs paris")
+    assert [(place.name, place.country) for place in places] == \
+        [('New York', 'US'), ('London', 'GB'), ('Paris', 'FR')]
+
+
+@pytest.mark.parametrize('location, expected', SPLIT)
+def test_split_locations(location, expected):
+    assert buddy_processor._split_locations(location) == expected
@@ -0,0 +1,68 @@
+"""
+Query Processing Tests for Buddy AI
+Routing of queries between local answers, hedged handlers and the AI fallback
+"""
+
+import main
+from request_context import request_scope
+from side_effects import SERVER
+
+
+class ForbiddenExecutor:
+    """Stands in for hedge_executor and fails the test if anything is submitted"""
+
+    def submit(self, *args, **kwargs):
+        raise AssertionError("local query was sent to the hedge executor")
+
+
+def test_local_query_never_touches_hedge_executor(monkeypatch):
+    monkeypatch.setattr(main, 'hedge_executor', ForbiddenExecutor())
+    query = "what's the time"
+    assert main.buddy_processor.classify(query) in main.HEDGED_CATEGORIES
+    assert main.is_local_query(query)
+
+    with request_scope(effects=SERVER):
+        reply = main.process_query(query)
+    assert 'time' in reply.lower()
+
+
+def test_saturated_hedge_pool_answers_inline(monkeypatch):
+    monkeypatch.setattr(main, 'hedge_executor', ForbiddenExecutor())
+    monkeypatch.setattr(main, 'hedge_slots', main.threading.BoundedSemaphore(1))
+    monkeypatch.setattr(main.buddy_processor, 'process_command',
+                        lambda query: {'success': True, 'message': 'Sunny in Paris'})
+    main.hedge_slots.acquire()
+
+    with request_scope(effects=SERVER):
+        assert main.hedged_process("weather in Paris") == 'Sunny in Paris'
+
+
+def test_hedge_pool_covers_the_slow_lane():
+    assert main.HEDGE_MAX_WORKERS >= 2 * int(main.os.getenv('SLOW_LANE_WORKERS', '8'))
+    assert main.HEDGE_TIMEOUT > 0
+
+
+def _forbidden_chat(query):
+    raise AssertionError("local query fell back to AI chat")
+
+
+def test_failing_local_handler_answers_offline(monkeypatch):
+    monkeypatch.setattr(main, 'chat', _forbidden_chat)
+
+    def broken(query):
+        raise RuntimeError("psutil unavailable")
+    monkeypatch.setattr(main.buddy_processor, 'process_command', broken)
+
+    query = "hello buddy"
+    assert main.is_local_query(query)
+    with request_scope(effects=SERVER):
+        assert main.process_query(query) == main.buddy_processor.offline_response(query)
+
+
+def test_unsuccessful_local_handler_returns_its_message(monkeypatch):
+    monkeypatch.setattr(main, 'chat', _forbidden_chat)
+    monkeypatch.setattr(main.buddy_processor, 'process_command',
+                        lambda query: {'success': False, 'message': "Battery information not available"})
+
+    with request_scope(effects=SERVER):
+        assert main.process_query("hello buddy") == "Battery information not available"
@@ -0,0 +1,65 @@
+"""
+Profiling Tests for Buddy AI
+Profiles can be read and stored while the sampler thread is still adding to them
+"""
+
+import sys
+import threading
+import time
+
+from profiling import Profile, Profiler
+
+
+def _busy(stop, depth=0):
+    # Recurse to varying depths so each sample adds new distinct stacks
+    if depth < 30 and not stop.is_set():
+        return _busy(stop, depth + 1)
+    while not stop.is_set():
+        time.sleep(0)
+
+
+def test_snapshot_while_sampling():
+    profile = Profile(1, 'test', interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=profile.run, args=(_busy, stop))
+    worker.start()
+    errors = []
+
+    def sample():
+        while not stop.is_set():
+            profile.sample(sys._current_frames())
+
+    def read():
+        try:
+            while not stop.is_set():
+                sum(profile.snapshot().values())
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=sample), threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    stop.set()
+    for thread in threads + [worker]:
+        thread.join()
+    assert errors == []
+    assert profile.samples > 0
+
+
+def test_finished_profile_takes_no_more_samples():
+    profiler = Profiler(interval=0.001)
+    profile = Profile(1, 'test', interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=profile.run, args=(_busy, stop))
+    worker.start()
+    time.sleep(0.05)
+    profile.sample(sys._current_frames())
+    profile.finish()
+    profiler._store(profile)
+
+    profile.sample(sys._current_frames())
+    stop.set()
+    worker.join()
+    assert profile.samples == 1
+    assert sum(profile.snapshot().values()) == profiler.summary()['test']['samples'] == 1
@@ -0,0 +1,36 @@
+"""
+Scheduler Tests for Buddy AI
+Admission control must recover once a slow-lane burst has drained
+"""
+
+import threading
+import time
+
+from scheduler import AdmissionController, LaneScheduler
+
+
+def _controller(scheduler):
+    return AdmissionController(scheduler, is_llm_query=lambda query: True,
+                               soft_pending=100, hard_pending=100, soft_wait=0.2, hard_wait=0.8)
+
+
+def test_admits_again_after_burst_then_idle():
+    scheduler = LaneScheduler(classify_local=lambda query: False, slow_workers=2, slow_queue_size=64)
+    admission = _controller(scheduler)
+    release = threading.Event()
+
+    # Burst: 24 jobs on 2 workers, held until the queue has built up
+    futures = [scheduler.submit_slow(release.wait) for _ in range(2)]
+    futures += [scheduler.submit_slow(time.sleep, 0.05) for _ in range(22)]
+    time.sleep(1.0)
+    assert admission.decide('tell me a story') == AdmissionController.REJECT
+
+    release.set()
+    for future in futures:
+        future.result(timeout=10)
+
+    # Idle: nothing queued, so the old waits must not keep shedding load
+    time.sleep(0.3)
+    assert scheduler.pending() == 0
+    assert scheduler.estimated_wait() < 0.2
+    assert admission.decide('tell me a story') == AdmissionController.ADMIT
@@ -0,0 +1,28 @@
+"""
+Traffic Capture Tests for Buddy AI
+Captured requests are written off the request path and dropped, not blocked on, when the queue is full
+"""
+
+from traffic import TrafficRecorder, load_traffic
+
+
+def test_records_are_written_by_background_thread(tmp_path):
+    path = tmp_path / 'traffic.jsonl'
+    recorder = TrafficRecorder(str(path), salt='test')
+    for query in ["weather in Paris", "mail me at a@b.com"]:
+        assert recorder.record(query, 'session-1')
+
+    assert recorder.flush()
+    records = list(load_traffic(str(path)))
+    assert [record['query'] for record in records] == ["weather in Paris", "mail me at <email>"]
+    assert recorder.stats() == {'queued': 0, 'written': 2, 'dropped': 0}
+
+
+def test_full_queue_drops_and_counts(tmp_path, monkeypatch):
+    recorder = TrafficRecorder(str(tmp_path / 'traffic.jsonl'), queue_size=2)
+    # Keep the writer from draining the queue
+    monkeypatch.setattr(recorder, '_ensure_started', lambda: None)
+
+    results = [recorder.record(f"query {i}", 'session-1') for i in range(5)]
+    assert results == [True, True, False, False, False]
+    assert recorder.stats()['dropped'] == 3
@@ -0,0 +1,94 @@
+"""
+Unit Conversion Tests for Buddy AI
+Parsing of conversion queries, resolution of ambiguous symbols and rejection of invalid units
+"""
+
+import pytest
+
+from units import UnitError, parse_conversion, parse_quantity, parse_unit
+
+CONVERSIONS = [
+    # query, value, from, to, result
+    ("convert 5 miles to km", 5, 'mile', 'kilometer', 8.04672),
+    ("how many ounces in a pound", 1, 'pound', 'ounce', 16),
+    ("what is 10 kg in pounds", 10, 'kilogram', 'pound', 22.0462),
+    ("convert 100 f to c", 100, 'degree Fahrenheit', 'degree Celsius', 37.7778),
+    ("convert -40 °f to celsius", -40, 'degree Fahrenheit', 'degree Celsius', -40),
+    ("convert 1,500 ml to liters", 1500, 'milliliter', 'liter', 1.5),
+    ("how many feet in 1 1/2 miles", 1.5, 'mile', 'foot', 7920),
+    ("convert half a mile to meters", 0.5, 'mile', 'meter', 804.672),
+    ("convert 60 mph to km/h", 60, 'mile per hour', 'kilometer per hour', 96.5606),
+    ("convert 1 m/s to km per hour", 1, 'meter per second', 'kilometer per hour', 3.6),
+    ("how many minutes in a day", 1, 'day', 'minute', 1440),
+    ("convert 1 gb to mb", 1, 'gigabyte', 'megabyte', 1000),
+]
+
+# Symbols and words with more than one possible reading, and the one chosen
+AMBIGUOUS = [
+    ('m', 'meter'),
+    ('min', 'minute'),
+    ('ms', 'millisecond'),
+    ('oz', 'ounce'),
+    ('fl oz', 'fluid ounce'),
+    ('t', 'tonne'),
+    ('ton', 'tonne'),
+    ('c', 'degree Celsius'),
+    ('f', 'degree Fahrenheit'),
+    ('deg f', 'degree Fahrenheit'),
+    ('in', 'inch'),
+    ('st', 'stone'),
+    ('mb', 'megabyte'),
+]
+
+INVALID_UNITS = ['', 'blorp', 'hz', 'kg per', 'per km']
+
+INCOMPATIBLE = [
+    "convert 5 kg to meters",
+    "convert 5 kg per km to grams",
+    "convert 10 kilograms per liter to m",
+]
+
+NOT_CONVERSIONS = [
+    "convert 5 blorps to km",
+    "convert 3 m to",
+    "top 10 places to visit",
+    "what is 12 * 7",
+]
+
+
+@pytest.mark.parametrize('query, value, source, target, result', CONVERSIONS)
+def test_conversion(query, value, source, target, result):
+    conversion = parse_conversion(query)
+    assert conversion is not None
+    assert (conversion.value, conversion.source.name, conversion.target.name) == (value, source, target)
+    assert conversion.result == pytest.approx(result, rel=1e-5)
+
+
+@pytest.mark.parametrize('text, name', AMBIGUOUS)
+def test_ambiguous_unit_resolution(text, name):
+    assert parse_unit(text).name == name
+
+
+@pytest.mark.parametrize('text', INVALID_UNITS)
+def test_unknown_unit_raises(text):
+    with pytest.raises(UnitError):
+        parse_unit(text)
+
+
+@pytest.mark.parametrize('text', ["1/0 miles", "5 blorps"])
+def test_invalid_quantity_raises(text):
+    with pytest.raises(UnitError):
+        parse_quantity(text)
+
+
+@pytest.mark.parametrize('query', INCOMPATIBLE)
+def test_incompatible_units_parse_but_do_not_convert(query):
+    conversion = parse_conversion(query)
+    assert conversion is not None
+    with pytest.raises(UnitError, match="different kinds of quantity"):
+        conversion.result
+
+
+@pytest.mark.parametrize('query', NOT_CONVERSIONS)
+def test_not_a_conversion(query):
+    assert parse_conversion(query) is None
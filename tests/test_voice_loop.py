@@ -0,0 +1,80 @@
+"""
+Voice Loop Tests for Buddy AI
+Utterance segmentation of a generated recording (silence, tone, silence)
+"""
+
+import math
+import wave
+from array import array
+
+from voice_loop import EnergyVAD, WavFileSource
+
+SAMPLE_RATE = 16000
+CHUNK_FRAMES = 1000  # 62.5 ms per chunk
+CHUNK_BYTES = CHUNK_FRAMES * 2
+
+
+def _pcm(layout):
+    """16-bit PCM for a list of (kind, chunks) spans, kind 'silence' or 'tone'"""
+    samples = array('h')
+    for kind, chunks in layout:
+        for _ in range(chunks * CHUNK_FRAMES):
+            t = len(samples) / SAMPLE_RATE
+            samples.append(int(8000 * math.sin(2 * math.pi * 440 * t)) if kind == 'tone' else 0)
+    return samples.tobytes()
+
+
+def _write_wav(path, pcm):
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+
+
+def _segment(path):
+    source = WavFileSource(str(path), chunk_frames=CHUNK_FRAMES)
+    # 5 chunks of pre-roll, 13 of closing silence, at least 5 of speech
+    vad = EnergyVAD(SAMPLE_RATE, source.chunk_seconds)
+    utterances = []
+    try:
+        while True:
+            chunk = source.read()
+            if not chunk:
+                break
+            utterance = vad.feed(chunk)
+            if utterance:
+                utterances.append(utterance)
+    finally:
+        source.close()
+    tail = vad.flush()
+    if tail:
+        utterances.append(tail)
+    return utterances
+
+
+def _chunks(pcm, first, last):
+    return pcm[first * CHUNK_BYTES:(last + 1) * CHUNK_BYTES]
+
+
+def test_tones_between_silence_become_utterances(tmp_path):
+    # Tones at chunks 16-31 and 56-63, plus a 2-chunk click at 80-81 too short to keep
+    layout = [('silence', 16), ('tone', 16), ('silence', 24), ('tone', 8),
+              ('silence', 16), ('tone', 2), ('silence', 26)]
+    pcm = _pcm(layout)
+    path = tmp_path / 'speech.wav'
+    _write_wav(path, pcm)
+
+    utterances = _segment(path)
+
+    # Speech is detected on a tone's second chunk and the pre-roll reaches 3 chunks
+    # further back; 5 chunks of the closing silence are kept
+    assert len(utterances) == 2
+    assert utterances[0] == _chunks(pcm, 13, 36)
+    assert utterances[1] == _chunks(pcm, 53, 68)
+
+
+def test_silence_only_has_no_utterances(tmp_path):
+    path = tmp_path / 'silence.wav'
+    _write_wav(path, _pcm([('silence', 40)]))
+    assert _segment(path) == []
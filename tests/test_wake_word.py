@@ -0,0 +1,107 @@
+"""
+Wake Word Tests for Buddy AI
+Gating of utterances with a scripted spotter and recognizer
+"""
+
+import threading
+
+import pytest
+import speech_recognition as sr
+
+from wake_word import TranscriptSpotter, WakeWordGate
+
+SAMPLE_RATE = 16000
+
+
+class Script:
+    """Scripted recognizer: each utterance is recognized as the text it was made with"""
+
+    def __init__(self):
+        self.transcripts = {}
+        self.calls = []
+
+    def utterance(self, text, seconds):
+        audio = sr.AudioData(b'\0\0' * int(SAMPLE_RATE * seconds), SAMPLE_RATE, 2)
+        self.transcripts[id(audio)] = text
+        return audio
+
+    def recognize(self, audio):
+        text = self.transcripts[id(audio)]
+        self.calls.append(text)
+        return text
+
+
+@pytest.fixture
+def script():
+    return Script()
+
+
+def _gate(script, **kwargs):
+    # The spotter reads the same script without counting as a cloud call
+    spotter = TranscriptSpotter(lambda audio: script.transcripts[id(audio)])
+    return WakeWordGate(spotter, script.recognize, **kwargs)
+
+
+def test_utterance_without_wake_word_is_gated(script):
+    gate = _gate(script)
+    with pytest.raises(sr.UnknownValueError):
+        gate(script.utterance("what's the weather", 2.0))
+    assert script.calls == []
+    assert gate.stats()['gated'] == 1
+
+
+def test_short_wake_word_arms_gate_for_next_utterance(script):
+    woken = []
+    gate = _gate(script, window_seconds=8.0, on_wake=lambda: woken.append(True))
+
+    with pytest.raises(sr.UnknownValueError):
+        gate(script.utterance("buddy", 0.6))
+    assert woken == [True]
+    assert gate.armed
+
+    assert gate(script.utterance("what's the weather", 2.0)) == "what's the weather"
+    assert not gate.armed
+    # The window is used up, so the utterance after that is gated again
+    with pytest.raises(sr.UnknownValueError):
+        gate(script.utterance("and tomorrow", 1.0))
+    assert script.calls == ["what's the weather"]
+
+
+def test_armed_window_expires(script):
+    gate = _gate(script, window_seconds=0.0)
+    with pytest.raises(sr.UnknownValueError):
+        gate(script.utterance("buddy", 0.6))
+    with pytest.raises(sr.UnknownValueError):
+        gate(script.utterance("what's the weather", 2.0))
+    assert script.calls == []
+
+
+def test_long_wake_word_utterance_is_forwarded_immediately(script):
+    gate = _gate(script)
+    assert gate(script.utterance("buddy, what's the weather", 2.5)) == "buddy, what's the weather"
+    assert not gate.armed
+    assert gate.stats()['forwarded'] == 1
+
+
+def test_armed_window_admits_one_concurrent_utterance(script):
+    gate = _gate(script)
+    with pytest.raises(sr.UnknownValueError):
+        gate(script.utterance("buddy", 0.6))
+
+    utterances = [script.utterance("what's the weather", 2.0) for _ in range(8)]
+    start = threading.Barrier(len(utterances))
+    forwarded = []
+
+    def attempt(audio):
+        start.wait()
+        try:
+            forwarded.append(gate(audio))
+        except sr.UnknownValueError:
+            pass
+
+    threads = [threading.Thread(target=attempt, args=(audio,)) for audio in utterances]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(forwarded) == 1
@@ -0,0 +1,447 @@
+"""
+Traffic Capture and Replay for Buddy AI
+Records sanitized /api/chat traffic to JSONL and replays it against a local
+instance to measure throughput, latency percentiles and error rates.
+
+Capture is enabled in api.py by setting TRAFFIC_CAPTURE_PATH (and optionally
+TRAFFIC_CAPTURE_SAMPLE between 0 and 1). Records are queued and appended by a
+background thread; when the queue (TRAFFIC_CAPTURE_QUEUE) is full they are
+dropped and counted rather than slowing requests down.
+
+Replay usage:
+    python traffic.py replay traffic.jsonl --rps 20 --duration 60
+    python traffic.py replay traffic.jsonl --clients 8
+    python traffic.py replay traffic.jsonl --clients 8 --url http://localhost:5000/api/chat
+    python traffic.py serve --port 5001
+
+Without --url, replay starts a local instance of api.py on an ephemeral port
+with Gemini replaced by the LLM stand-in server (llm_standin.py) and
+OpenWeatherMap, NewsAPI and ipapi.co replaced by local fakes.
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Patterns scrubbed from captured queries
+_REDACTIONS = [
+    (re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'), '<email>'),
+    (re.compile(r'https?://\S+'), '<url>'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}\b'), '<ip>'),
+]
+_NUMBER_RUN = re.compile(r'\+?\d[\d\s().-]{5,}\d')
+
+
+def _redact_number(match: re.Match) -> str:
+    # Only long digit runs (phone/card numbers); spaced minus signs mean arithmetic
+    text = match.group()
+    digits = sum(char.isdigit() for char in text)
+    return '<number>' if digits >= 7 and ' - ' not in text else text
+
+
+def sanitize_query(query: str) -> str:
+    """Remove personal data (emails, URLs, IPs, phone/card numbers) from a query"""
+    for pattern, replacement in _REDACTIONS:
+        query = pattern.sub(replacement, query)
+    return _NUMBER_RUN.sub(_redact_number, query)
+
+
+class TrafficRecorder:
+    """Appends sanitized chat requests to a JSONL file from a background thread"""
+
+    def __init__(self, path: str, sample_rate: float = 1.0, salt: Optional[str] = None,
+                 queue_size: int = 10000):
+        self.path = path
+        self.sample_rate = sample_rate
+        # Sessions are stored as salted hashes so raw identifiers never hit disk
+        self.salt = salt if salt is not None else os.urandom(8).hex()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, query: str, session: str) -> bool:
+        """Queue one request; returns False if it was dropped because the queue is full"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return True
+
+        entry = {
+            'timestamp': time.time(),
+            'session': hashlib.sha256(f"{self.salt}:{session}".encode()).hexdigest()[:16],
+            'query': sanitize_query(query)
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(json.dumps(entry, ensure_ascii=False) + "\n")
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued record has been written; returns whether it caught up"""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._queue.all_tasks_done.wait(min(remaining, 0.1))
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'queued': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name='buddy-traffic', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _writer(self):
+        while True:
+            lines = [self._queue.get()]
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+                with self._lock:
+                    self.written += len(lines)
+            except Exception as e:
+                logger.error("Traffic capture write failed: %s", e)
+                with self._lock:
+                    self.dropped += len(lines)
+            finally:
+                for _ in lines:
+                    self._queue.task_done()
+
+
+def recorder_from_env() -> Optional[TrafficRecorder]:
+    """Build a recorder if TRAFFIC_CAPTURE_PATH is set"""
+    path = os.getenv('TRAFFIC_CAPTURE_PATH')
+    if not path:
+        return None
+    return TrafficRecorder(path, float(os.getenv('TRAFFIC_CAPTURE_SAMPLE', '1.0')),
+                           os.getenv('TRAFFIC_CAPTURE_SALT'),
+                           queue_size=int(os.getenv('TRAFFIC_CAPTURE_QUEUE', '10000')))
+
+
+def load_traffic(path: str) -> Iterator[Dict]:
+    """Stream captured records from a JSONL file"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# ---------------------------------------------------------------------------
+# Local fakes for upstream services
+# ---------------------------------------------------------------------------
+
+class _FakeResponse:
+    def __init__(self, status_code: int, payload: Dict):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def install_fake_upstreams(llm_latency: float = 0.8, api_latency: float = 0.2,
+                           error_rate: float = 0.0):
+    """
+    Replace Gemini with the local LLM stand-in server and the external HTTP
+    APIs with in-process fakes that sleep for a jittered latency instead of
+    calling the network. LLM calls still go through the prompt builder and
+    circuit breaker. Desktop side effects (browser tabs, launching
+    applications, speech, quitting) are disabled as well.
+    """
+    import main
+    import external_apis
+    from gazetteer import gazetteer
+    from side_effects import SERVER, set_default_effects
+
+    def jitter(base):
+        time.sleep(random.uniform(0.5 * base, 1.5 * base))
+
+    def fake_get(url, params=None, timeout=None, **kwargs):
+        jitter(api_latency)
+        if random.random() < error_rate:
+            return _FakeResponse(503, {})
+        params = params or {}
+        if 'openweathermap' in url:
+            if 'id' in params:
+                city = gazetteer.get(int(params['id'])).name
+            else:
+                city = str(params.get('q', 'London')).split(',')[0].title()
+            return _FakeResponse(200, {
+                'name': city,
+                'main': {'temp': 20 + len(city) % 10, 'humidity': 60},
+                'weather': [{'description': 'scattered clouds'}],
+                'wind': {'speed': 3.5}
+            })
+        if 'newsapi' in url:
+            count = int(params.get('pageSize', 5))
+            return _FakeResponse(200, {'articles': [
+                {'title': f"Fake headline {i} about {params.get('q')}", 'source': {'name': 'Fake News'}}
+                for i in range(1, count + 1)
+            ]})
+        if 'ipapi' in url:
+            return _FakeResponse(200, {'city': 'London', 'country_name': 'United Kingdom',
+                                       'country': 'GB', 'timezone': 'Europe/London'})
+        return _FakeResponse(404, {})
+
+    from llm_backends import StandInBackend, set_backend
+    from llm_standin import start_standin
+
+    _, standin_url = start_standin(latency=f"uniform:{0.5 * llm_latency},{1.5 * llm_latency}",
+                                   rate_429=error_rate)
+    set_backend(StandInBackend(standin_url))
+
+    external_apis.api_manager.session = SimpleNamespace(get=fake_get, head=fake_get)
+    external_apis.api_manager.weather_api_key = external_apis.api_manager.weather_api_key or 'fake'
+    external_apis.api_manager.news_api_key = external_apis.api_manager.news_api_key or 'fake'
+
+    main.set_speech_enabled(False)
+    set_default_effects(SERVER)
+
+
+def start_local_instance(port: int = 0, **fake_options):
+    """Serve api.py with fake upstreams on a background thread; returns (server, url)"""
+    from werkzeug.serving import make_server
+
+    install_fake_upstreams(**fake_options)
+    from api import app
+    import main
+
+    # api.py picks the speech setting from FLASK_ENV on import
+    main.set_speech_enabled(False)
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/chat"
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class ReplayStats:
+    """Collects per-category latency samples and error counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, category: str, latency: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(category, []).append(latency)
+            if not ok:
+                self.errors[category] = self.errors.get(category, 0) + 1
+
+    def report(self, elapsed: float) -> Dict:
+        categories = {}
+        total = 0
+        total_errors = 0
+        for category, latencies in sorted(self.samples.items()):
+            latencies = sorted(latencies)
+            errors = self.errors.get(category, 0)
+            total += len(latencies)
+            total_errors += errors
+            categories[category] = {
+                'requests': len(latencies),
+                'error_rate': errors / len(latencies),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p90_ms': percentile(latencies, 90) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'max_ms': latencies[-1] * 1000
+            }
+        return {
+            'requests': total,
+            'elapsed_s': elapsed,
+            'throughput_rps': total / elapsed if elapsed else 0.0,
+            'error_rate': total_errors / total if total else 0.0,
+            'categories': categories
+        }
+
+
+def _send(session, url: str, record: Dict, classify, stats: ReplayStats, start_time: float):
+    """Send one request; latency is measured from its scheduled start time"""
+    category = classify(record['query'])
+    try:
+        response = session.post(url, json={'query': record['query'], 'session_id': record.get('session')},
+                                timeout=60)
+        ok = response.status_code == 200
+    except Exception:
+        ok = False
+    stats.add(category, time.perf_counter() - start_time, ok)
+
+
+def replay_open_loop(records: Iterator[Dict], url: str, rps: float, concurrency: int,
+                     duration: Optional[float], classify) -> Dict:
+    """
+    Issue requests at a fixed arrival rate regardless of how fast the server
+    answers. Latency includes any time spent waiting for a free worker, so
+    queueing under overload is not hidden.
+    """
+    import requests
+
+    stats = ReplayStats()
+    local = threading.local()
+
+    def send(record, scheduled):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        _send(local.session, url, record, classify, stats, scheduled)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, record in enumerate(records):
+            scheduled = start + i / rps
+            if duration is not None and scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, record, scheduled)
+    return stats.report(time.perf_counter() - start)
+
+
+def replay_closed_loop(records: Iterator[Dict], url: str, clients: int,
+                       duration: Optional[float], classify) -> Dict:
+    """Run N clients that each send their next request as soon as the last one returns"""
+    import requests
+
+    stats = ReplayStats()
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def client():
+        session = requests.Session()
+        while duration is None or time.perf_counter() - start < duration:
+            with lock:
+                record = next(records, None)
+            if record is None:
+                return
+            _send(session, url, record, classify, stats, time.perf_counter())
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.perf_counter() - start)
+
+
+def print_report(report: Dict):
+    print(f"Requests: {report['requests']}  elapsed: {report['elapsed_s']:.1f}s  "
+          f"throughput: {report['throughput_rps']:.1f} req/s  errors: {report['error_rate']:.1%}")
+    print(f"{'category':<18}{'count':>8}{'err%':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for category, row in report['categories'].items():
+        print(f"{category:<18}{row['requests']:>8}{row['error_rate'] * 100:>8.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p90_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured Buddy AI traffic")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay = subparsers.add_parser('replay', help="replay a captured JSONL file")
+    replay.add_argument('path')
+    replay.add_argument('--url', help="target /api/chat URL (default: local instance with fake upstreams)")
+    mode = replay.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--rps', type=float, help="open-loop arrival rate")
+    mode.add_argument('--clients', type=int, help="closed-loop client count")
+    replay.add_argument('--concurrency', type=int, default=64, help="max in-flight requests in open-loop mode")
+    replay.add_argument('--duration', type=float, help="stop after this many seconds")
+    replay.add_argument('--limit', type=int, help="replay at most this many records")
+    replay.add_argument('--llm-latency', type=float, default=0.8)
+    replay.add_argument('--api-latency', type=float, default=0.2)
+    replay.add_argument('--error-rate', type=float, default=0.0)
+    replay.add_argument('--json', action='store_true', help="print the report as JSON")
+
+    serve = subparsers.add_parser('serve', help="run api.py with fake upstreams")
+    serve.add_argument('--port', type=int, default=5001)
+    serve.add_argument('--llm-latency', type=float, default=0.8)
+    serve.add_argument('--api-latency', type=float, default=0.2)
+    serve.add_argument('--error-rate', type=float, default=0.0)
+
+    args = parser.parse_args()
+    fake_options = {'llm_latency': args.llm_latency, 'api_latency': args.api_latency,
+                    'error_rate': args.error_rate}
+
+    if args.command == 'serve':
+        server, url = start_local_instance(args.port, **fake_options)
+        print(f"Serving with fake upstreams at {url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    url = args.url
+    server = None
+    if not url:
+        server, url = start_local_instance(**fake_options)
+
+    from enhanced_commands import buddy_processor
+
+    records = load_traffic(args.path)
+    if args.limit:
+        records = islice(records, args.limit)
+
+    if args.rps:
+        report = replay_open_loop(records, url, args.rps, args.concurrency, args.duration,
+                                  buddy_processor.classify)
+    else:
+        report = replay_closed_loop(iter(records), url, args.clients, args.duration,
+                                    buddy_processor.classify)
+
+    if server:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Units Module for Buddy AI
+Offline unit and quantity conversion for "convert 5 miles to km" and
+"how many ounces in a pound" style queries. Units live in a registry keyed by
+dimension (length, mass, volume, temperature, time, data size, speed); metric
+and data units get their prefixed forms generated, and "X per Y" / "X/Y"
+builds compound units such as km/h or MB/s on the fly. Conversions are exact
+arithmetic on the registry, so answers need no AI call.
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+class UnitError(ValueError):
+    """Unknown unit, malformed quantity, or units of different dimensions"""
+    pass
+
+
+class Unit:
+    """A unit as a linear map to its dimension's base unit: base = value * factor + offset"""
+
+    def __init__(self, name: str, dimension: str, factor: float, offset: float = 0.0, plural: Optional[str] = None):
+        self.name = name
+        self.plural = plural or f"{name}s"
+        self.dimension = dimension
+        self.factor = factor
+        self.offset = offset
+
+    def label(self, value: float) -> str:
+        return self.name if value == 1 else self.plural
+
+    def __truediv__(self, other: 'Unit') -> 'Unit':
+        if self.offset or other.offset:
+            raise UnitError(f"{self.plural} per {other.name} is not a meaningful unit")
+        return Unit(f"{self.name} per {other.name}", f"{self.dimension}/{other.dimension}",
+                    self.factor / other.factor, plural=f"{self.plural} per {other.name}")
+
+    def __repr__(self):
+        return f"Unit({self.name!r}, {self.dimension!r})"
+
+
+# Friendlier names for compound dimensions in error messages
+DIMENSION_NAMES = {'length/time': 'speed', 'data/time': 'data rate'}
+
+SI_PREFIXES = {
+    'tera': ('t', 1e12), 'giga': ('g', 1e9), 'mega': ('m', 1e6), 'kilo': ('k', 1e3),
+    'deci': ('d', 1e-1), 'centi': ('c', 1e-2), 'milli': ('m', 1e-3), 'micro': ('u', 1e-6), 'nano': ('n', 1e-9)
+}
+BINARY_PREFIXES = {'kibi': ('ki', 2 ** 10), 'mebi': ('mi', 2 ** 20), 'gibi': ('gi', 2 ** 30), 'tebi': ('ti', 2 ** 40)}
+
+_units = {}
+
+
+def _register(unit: Unit, *aliases: str):
+    for alias in (unit.name, unit.plural) + aliases:
+        _units[alias] = unit
+
+
+def _register_prefixed(base_name: str, symbol: str, dimension: str, factor: float,
+                       prefixes: Dict[str, Tuple[str, float]], allowed: List[str], spellings: Tuple[str, ...] = ()):
+    """
+    Register `allowed` prefixed forms of a unit under their full names
+    ("kilometre", "kilometer") and symbols ("km"). Queries arrive lowercased,
+    so only prefixes whose lowercase symbol is unambiguous for the unit are allowed.
+    """
+    for prefix in allowed:
+        prefix_symbol, multiplier = prefixes[prefix]
+        unit = Unit(prefix + base_name, dimension, factor * multiplier)
+        names = [prefix + spelling for spelling in spellings]
+        _register(unit, prefix_symbol + symbol, *names, *[f"{name}s" for name in names])
+
+
+def _build_registry():
+    # Length (base: metre)
+    _register(Unit('meter', 'length', 1.0), 'm', 'metre', 'metres')
+    _register_prefixed('meter', 'm', 'length', 1.0, SI_PREFIXES, ['kilo', 'centi', 'milli', 'micro', 'nano'], ('metre',))
+    _register(Unit('inch', 'length', 0.0254, plural='inches'), 'in', '"')
+    _register(Unit('foot', 'length', 0.3048, plural='feet'), 'ft', "'")
+    _register(Unit('yard', 'length', 0.9144), 'yd', 'yds')
+    _register(Unit('mile', 'length', 1609.344), 'mi')
+    _register(Unit('nautical mile', 'length', 1852.0), 'nmi')
+
+    # Mass (base: kilogram)
+    _register(Unit('gram', 'mass', 1e-3), 'g', 'gm', 'gms', 'gramme', 'grammes')
+    _register_prefixed('gram', 'g', 'mass', 1e-3, SI_PREFIXES, ['kilo', 'milli', 'micro'], ('gramme',))
+    _units['kilo'] = _units['kilos'] = _units['kgs'] = _units['kilogram']
+    _register(Unit('tonne', 'mass', 1000.0), 't', 'ton', 'tons', 'metric ton', 'metric tons')
+    _register(Unit('short ton', 'mass', 907.18474), 'us ton', 'us tons')
+    _register(Unit('long ton', 'mass', 1016.0469088), 'imperial ton', 'imperial tons')
+    _register(Unit('ounce', 'mass', 0.028349523125), 'oz')
+    _register(Unit('pound', 'mass', 0.45359237), 'lb', 'lbs')
+    _register(Unit('stone', 'mass', 6.35029318, plural='stone'), 'st', 'stones')
+    _register(Unit('carat', 'mass', 2e-4), 'ct')
+
+    # Volume (base: litre)
+    _register(Unit('liter', 'volume', 1.0), 'l', 'litre', 'litres', 'ltr')
+    _register_prefixed('liter', 'l', 'volume', 1.0, SI_PREFIXES, ['milli', 'centi', 'deci'], ('litre',))
+    _register(Unit('cubic meter', 'volume', 1000.0), 'm3', 'm^3', 'cubic metre', 'cubic metres')
+    _register(Unit('cubic centimeter', 'volume', 1e-3), 'cm3', 'cm^3', 'cc', 'cubic centimetre', 'cubic centimetres')
+    _register(Unit('cubic foot', 'volume', 28.316846592, plural='cubic feet'), 'ft3', 'cu ft')
+    _register(Unit('cubic inch', 'volume', 0.016387064, plural='cubic inches'), 'in3', 'cu in')
+    _register(Unit('gallon', 'volume', 3.785411784), 'gal', 'us gallon', 'us gallons')
+    _register(Unit('imperial gallon', 'volume', 4.54609), 'uk gallon', 'uk gallons')
+    _register(Unit('quart', 'volume', 0.946352946), 'qt')
+    _register(Unit('pint', 'volume', 0.473176473), 'pt')
+    _register(Unit('cup', 'volume', 0.2365882365))
+    _register(Unit('fluid ounce', 'volume', 0.0295735295625), 'fl oz', 'floz')
+    _register(Unit('tablespoon', 'volume', 0.01478676478125), 'tbsp')
+    _register(Unit('teaspoon', 'volume', 0.00492892159375), 'tsp')
+
+    # Temperature (base: kelvin)
+    _register(Unit('degree Celsius', 'temperature', 1.0, 273.15, plural='degrees Celsius'), 'c', 'celsius', 'centigrade')
+    _register(Unit('degree Fahrenheit', 'temperature', 5 / 9, 273.15 - 32 * 5 / 9, plural='degrees Fahrenheit'),
+              'f', 'fahrenheit')
+    _register(Unit('kelvin', 'temperature', 1.0, plural='kelvin'), 'k')
+
+    # Time (base: second)
+    _register(Unit('second', 'time', 1.0), 's', 'sec', 'secs')
+    _register_prefixed('second', 's', 'time', 1.0, SI_PREFIXES, ['milli', 'micro', 'nano'])
+    _register(Unit('minute', 'time', 60.0), 'min', 'mins')
+    _register(Unit('hour', 'time', 3600.0), 'h', 'hr', 'hrs')
+    _register(Unit('day', 'time', 86400.0), 'd')
+    _register(Unit('week', 'time', 604800.0), 'wk', 'wks')
+    _register(Unit('fortnight', 'time', 1209600.0))
+    # Average Gregorian month and year
+    _register(Unit('month', 'time', 2629746.0), 'mo')
+    _register(Unit('year', 'time', 31556952.0), 'yr', 'yrs')
+    _register(Unit('decade', 'time', 315569520.0))
+    _register(Unit('century', 'time', 3155695200.0, plural='centuries'))
+
+    # Data size (base: byte); lowercase "mb" means megabytes, bits are spelled out or "mbit"
+    _register(Unit('byte', 'data', 1.0), 'b')
+    _register_prefixed('byte', 'b', 'data', 1.0, SI_PREFIXES, ['kilo', 'mega', 'giga', 'tera'])
+    _register_prefixed('byte', 'b', 'data', 1.0, BINARY_PREFIXES, list(BINARY_PREFIXES))
+    _register(Unit('bit', 'data', 0.125))
+    _register_prefixed('bit', 'bit', 'data', 0.125, SI_PREFIXES, ['kilo', 'mega', 'giga', 'tera'])
+
+    # Speed (base: metre per second); other combinations come from "per" and "/"
+    _register(Unit('kilometer per hour', 'length/time', 1000 / 3600, plural='kilometers per hour'),
+              'km/h', 'kmh', 'kph', 'kmph', 'kilometres per hour')
+    _register(Unit('mile per hour', 'length/time', 1609.344 / 3600, plural='miles per hour'), 'mph')
+    _register(Unit('meter per second', 'length/time', 1.0, plural='meters per second'), 'm/s', 'mps',
+              'metres per second')
+    _register(Unit('knot', 'length/time', 1852 / 3600), 'kn', 'kt', 'kts')
+
+    # Data rate (base: byte per second)
+    for prefix, symbol, multiplier in (('kilo', 'k', 1e3), ('mega', 'm', 1e6), ('giga', 'g', 1e9)):
+        _register(Unit(f"{prefix}bit per second", 'data/time', multiplier / 8, plural=f"{prefix}bits per second"),
+                  f"{symbol}bps")
+
+
+_build_registry()
+
+_NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'dozen': 12, 'a dozen': 12,
+    'hundred': 100, 'a hundred': 100, 'thousand': 1000, 'a thousand': 1000, 'million': 1e6, 'a million': 1e6,
+    'half': 0.5, 'half a': 0.5, 'half an': 0.5, 'a half': 0.5, 'quarter': 0.25, 'a quarter': 0.25,
+    'quarter of a': 0.25, 'a quarter of a': 0.25
+}
+
+_NUMBER = re.compile(
+    r'^(?P<number>[-+]?(?:\d+\s+\d+/\d+|\d+/\d+|(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+)(?:e[-+]?\d+)?)\s*(?P<rest>.*)$'
+)
+
+
+def parse_number(text: str) -> float:
+    """Digits, thousands separators, decimals, exponents and fractions ("1 1/2")"""
+    text = text.replace(',', '').strip()
+    if '/' in text:
+        whole, _, fraction = text.rpartition(' ')
+        numerator, denominator = fraction.split('/')
+        if float(denominator) == 0:
+            raise UnitError("Division by zero in quantity")
+        value = float(numerator) / float(denominator)
+        return float(whole) + value if whole else value
+    return float(text)
+
+
+def parse_unit(text: str) -> Unit:
+    """
+    Look up a unit name, symbol or plural, ignoring "degrees"/"°" before
+    temperatures. "A per B" and "A/B" build compound units. Raises UnitError.
+    """
+    text = re.sub(r'\s+', ' ', text.lower().strip().rstrip('?.!')).strip()
+    text = re.sub(r'^(?:the|a|an) ', '', text)
+    if text in _units:
+        return _units[text]
+
+    temperature = re.sub(r'^(?:°|degrees? |deg )\s*', '', text)
+    if temperature != text and temperature in _units and _units[temperature].dimension == 'temperature':
+        return _units[temperature]
+
+    compound = re.split(r'\s*/\s*|\s+per\s+', text, maxsplit=1)
+    if len(compound) == 2 and all(compound):
+        return parse_unit(compound[0]) / parse_unit(compound[1])
+
+    # Plurals the registry does not list ("kilometre" prefixes, "inches" variants)
+    for suffix in ('es', 's'):
+        if text.endswith(suffix) and text[:-len(suffix)] in _units:
+            return _units[text[:-len(suffix)]]
+    raise UnitError(f"Unknown unit '{text}'")
+
+
+def parse_quantity(text: str) -> Tuple[float, Unit]:
+    """'5 miles', '1,500 ml', '-40 °f', 'a pound', 'half a mile' -> (value, unit). Raises UnitError."""
+    text = re.sub(r'\s+', ' ', text.lower().strip().rstrip('?.!')).strip()
+    match = _NUMBER.match(text)
+    if match and match.group('rest'):
+        return parse_number(match.group('number')), parse_unit(match.group('rest'))
+
+    for words in sorted(_NUMBER_WORDS, key=len, reverse=True):
+        if text.startswith(words + ' '):
+            return _NUMBER_WORDS[words], parse_unit(text[len(words) + 1:])
+    # A bare unit means one of it ("how many ounces in pound")
+    return 1.0, parse_unit(text)
+
+
+def convert(value: float, source: Unit, target: Unit) -> float:
+    """Convert between two units of the same dimension. Raises UnitError otherwise."""
+    if source.dimension != target.dimension:
+        raise UnitError(f"I can't convert {source.plural} to {target.plural}: "
+                        f"{DIMENSION_NAMES.get(source.dimension, source.dimension)} and "
+                        f"{DIMENSION_NAMES.get(target.dimension, target.dimension)} are different kinds of quantity.")
+    base = value * source.factor + source.offset
+    return (base - target.offset) / target.factor
+
+
+def format_number(value: float) -> str:
+    """Six significant digits, thousands separators, no trailing zeros"""
+    if value == 0:
+        return '0'
+    if abs(value) >= 1e15 or abs(value) < 1e-6:
+        return f"{value:.6g}"
+    rounded = float(f"{value:.6g}")
+    decimals = max(0, 5 - math.floor(math.log10(abs(rounded))))
+    return f"{rounded:,.{decimals}f}".rstrip('0').rstrip('.') if decimals else f"{rounded:,.0f}"
+
+
+class Conversion:
+    """A parsed conversion request"""
+
+    def __init__(self, value: float, source: Unit, target: Unit):
+        self.value = value
+        self.source = source
+        self.target = target
+
+    @property
+    def result(self) -> float:
+        return convert(self.value, self.source, self.target)
+
+    @property
+    def message(self) -> str:
+        result = self.result
+        return (f"{format_number(self.value)} {self.source.label(self.value)} is "
+                f"{format_number(result)} {self.target.label(result)}")
+
+    def to_dict(self) -> Dict:
+        return {
+            'value': self.value,
+            'from': self.source.name,
+            'to': self.target.name,
+            'dimension': DIMENSION_NAMES.get(self.source.dimension, self.source.dimension),
+            'result': self.result
+        }
+
+
+_CONVERT = re.compile(r'^(?:please )?convert (?P<rest>.+)$')
+_HOW_MANY = re.compile(r'^how (?:many|much) (?P<target>.+?) (?:are |is |make |makes )?(?:there )?(?:in|to|per) (?P<quantity>.+)$')
+_QUESTION = re.compile(r'^(?:(?:what(?:\'s| is)|how much is) )?(?P<rest>.+)$')
+
+
+def _split_at_connector(text: str, connectors: str, require_number: bool) -> Optional[Conversion]:
+    """'<quantity> <connector> <unit>', trying each connector position until both sides parse"""
+    for match in re.finditer(rf'(?<= )(?:{connectors})(?= )', text):
+        quantity, target = text[:match.start() - 1], text[match.end() + 1:]
+        if require_number and not _NUMBER.match(quantity):
+            continue
+        try:
+            value, source = parse_quantity(quantity)
+            return Conversion(value, source, parse_unit(target))
+        except ValueError:
+            continue
+    return None
+
+
+def parse_conversion(query: str) -> Optional[Conversion]:
+    """
+    The conversion a query asks for, or None if it is not a unit conversion.
+    Understands "convert 5 miles to km", "how many ounces in a pound" and
+    "what is 10 kg in pounds". Incompatible units still parse; the
+    Conversion raises UnitError when its result is asked for.
+    """
+    query = re.sub(r'\s+', ' ', query.lower().strip().rstrip('?.!')).strip()
+    match = _CONVERT.match(query)
+    if match:
+        return _split_at_connector(match.group('rest'), 'to|into|in', require_number=False)
+
+    match = _HOW_MANY.match(query)
+    if match:
+        try:
+            value, source = parse_quantity(match.group('quantity'))
+            return Conversion(value, source, parse_unit(match.group('target')))
+        except ValueError:
+            pass
+
+    # Free form needs a leading number, so "top 10 places to visit" is left alone
+    return _split_at_connector(_QUESTION.match(query).group('rest'), 'in|into|to|as', require_number=True)
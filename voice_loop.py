@@ -0,0 +1,379 @@
+"""
+Continuous Voice Loop Module for Buddy AI
+Keeps the microphone open and turns the audio stream into utterances in the
+background: a capture thread fills a ring buffer, an energy-based voice
+activity detector cuts it into utterances, and recognition runs on its own
+thread, so utterance N is being recognized while the reply to utterance N-1
+is still being processed. Speech during processing is queued instead of lost.
+
+Ambient-noise calibration happens once when the loop starts (or not at all
+when VOICE_ENERGY_THRESHOLD is set) and the threshold is reused afterwards.
+
+Usage:
+    python voice_loop.py                      # live microphone
+    python voice_loop.py --wav sample.wav     # replay a 16-bit PCM WAV file
+"""
+
+import argparse
+import math
+import os
+import queue
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import speech_recognition as sr
+
+
+class AudioSource:
+    """Stream of 16-bit mono PCM chunks; read() returns b'' when the stream ends"""
+
+    sample_rate = 16000
+    sample_width = 2
+    chunk_frames = 1024
+
+    def read(self) -> bytes:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @property
+    def chunk_seconds(self) -> float:
+        return self.chunk_frames / self.sample_rate
+
+
+class MicrophoneSource(AudioSource):
+    """Live microphone input through speech_recognition / PyAudio, opened once"""
+
+    def __init__(self, device_index: Optional[int] = None, sample_rate: int = 16000, chunk_frames: int = 1024):
+        self._microphone = sr.Microphone(device_index=device_index, sample_rate=sample_rate,
+                                         chunk_size=chunk_frames)
+        self._microphone.__enter__()
+        self.sample_rate = self._microphone.SAMPLE_RATE
+        self.sample_width = self._microphone.SAMPLE_WIDTH
+        self.chunk_frames = self._microphone.CHUNK
+
+    def read(self) -> bytes:
+        return self._microphone.stream.read(self.chunk_frames)
+
+    def close(self):
+        self._microphone.__exit__(None, None, None)
+
+
+class WavFileSource(AudioSource):
+    """
+    Reads a mono 16-bit WAV file in microphone-sized chunks. With realtime=True
+    chunks are paced at the file's sample rate, like a live microphone.
+    """
+
+    def __init__(self, path: str, chunk_frames: int = 1024, realtime: bool = False):
+        self._wav = wave.open(path, 'rb')
+        if self._wav.getsampwidth() != 2 or self._wav.getnchannels() != 1:
+            raise ValueError(f"{path}: expected mono 16-bit PCM audio")
+        self.sample_rate = self._wav.getframerate()
+        self.sample_width = 2
+        self.chunk_frames = chunk_frames
+        self.realtime = realtime
+
+    def read(self) -> bytes:
+        if self.realtime:
+            time.sleep(self.chunk_seconds)
+        return self._wav.readframes(self.chunk_frames)
+
+    def close(self):
+        self._wav.close()
+
+
+def rms_energy(chunk: bytes) -> float:
+    """Root-mean-square amplitude of a 16-bit PCM chunk"""
+    samples = array('h', chunk[:len(chunk) - len(chunk) % 2])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class RingBuffer:
+    """
+    Bounded FIFO of audio chunks shared by the capture and segmentation
+    threads. When the consumer falls behind, the oldest chunks are dropped so
+    capture never blocks on a full buffer.
+    """
+
+    def __init__(self, capacity: int):
+        self._chunks = deque(maxlen=capacity)
+        self._ready = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, chunk: bytes):
+        with self._ready:
+            if len(self._chunks) == self._chunks.maxlen:
+                self.dropped += 1
+            self._chunks.append(chunk)
+            self._ready.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Next chunk, or None once the buffer is closed and drained (or on timeout)"""
+        with self._ready:
+            if not self._chunks and not self.closed:
+                self._ready.wait(timeout)
+            return self._chunks.popleft() if self._chunks else None
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+
+    def __len__(self):
+        return len(self._chunks)
+
+
+class EnergyVAD:
+    """
+    Energy-threshold voice activity detection and utterance segmentation.
+
+    An utterance starts once `start_chunks` consecutive chunks are above the
+    threshold (keeping `pre_roll` seconds of audio before it, so first
+    syllables are not clipped) and ends after `silence_seconds` below it or
+    at `max_seconds`. Utterances shorter than `min_seconds` are discarded.
+    """
+
+    def __init__(self, sample_rate: int, chunk_seconds: float, threshold: float = 300.0,
+                 start_chunks: int = 2, silence_seconds: float = 0.8, pre_roll: float = 0.3,
+                 min_seconds: float = 0.3, max_seconds: float = 15.0):
+        self.sample_rate = sample_rate
+        self.chunk_seconds = chunk_seconds
+        self.threshold = threshold
+        self.start_chunks = start_chunks
+        self.silence_chunks = max(1, round(silence_seconds / chunk_seconds))
+        self.min_chunks = max(1, round(min_seconds / chunk_seconds))
+        self.max_chunks = max(1, round(max_seconds / chunk_seconds))
+        self._pre_roll = deque(maxlen=max(1, round(pre_roll / chunk_seconds)))
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._lead = 0
+        self._speech: Optional[List[bytes]] = None
+
+    def calibrate(self, chunks: List[bytes], multiplier: float = 1.5, floor: float = 100.0) -> float:
+        """Set the threshold from a sample of ambient noise and return it"""
+        ambient = sum(rms_energy(c) for c in chunks) / len(chunks) if chunks else 0.0
+        self.threshold = max(floor, ambient * multiplier)
+        return self.threshold
+
+    def feed(self, chunk: bytes) -> Optional[bytes]:
+        """Consume one chunk; returns the raw audio of an utterance when one ends"""
+        voiced = rms_energy(chunk) > self.threshold
+
+        if self._speech is None:
+            self._pre_roll.append(chunk)
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.start_chunks:
+                self._speech = list(self._pre_roll)
+                self._lead = len(self._speech) - self._voiced_run
+                self._pre_roll.clear()
+                self._silent_run = 0
+            return None
+
+        self._speech.append(chunk)
+        self._silent_run = 0 if voiced else self._silent_run + 1
+        if self._silent_run >= self.silence_chunks or len(self._speech) >= self.max_chunks:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[bytes]:
+        """End any utterance in progress (e.g. at end of stream) and return it if long enough"""
+        speech, self._speech = self._speech, None
+        self._voiced_run = 0
+        if not speech:
+            return None
+        # Pre-roll and trailing silence do not count towards the minimum length
+        if len(speech) - self._lead - self._silent_run < self.min_chunks:
+            return None
+        # Keep only as much trailing silence as pre-roll; the rest is dead air for the recognizer
+        excess = self._silent_run - self._pre_roll.maxlen
+        if excess > 0:
+            speech = speech[:-excess]
+        return b''.join(speech)
+
+
+def google_recognizer(language: str = 'en-in') -> Callable[[sr.AudioData], str]:
+    """Recognition function backed by one shared sr.Recognizer"""
+    recognizer = sr.Recognizer()
+    return lambda audio: recognizer.recognize_google(audio, language=language)
+
+
+class VoiceLoop:
+    """
+    Runs capture, segmentation and recognition on background threads and
+    hands recognized text to `process` on the thread that called run().
+
+    `pause_when` is polled for every chunk; audio captured while it returns
+    True (e.g. while Buddy is speaking) is ignored so replies are not heard
+    back as commands.
+    """
+
+    def __init__(self, source: AudioSource, process: Callable[[str], str],
+                 recognize: Optional[Callable[[sr.AudioData], str]] = None,
+                 energy_threshold: Optional[float] = None, calibration_seconds: float = 1.0,
+                 buffer_seconds: float = 30.0, max_pending_utterances: int = 8,
+                 pause_when: Optional[Callable[[], bool]] = None,
+                 on_response: Optional[Callable[[str, str], None]] = None):
+        self.source = source
+        self.process = process
+        self.recognize = recognize or google_recognizer()
+        self.pause_when = pause_when
+        self.on_response = on_response
+        self.calibration_seconds = calibration_seconds
+        self.vad = EnergyVAD(source.sample_rate, source.chunk_seconds)
+        if energy_threshold is not None:
+            self.vad.threshold = energy_threshold
+        self.calibrated = energy_threshold is not None
+        self.buffer = RingBuffer(max(1, round(buffer_seconds / source.chunk_seconds)))
+        self.utterances = queue.Queue(maxsize=max_pending_utterances)
+        self.transcripts = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.counts = {'utterances': 0, 'recognized': 0, 'unrecognized': 0, 'dropped_utterances': 0,
+                       'processed': 0}
+
+    def _calibrate(self):
+        chunks = []
+        needed = max(1, round(self.calibration_seconds / self.source.chunk_seconds))
+        while len(chunks) < needed:
+            chunk = self.source.read()
+            if not chunk:
+                break
+            chunks.append(chunk)
+        threshold = self.vad.calibrate(chunks)
+        self.calibrated = True
+        print(f"Voice loop calibrated (energy threshold {threshold:.0f})")
+
+    def _capture(self):
+        try:
+            if not self.calibrated:
+                self._calibrate()
+            while not self._stop.is_set():
+                chunk = self.source.read()
+                if not chunk:
+                    break
+                self.buffer.put(chunk)
+        except Exception as e:
+            print(f"Voice capture stopped: {e}")
+        finally:
+            self.buffer.close()
+
+    def _segment(self):
+        while True:
+            chunk = self.buffer.get(timeout=0.5)
+            if chunk is None:
+                if self.buffer.closed:
+                    break
+                continue
+            if self.pause_when and self.pause_when():
+                self.vad.flush()
+                continue
+            speech = self.vad.feed(chunk)
+            if speech:
+                self._queue_utterance(speech)
+
+        speech = self.vad.flush()
+        if speech:
+            self._queue_utterance(speech)
+        self.utterances.put(None)
+
+    def _queue_utterance(self, speech: bytes):
+        self.counts['utterances'] += 1
+        audio = sr.AudioData(speech, self.source.sample_rate, self.source.sample_width)
+        try:
+            self.utterances.put_nowait(audio)
+        except queue.Full:
+            self.counts['dropped_utterances'] += 1
+            print("Voice loop is behind, dropping an utterance")
+
+    def _recognize(self):
+        while True:
+            audio = self.utterances.get()
+            if audio is None:
+                break
+            try:
+                text = self.recognize(audio)
+            except sr.UnknownValueError:
+                self.counts['unrecognized'] += 1
+                continue
+            except sr.RequestError as e:
+                print(f"Could not request results; {e}")
+                continue
+            if text:
+                self.counts['recognized'] += 1
+                print(f"User said: {text}")
+                self.transcripts.put(text)
+        self.transcripts.put(None)
+
+    def start(self):
+        """Start the background capture, segmentation and recognition threads"""
+        for name, target in (('capture', self._capture), ('segment', self._segment),
+                             ('recognize', self._recognize)):
+            thread = threading.Thread(target=target, name=f'buddy-voice-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop capturing; utterances already captured are still processed"""
+        self._stop.set()
+
+    def run(self):
+        """Start the loop and process transcripts until the source ends or stop() is called"""
+        if not self._threads:
+            self.start()
+        try:
+            while True:
+                text = self.transcripts.get()
+                if text is None:
+                    break
+                response = self.process(text)
+                self.counts['processed'] += 1
+                if self.on_response:
+                    self.on_response(text, response)
+        except KeyboardInterrupt:
+            self.stop()
+        finally:
+            self.stop()
+            for thread in self._threads:
+                thread.join(timeout=2)
+            self.source.close()
+
+    def stats(self) -> Dict:
+        return dict(self.counts, buffered_chunks=len(self.buffer), dropped_chunks=self.buffer.dropped,
+                    energy_threshold=round(self.vad.threshold, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuous voice mode for Buddy AI")
+    parser.add_argument('--wav', help="read audio from a mono 16-bit WAV file instead of the microphone")
+    parser.add_argument('--realtime', action='store_true', help="pace WAV input at its sample rate")
+    parser.add_argument('--threshold', type=float, default=None, help="energy threshold (skips calibration)")
+    args = parser.parse_args()
+
+    import main as buddy
+
+    buddy.setup_desktop_logging()
+    threshold = args.threshold
+    if threshold is None and os.getenv('VOICE_ENERGY_THRESHOLD'):
+        threshold = float(os.getenv('VOICE_ENERGY_THRESHOLD'))
+    source = WavFileSource(args.wav, realtime=args.realtime) if args.wav else MicrophoneSource()
+
+    loop = VoiceLoop(source, buddy.process_query, recognize=buddy.get_speech_recognizer(),
+                     energy_threshold=threshold,
+                     pause_when=None if args.wav else buddy.is_speaking,
+                     on_response=lambda query, response: print(f"Response from Buddy AI: {response}"))
+    print("Continuous listening started (Ctrl+C to stop)...")
+    loop.run()
+    print(f"Voice loop finished: {loop.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Wake Word Module for Buddy AI
+Offline wake-word gating in front of cloud speech recognition. Each captured
+utterance is first checked by a local keyword spotter (PocketSphinx through
+speech_recognition's recognize_sphinx); only speech containing the wake
+word, or following it within a short window, is sent to Google.
+
+Usage (check a recorded fixture offline):
+    python wake_word.py fixture.wav
+    python wake_word.py fixture.wav --keyword buddy --sensitivity 0.8
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import speech_recognition as sr
+
+
+class WakeWordSpotter:
+    """Decides whether an utterance contains the wake word"""
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        raise NotImplementedError
+
+
+class SphinxSpotter(WakeWordSpotter):
+    """Keyword spotting with PocketSphinx; runs locally, no network"""
+
+    def __init__(self, keyword: str = 'buddy', sensitivity: float = 0.8):
+        if importlib.util.find_spec('pocketsphinx') is None:
+            raise ImportError("Wake-word spotting needs PocketSphinx: pip install pocketsphinx")
+        self.keyword = keyword.lower()
+        self.sensitivity = sensitivity
+        self.recognizer = sr.Recognizer()
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        try:
+            hypothesis = self.recognizer.recognize_sphinx(audio, keyword_entries=[(self.keyword, self.sensitivity)])
+        except sr.UnknownValueError:
+            return False
+        return self.keyword in hypothesis.lower()
+
+
+class TranscriptSpotter(WakeWordSpotter):
+    """
+    Spots the wake word in the output of any recognize function. Used with
+    scripted recognizers in tests and benchmarks, or to compare spotters.
+    """
+
+    def __init__(self, recognize: Callable[[sr.AudioData], str], keyword: str = 'buddy'):
+        self.recognize = recognize
+        self.pattern = re.compile(rf"\b{re.escape(keyword)}\b", re.IGNORECASE)
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        try:
+            return bool(self.pattern.search(self.recognize(audio) or ''))
+        except sr.UnknownValueError:
+            return False
+
+
+def audio_seconds(audio: sr.AudioData) -> float:
+    return len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+
+
+class WakeWordGate:
+    """
+    Wraps a cloud recognize function so it only runs on addressed speech.
+
+    An utterance with the wake word that is longer than `wake_seconds` is
+    taken to carry the command too ("buddy, what's the weather") and is
+    recognized right away. A short one ("buddy") arms the gate, and the next
+    utterance within `window_seconds` is recognized without needing the wake
+    word again. Anything else raises sr.UnknownValueError without a network
+    call, which the capture loops already treat as "nothing heard".
+    """
+
+    def __init__(self, spotter: WakeWordSpotter, recognize: Callable[[sr.AudioData], str],
+                 window_seconds: float = 8.0, wake_seconds: float = 1.5,
+                 on_wake: Optional[Callable[[], None]] = None):
+        self.spotter = spotter
+        self.recognize = recognize
+        self.window_seconds = window_seconds
+        self.wake_seconds = wake_seconds
+        self.on_wake = on_wake
+        self._armed_until = 0.0
+        self._lock = threading.Lock()
+        self.counts = {'utterances': 0, 'gated': 0, 'woken': 0, 'forwarded': 0}
+
+    @property
+    def armed(self) -> bool:
+        return time.monotonic() < self._armed_until
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _disarm(self) -> bool:
+        """Use up the armed window; only one utterance may claim it"""
+        with self._lock:
+            armed = time.monotonic() < self._armed_until
+            self._armed_until = 0.0
+            return armed
+
+    def __call__(self, audio: sr.AudioData) -> str:
+        self._count('utterances')
+        if not self._disarm():
+            if not self.spotter.detect(audio):
+                self._count('gated')
+                raise sr.UnknownValueError()
+            self._count('woken')
+            if audio_seconds(audio) <= self.wake_seconds:
+                with self._lock:
+                    self._armed_until = time.monotonic() + self.window_seconds
+                if self.on_wake:
+                    self.on_wake()
+                raise sr.UnknownValueError()
+
+        self._count('forwarded')
+        return self.recognize(audio)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts, armed=self.armed)
+
+
+def gate_from_env(recognize: Callable[[sr.AudioData], str],
+                  on_wake: Optional[Callable[[], None]] = None) -> Callable[[sr.AudioData], str]:
+    """
+    Put the wake-word gate in front of `recognize` unless WAKE_WORD_ENABLED=0.
+    WAKE_WORD (default "buddy"), WAKE_WORD_SENSITIVITY and WAKE_WORD_WINDOW
+    tune it. Without PocketSphinx installed recognition stays ungated.
+    """
+    if os.getenv('WAKE_WORD_ENABLED', '1') == '0':
+        return recognize
+    try:
+        spotter = SphinxSpotter(os.getenv('WAKE_WORD', 'buddy'), float(os.getenv('WAKE_WORD_SENSITIVITY', '0.8')))
+    except ImportError as e:
+        print(f"{e}; wake-word gating disabled")
+        return recognize
+    return WakeWordGate(spotter, recognize, window_seconds=float(os.getenv('WAKE_WORD_WINDOW', '8')),
+                        on_wake=on_wake)
+
+
+def evaluate_wav(path: str, spotter: WakeWordSpotter, energy_threshold: Optional[float] = None) -> List[Dict]:
+    """Segment a WAV fixture with the voice loop's VAD and run the spotter on each utterance"""
+    from voice_loop import EnergyVAD, WavFileSource
+
+    source = WavFileSource(path)
+    vad = EnergyVAD(source.sample_rate, source.chunk_seconds)
+    if energy_threshold is not None:
+        vad.threshold = energy_threshold
+    else:
+        vad.calibrate([source.read() for _ in range(max(1, round(0.5 / source.chunk_seconds)))])
+
+    results = []
+    position = 0.0
+    while True:
+        chunk = source.read()
+        speech = vad.feed(chunk) if chunk else vad.flush()
+        position += source.chunk_seconds
+        if speech:
+            audio = sr.AudioData(speech, source.sample_rate, source.sample_width)
+            duration = audio_seconds(audio)
+            results.append({'end_s': round(position, 2), 'duration_s': round(duration, 2),
+                            'wake_word': spotter.detect(audio)})
+        if not chunk:
+            break
+    source.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Buddy wake-word spotter over a WAV fixture")
+    parser.add_argument('wav', help="mono 16-bit WAV file")
+    parser.add_argument('--keyword', default=os.getenv('WAKE_WORD', 'buddy'))
+    parser.add_argument('--sensitivity', type=float, default=float(os.getenv('WAKE_WORD_SENSITIVITY', '0.8')))
+    parser.add_argument('--threshold', type=float, default=None, help="VAD energy threshold (skips calibration)")
+    args = parser.parse_args()
+
+    results = evaluate_wav(args.wav, SphinxSpotter(args.keyword, args.sensitivity), args.threshold)
+    for result in results:
+        print(f"{result['end_s']:8.2f}s  {result['duration_s']:5.2f}s  "
+              f"{'WAKE' if result['wake_word'] else '-'}")
+    print(f"{sum(r['wake_word'] for r in results)} of {len(results)} utterances contained '{args.keyword}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Startup Warm-up Module for Buddy AI
+Pays the lazy one-off costs (model client, routing tables, city gazetteer,
+upstream connections, hot answers) at boot and tracks whether the instance
+is ready for traffic
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Total budget for priming hot answers; it runs after the instance is marked ready
+WARMUP_PRIME_SECONDS = float(os.getenv('WARMUP_PRIME_SECONDS', '20'))
+
+
+def hot_queries_from_env() -> List[str]:
+    """
+    Queries to prime at boot, from WARMUP_QUERIES (separated by ';') and/or a
+    WARMUP_QUERIES_FILE with one query per line.
+    """
+    queries = [q.strip() for q in os.getenv('WARMUP_QUERIES', '').split(';') if q.strip()]
+    path = os.getenv('WARMUP_QUERIES_FILE')
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            queries.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return queries
+
+
+class WarmupState:
+    """Progress of the warm-up phase, reported by the health endpoints"""
+
+    def __init__(self):
+        self.started_at = None
+        self.finished_at = None
+        self.steps = {}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def run_step(self, name: str, fn: Callable):
+        """Run one warm-up step, recording its duration and outcome"""
+        started = time.monotonic()
+        try:
+            detail = fn()
+            status = {'status': 'ok'}
+            if detail is not None:
+                status['detail'] = detail
+        except Exception as e:
+            # A failed step is reported but does not keep the instance unready;
+            # the request path still has its own lazy initialization and fallbacks
+            status = {'status': 'error', 'error': str(e)}
+        status['seconds'] = round(time.monotonic() - started, 3)
+        with self._lock:
+            self.steps[name] = status
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'seconds': round((self.finished_at or time.monotonic()) - self.started_at, 3)
+                if self.started_at else None,
+                'steps': dict(self.steps)
+            }
+
+
+warmup_state = WarmupState()
+
+
+def run_warmup(state: WarmupState = warmup_state):
+    """Run the warm-up steps, marking the instance ready before the optional answer priming"""
+    # Imported here so module import stays cheap and cycle-free
+    from llm_backends import get_backend
+    from enhanced_commands import buddy_processor
+    from external_apis import api_manager
+    from gazetteer import gazetteer
+    from request_context import DeadlineExceeded, request_scope
+
+    state.started_at = time.monotonic()
+
+    def build_model_client():
+        backend = get_backend()
+        backend.warm()
+        return {'backend': backend.name}
+
+    def count_routes():
+        return {'patterns': sum(len(p) for p in buddy_processor.compiled_patterns.values())}
+
+    state.run_step('model_client', build_model_client)
+    state.run_step('routing', count_routes)
+    state.run_step('gazetteer', gazetteer.load)
+    state.run_step('connections', api_manager.warm_connections)
+
+    # Priming answers is optional and bounded by Gemini, so it neither delays
+    # readiness (and deploys that wait on the health check) nor runs unbounded
+    state._ready.set()
+    logger.info("Instance ready", extra={'seconds': round(time.monotonic() - state.started_at, 3)})
+
+    def prime_hot_queries():
+        queries = hot_queries_from_env()
+        primed = 0
+        with request_scope(deadline=time.monotonic() + WARMUP_PRIME_SECONDS):
+            for done, query in enumerate(queries):
+                try:
+                    primed += buddy_processor.warm_answer(query)
+                except DeadlineExceeded:
+                    logger.warning("Warm-up budget spent, skipping %d hot queries", len(queries) - done)
+                    return {'primed': primed, 'skipped': len(queries) - done}
+                except Exception as e:
+                    logger.warning("Warm-up query failed (%s): %s", query, e)
+        return {'primed': primed}
+
+    state.run_step('hot_queries', prime_hot_queries)
+
+    state.finished_at = time.monotonic()
+    logger.info("Warm-up finished", extra={'seconds': round(state.finished_at - state.started_at, 3)})
+
+
+def start_warmup(state: WarmupState = warmup_state):
+    """Run the warm-up on a background thread so the process is live immediately"""
+    if os.getenv('WARMUP_ENABLED', '1') == '0':
+        state.started_at = state.finished_at = time.monotonic()
+        state._ready.set()
+        return
+    threading.Thread(target=run_warmup, args=(state,), name='buddy-warmup', daemon=True).start()
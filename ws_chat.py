@@ -0,0 +1,155 @@
+"""
+WebSocket Chat Module for Buddy AI
+One long-lived connection per client instead of a POST (plus CORS preflight)
+per message. The connection keeps its session, and messages are pipelined:
+each carries a client-chosen id, several can be in flight at once, and replies
+(with streamed partials for LLM answers) come back tagged with that id,
+possibly out of order.
+
+Protocol (JSON text frames):
+    client -> {"id": "1", "query": "hello", "stream": true, "timeout_ms": 10000}
+    client -> {"type": "ping"}
+    server -> {"type": "session", "session_id": "...", "max_in_flight": 4}
+    server -> {"id": "1", "type": "partial", "delta": "Hel"}
+    server -> {"id": "1", "type": "response", "response": "Hello!", "degraded": false}
+    server -> {"id": "1", "type": "error", "error": "...", "retry_after": 2}
+    server -> {"type": "pong"}
+
+Backpressure: once a connection has max_in_flight messages in progress the
+server stops reading from it until one finishes, so a fast sender is slowed
+down by TCP flow control instead of queueing unbounded work.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from request_context import request_scope
+from scheduler import AdmissionController, LaneFull, LaneScheduler
+
+logger = logging.getLogger(__name__)
+
+# Runs pipelined messages for all connections; each connection is capped separately
+ws_executor = ThreadPoolExecutor(max_workers=int(os.getenv('WS_WORKERS', '32')), thread_name_prefix='buddy-ws')
+
+
+class ChatConnection:
+    """State and message loop for one WebSocket client"""
+
+    def __init__(self, ws, process: Callable[[str], str], scheduler: LaneScheduler,
+                 admission: AdmissionController, offline: Callable[[str], str],
+                 client_ip: Optional[str] = None, session_id: Optional[str] = None,
+                 max_in_flight: int = 4, deadline: float = 25.0, recorder=None, effects=None):
+        self.ws = ws
+        self.process = process
+        self.scheduler = scheduler
+        self.admission = admission
+        self.offline = offline
+        self.client_ip = client_ip
+        self.session_id = session_id or uuid.uuid4().hex
+        self.max_in_flight = max_in_flight
+        self.deadline = deadline
+        self.recorder = recorder
+        self.effects = effects
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._send_lock = threading.Lock()
+        self.closed = False
+        self.messages = 0
+
+    def send(self, payload: Dict):
+        """Send one frame; frames from concurrent messages are serialized"""
+        if self.closed:
+            return
+        with self._send_lock:
+            try:
+                self.ws.send(json.dumps(payload))
+            except Exception:
+                self.closed = True
+
+    def serve(self):
+        """Read messages until the client disconnects"""
+        self.send({'type': 'session', 'session_id': self.session_id, 'max_in_flight': self.max_in_flight})
+        try:
+            while not self.closed:
+                # Blocks while max_in_flight messages are running: this is the backpressure
+                self._slots.acquire()
+                try:
+                    raw = self.ws.receive()
+                except Exception:
+                    self._slots.release()
+                    break
+                if raw is None:
+                    self._slots.release()
+                    continue
+                if not self._dispatch(raw):
+                    self._slots.release()
+        finally:
+            self.closed = True
+
+    def _dispatch(self, raw: str) -> bool:
+        """Start work for a frame; returns True if a slot is now held by that work"""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            self.send({'type': 'error', 'error': 'Invalid JSON'})
+            return False
+        if not isinstance(message, dict):
+            self.send({'type': 'error', 'error': 'Expected a JSON object'})
+            return False
+        if message.get('type') == 'ping':
+            self.send({'type': 'pong'})
+            return False
+
+        message_id = message.get('id')
+        query = message.get('query')
+        if not query or not isinstance(query, str):
+            self.send({'id': message_id, 'type': 'error', 'error': 'No query provided'})
+            return False
+
+        self.messages += 1
+        ws_executor.submit(self._handle, message_id, query, bool(message.get('stream', True)),
+                           message.get('timeout_ms'))
+        return True
+
+    def _handle(self, message_id, query: str, stream: bool, timeout_ms):
+        try:
+            if self.recorder:
+                self.recorder.record(query, self.session_id)
+
+            decision = self.admission.decide(query)
+            if decision == AdmissionController.REJECT:
+                self.send({'id': message_id, 'type': 'error', 'error': 'Server is busy, please retry shortly',
+                           'retry_after': self.admission.retry_after()})
+                return
+            if decision == AdmissionController.DEGRADE:
+                self.send({'id': message_id, 'type': 'response', 'response': self.offline(query), 'degraded': True})
+                return
+
+            budget = self.deadline
+            if timeout_ms:
+                try:
+                    budget = min(budget, max(0.5, int(timeout_ms) / 1000))
+                except (TypeError, ValueError):
+                    pass
+
+            on_partial = None
+            if stream:
+                on_partial = lambda delta: self.send({'id': message_id, 'type': 'partial', 'delta': delta})
+
+            with request_scope(client_ip=self.client_ip, deadline=time.monotonic() + budget,
+                               on_partial=on_partial, session_id=self.session_id, effects=self.effects):
+                response = self.scheduler.run(query, self.process, query)
+            self.send({'id': message_id, 'type': 'response', 'response': response, 'degraded': False})
+        except LaneFull:
+            self.send({'id': message_id, 'type': 'error', 'error': 'Server is busy, please retry shortly',
+                       'retry_after': 2})
+        except Exception as e:
+            logger.exception("Error processing WebSocket message")
+            self.send({'id': message_id, 'type': 'error', 'error': 'An error occurred', 'details': str(e)})
+        finally:
+            self._slots.release()